@@ -0,0 +1,125 @@
+import argparse
+import os
+from pathlib import Path
+
+from .logger import setup_logging
+
+
+def _config_setting(value: str) -> tuple[str, str]:
+    key, sep, setting = value.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Expected KEY=VALUE, got {value}")
+    return key, setting
+
+
+def _add_config_setting_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "-C",
+        "--config-setting",
+        type=_config_setting,
+        action="append",
+        default=[],
+        help="Build setting as for pip, e.g. -C nthreads=4",
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m hwh_backend")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    watch_parser = commands.add_parser(
+        "watch", help="Rebuild changed extensions of an editable install in place"
+    )
+    watch_parser.add_argument(
+        "project_dir", nargs="?", type=Path, default=Path(), help="Project root"
+    )
+    _add_config_setting_argument(watch_parser)
+    watch_parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.3,
+        help="Seconds to wait for a burst of changes to settle (default: 0.3)",
+    )
+    watch_parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="Poll for changes instead of using inotify",
+    )
+    watch_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1.0,
+        help="Seconds between polls (default: 1.0)",
+    )
+
+    rebuild_parser = commands.add_parser(
+        "rebuild",
+        help="Incrementally rebuild extensions of an editable install in place",
+    )
+    rebuild_parser.add_argument(
+        "modules", nargs="*", help="Extensions to rebuild (default: all outdated)"
+    )
+    _add_config_setting_argument(rebuild_parser)
+
+    worker_parser = commands.add_parser(
+        "worker", help="Compile preprocessed sources for distributed builds"
+    )
+    worker_parser.add_argument(
+        "--listen",
+        default="tcp://127.0.0.1:7470",
+        help="tcp://host:port or unix:/path to listen on "
+        "(default: tcp://127.0.0.1:7470)",
+    )
+    worker_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Sources to compile at once (default: number of CPUs)",
+    )
+    worker_parser.add_argument(
+        "--allow-remote",
+        action="store_true",
+        help="Listen on other than loopback TCP addresses. Workers compile for "
+        "anyone who can connect, only use it on trusted networks",
+    )
+    worker_parser.add_argument(
+        "--cc", help="C compiler command (default: the one Python was built with)"
+    )
+    worker_parser.add_argument(
+        "--cxx", help="C++ compiler command (default: the one Python was built with)"
+    )
+    _add_config_setting_argument(worker_parser)
+
+    args = parser.parse_args(argv)
+    config_settings = {"verbose": "info", **dict(args.config_setting)}
+    setup_logging(config_settings)
+
+    match args.command:
+        case "watch":
+            from .watch import watch
+
+            watch(
+                args.project_dir,
+                config_settings,
+                debounce=args.debounce,
+                poll=args.poll,
+                poll_interval=args.poll_interval,
+            )
+        case "worker":
+            from .worker import serve
+
+            serve(args.listen, args.jobs, args.cc, args.cxx, args.allow_remote)
+        case "rebuild":
+            from .build import _build_extension
+
+            _build_extension(
+                inplace=True,
+                config_settings=config_settings,
+                incremental=True,
+                modules=args.modules or None,
+            )
+
+
+if __name__ == "__main__":
+    main()
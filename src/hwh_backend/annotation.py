@@ -0,0 +1,165 @@
+import fnmatch
+import json
+import re
+from pathlib import Path
+from typing import Optional
+
+from .logger import logger
+
+REPORT_VERSION = 1
+# Lines listed per module in the report, the ones with the highest scores
+HOTSPOTS = 10
+
+# Lines of Cython's annotated HTML, their score is the number of Python C API
+# calls the line was compiled to, weighted by how costly they are
+_LINE = re.compile(
+    r'<pre class="cython line score-(\d+)"[^>]*>.*?<span class="">(\d+)</span>:'
+)
+_CLASS = re.compile(r"(\s*)(?:cdef\s+(?:(?:public|api)\s+)*)?class\s+(\w+)")
+_FUNCTION = re.compile(
+    r"(\s*)(?:async\s+)?(?:def\s+|cp?def\s+(?:[^=(:#]*?[\s*\]]+)?)(\w+)\s*\("
+)
+_TRIPLE_QUOTES = re.compile(r'"""|\'\'\'')
+# Scope of the lines outside of functions and classes. Its imports and
+# globals always interact with Python, so only thresholds whose pattern
+# names it apply to it.
+MODULE_SCOPE = "<module>"
+
+
+def line_scores(html: str) -> dict[int, int]:
+    """Score of every line of the .pyx, from its annotated HTML."""
+    return {int(line): int(score) for score, line in _LINE.findall(html)}
+
+
+def line_scopes(source: str) -> list[str]:
+    """Qualified name of the function or class every line of a .pyx belongs
+    to, MODULE_SCOPE for the module level.
+
+    Scopes are tracked by indentation. Lines inside brackets or triple
+    quoted strings don't open or close scopes.
+    """
+    scopes = []
+    stack: list[tuple[int, str]] = []
+    depth = 0
+    in_string = False
+    for line in source.splitlines():
+        code = line.split("#", 1)[0] if not in_string else ""
+        stripped = line.strip()
+        if not in_string and depth == 0 and stripped and not stripped.startswith("#"):
+            indent = len(line.expandtabs()) - len(line.expandtabs().lstrip())
+            while stack and stack[-1][0] >= indent:
+                stack.pop()
+            if match := _CLASS.match(line) or _FUNCTION.match(line):
+                parent = stack[-1][1] + "." if stack else ""
+                stack.append((indent, parent + match.group(2)))
+        scopes.append(stack[-1][1] if stack else MODULE_SCOPE)
+
+        if len(_TRIPLE_QUOTES.findall(line)) % 2:
+            in_string = not in_string
+        if not in_string:
+            depth = max(0, depth + sum(code.count(c) for c in "([{"))
+            depth = max(0, depth - sum(code.count(c) for c in ")]}"))
+    return scopes
+
+
+def module_report(module_name: str, pyx_file: Path, html_file: Path) -> dict:
+    """Python interaction of a module: the number of lines that interact
+    with Python and their total score, for the module and every function."""
+    source = pyx_file.read_text()
+    lines = source.splitlines()
+    scopes = line_scopes(source)
+    scores = line_scores(html_file.read_text())
+
+    functions: dict[str, dict] = {}
+    for lineno, scope in enumerate(scopes, start=1):
+        if scope not in functions:
+            functions[scope] = {
+                "name": scope,
+                "line": lineno,
+                "python_lines": 0,
+                "score": 0,
+            }
+        if score := scores.get(lineno, 0):
+            functions[scope]["python_lines"] += 1
+            functions[scope]["score"] += score
+
+    hotspots = sorted(
+        (lineno for lineno, score in scores.items() if score and lineno <= len(lines)),
+        key=lambda lineno: (-scores[lineno], lineno),
+    )[:HOTSPOTS]
+    return {
+        "module": module_name,
+        "source": str(pyx_file),
+        "python_lines": sum(1 for score in scores.values() if score),
+        "score": sum(scores.values()),
+        "functions": sorted(functions.values(), key=lambda f: (-f["score"], f["line"])),
+        "hotspots": [
+            {
+                "line": lineno,
+                "function": scopes[lineno - 1],
+                "score": scores[lineno],
+                "code": lines[lineno - 1].strip(),
+            }
+            for lineno in hotspots
+        ],
+    }
+
+
+def annotation_report(modules: list[tuple[str, str]]) -> dict:
+    """Report of the annotated modules, given as (module name, .pyx file).
+
+    Modules without annotation, e.g. built from generated C, are left out.
+    """
+    reports = []
+    for module_name, pyx_file in modules:
+        pyx_file = Path(pyx_file)
+        html_file = pyx_file.with_suffix(".html")
+        if pyx_file.suffix != ".pyx" or not html_file.exists():
+            logger.warning(f"No annotation of {module_name}, left out of the report")
+            continue
+        reports.append(module_report(module_name, pyx_file, html_file))
+    reports.sort(key=lambda r: (-r["score"], r["module"]))
+    return {
+        "version": REPORT_VERSION,
+        "python_lines": sum(r["python_lines"] for r in reports),
+        "score": sum(r["score"] for r in reports),
+        "modules": reports,
+    }
+
+
+def threshold_for(name: str, thresholds: dict[str, int]) -> Optional[int]:
+    """Threshold of the last pattern matching the qualified function name.
+    The module level only matches patterns that contain MODULE_SCOPE."""
+    module_level = name.endswith(f".{MODULE_SCOPE}")
+    matching = [
+        limit
+        for pattern, limit in thresholds.items()
+        if fnmatch.fnmatchcase(name, pattern)
+        and (not module_level or MODULE_SCOPE in pattern)
+    ]
+    return matching[-1] if matching else None
+
+
+def violations(report: dict, thresholds: dict[str, int]) -> list[str]:
+    """Functions whose score exceeds their max_python_interaction."""
+    found = []
+    for module in report["modules"]:
+        for function in module["functions"]:
+            name = f"{module['module']}.{function['name']}"
+            limit = threshold_for(name, thresholds)
+            if limit is not None and function["score"] > limit:
+                found.append(
+                    f"{name} ({module['source']}:{function['line']}) has a Python "
+                    f"interaction score of {function['score']} in "
+                    f"{function['python_lines']} lines, over {limit}"
+                )
+    return found
+
+
+def write_report(report: dict, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=1))
+    logger.info(
+        f"Annotation report: {report['python_lines']} lines interacting with "
+        f"Python, score {report['score']}, written to {path}"
+    )
@@ -1,56 +1,152 @@
+import base64
+import hashlib
+import io
 import json
+import os
 import shutil
 import site
 import sysconfig
-from importlib.metadata import distributions
+import tarfile
+import tempfile
+import zipfile
+from functools import partial
 from pathlib import Path
-from typing import Any, List, Optional, Union
+from typing import TYPE_CHECKING, Any, Callable, Iterator, List, Optional, Union
 
-from Cython.Build import cythonize
-from setuptools.build_meta import (
-    build_editable as _build_editable,
-)
-from setuptools.command.build_ext import build_ext
 from setuptools.dist import Distribution
 from setuptools.extension import Extension
 
-from hwh_backend.hwh_config import SitePackages
+from hwh_backend.hwh_config import (
+    CacheConfig,
+    CythonConfig,
+    HwhConfig,
+    Lto,
+    ModuleOverride,
+    SitePackages,
+    Strip,
+)
 
+from . import report
+from .annotation import annotation_report, violations, write_report
+from .cache import BuildCache
+from .dependencies import (
+    cythonize_key,
+    dependency_tree,
+    extension_directives,
+    extension_fields,
+    module_inputs,
+    resolve_extension,
+)
+from .discovery import (
+    DiscoveryManifest,
+    ExcludeFilter,
+    git_files,
+    is_glob,
+    package_search_dirs,
+    walk_files,
+)
+from .generated import (
+    MANIFEST_NAME,
+    GeneratedSources,
+    generated_artifacts,
+    relative_path,
+)
+from .incremental import IncrementalState
 from .logger import logger, setup_logging
-from .parser import PyProject
+from .lto import check_lto, compiler_command, compiler_family, lto_flags
+from .metadata import dist_info_name, normalize_dist_name, write_dist_info
+from .parser import PyProject, load_project
+from .pgo import ProfileGuidedBuild
+from .pipeline import BuildPipeline
+from .search_paths import PATHS_NAME, SearchPaths, dependency_paths, exported_paths
+from .strip import strip_extensions
+from .wheelfile import WheelWriter, tree_files
+
+if TYPE_CHECKING:
+    from Cython.Build.Dependencies import DependencyTree
 
 # Global flag to prevent double builds
 _EXTENSIONS_BUILT = False
 
 # Global flag to pass --config-setting foo=bar values from python -m build
-_CONFIG_OPTIONS: Optional[dict[str, int | bool]] = None
+_CONFIG_OPTIONS: Optional[dict[str, int | bool | str]] = None
 
 
-def _is_editable_install():
+def _is_editable_install(project: Optional[PyProject] = None):
     """Inspects package's site_packages/pkg_name/direct_url.json
     to dermine whether the installation is editable or not, see
     https://packaging.python.org/en/latest/specifications/direct-url-data-structure/"""
-    project = PyProject(Path())
+    project = project or load_project()
     pkg_name = project.package_name
 
     logger.debug(f"===CHECKING EDITABLE=== for package {pkg_name}")
     # FIXME: using all site packages here might not be clever..
     site_packages = site.getsitepackages()
     logger.debug(f"Used site packages: {site_packages}")
-    for dist in distributions(name=pkg_name, path=site_packages):
-        content = dist.read_text("direct_url.json")
-        logger.debug(f"Found content {content}")
-        if content is not None:
-            direct_url = json.loads(content)
-            logger.debug(f"Converting to json {direct_url}")
-            if "dir_info" in direct_url:
-                logger.debug(f"[OK] Package {pkg_name} is editable install")
-                return direct_url["dir_info"].get("editable", False)
+    # Looked up once per project, which watch mode reloads for every build
+    key = tuple(site_packages)
+    if key not in project.direct_urls:
+        project.direct_urls[key] = _installed_direct_url(
+            pkg_name, str(project.package_version), key
+        )
+    direct_url = project.direct_urls[key]
+    if direct_url is not None:
+        logger.debug(f"[OK] Package {pkg_name} is editable install")
+        return direct_url["dir_info"].get("editable", False)
 
     logger.debug(f"Package {pkg_name} is not editable install")
     return False
 
 
+def _dist_info_dirs(name: str, version: str, site_dir: str) -> Iterator[Path]:
+    """.dist-info directories of the distribution name in site_dir.
+
+    The directory of the given version is looked up by its name, which is
+    what rebuilding an installed project needs. Only if it doesn't exist,
+    site_dir is listed to find other versions, still without reading the
+    metadata of any other distribution.
+    """
+    normalized = normalize_dist_name(name)
+    # Older installers keep the case of the project name
+    for dist_name in dict.fromkeys([normalized, name.replace("-", "_")]):
+        dist_info = Path(site_dir) / f"{dist_name}-{version}.dist-info"
+        if dist_info.is_dir():
+            yield dist_info
+            return
+
+    try:
+        entries = os.scandir(site_dir)
+    except OSError:
+        return
+    with entries:
+        for entry in entries:
+            dist_name, sep, _ = entry.name.partition("-")
+            if (
+                sep
+                and entry.name.endswith(".dist-info")
+                and normalize_dist_name(dist_name) == normalized
+            ):
+                yield Path(entry.path)
+
+
+def _installed_direct_url(
+    name: str, version: str, site_packages: tuple[str, ...]
+) -> Optional[dict]:
+    """direct_url.json of the distribution installed from a local directory,
+    if there's one."""
+    for site_dir in site_packages:
+        for dist_info in _dist_info_dirs(name, version, site_dir):
+            try:
+                content = (dist_info / "direct_url.json").read_text()
+            except OSError:
+                continue
+            logger.debug(f"Found content {content}")
+            direct_url = json.loads(content)
+            if "dir_info" in direct_url:
+                return direct_url
+    return None
+
+
 def get_sitepackages(option: SitePackages):
     # TODO: move to hwh config
     match option:
@@ -64,45 +160,51 @@ def get_sitepackages(option: SitePackages):
             return []
 
 
+def _search_paths(project: PyProject, option: SitePackages) -> SearchPaths:
+    """Where to look for the .pxd files, headers and libraries of the
+    dependencies, see [tool.hwh.cython] site_packages."""
+    if option == SitePackages.DEPENDENCIES:
+        return dependency_paths(project.dependencies, project.project_dir, _build_dir())
+    dirs = get_sitepackages(option)
+    return SearchPaths(list(dirs), list(dirs), list(dirs))
+
+
 def find_cython_files(
     source_dir: Path,
     sources: Optional[List[Union[str, Path]]] = None,
     exclude_dirs: Optional[List[str]] = None,
+    use_git: bool = False,
+    visited: Optional[dict[str, tuple[int, str]]] = None,
 ) -> List[Path]:
-    """Find all Cython source files in the package directory."""
+    """Find all Cython source files in the package directory.
+
+    sources: .pyx files or glob patterns relative to source_dir, all files
+        under source_dir if not given
+    exclude_dirs: directories or glob patterns not to search, see ExcludeFilter
+    use_git: list the files with git ls-files instead of walking source_dir
+    visited: collects the state of walked directories, see walk_files
+    """
     logger.debug(f"Searching for Cython files in: {source_dir}")
     logger.debug(f"Explicit sources: {sources}")
     logger.debug(f"Exclude dirs: {exclude_dirs}")
 
     if sources:
         # Convert all sources to Path objects relative to source_dir
-        res = [
-            source_dir / src if isinstance(src, str) else src
-            for src in sources
-            if str(src).endswith(".pyx")
-        ]
+        res = []
+        for src in sources:
+            if isinstance(src, str) and is_glob(src):
+                res += sorted(p for p in source_dir.glob(src) if p.suffix == ".pyx")
+            elif str(src).endswith(".pyx"):
+                res.append(source_dir / src if isinstance(src, str) else src)
         logger.debug(f"Using explicit sources: {res}")
         return res
 
-    all_pyx = list(source_dir.rglob("*.pyx"))
-    logger.debug(f"Found all .pyx files: {all_pyx}")
-
-    # FIXME: something wrong with types here
-    # Filter out all directories that are excluded
-    exclude_dirs = set(exclude_dirs or [])
-    if exclude_dirs:
-        # Convert exclude_dirs to full paths relative to source_dir
-        exclude_paths = {source_dir / excluded for excluded in exclude_dirs}
-        logger.debug(f"Exclude paths: {exclude_paths}")
-        filtered = [
-            pyx
-            for pyx in all_pyx
-            if not any(exclude_path in pyx.parents for exclude_path in exclude_paths)
-        ]
-        logger.debug(f"After exclusion: {filtered}")
-        return filtered
-
-    return list(all_pyx)
+    exclude = ExcludeFilter(source_dir, exclude_dirs or [])
+    found = git_files(source_dir, ".pyx", exclude) if use_git else None
+    if found is None:
+        found = walk_files(source_dir, ".pyx", exclude, visited)
+    logger.debug(f"Found .pyx files: {found}")
+    return found
 
 
 def resolve_package_path(
@@ -119,9 +221,114 @@ def resolve_package_path(
     )
 
 
-def _get_ext_modules(project: PyProject, config_settings: Optional[dict] = None):
-    """Get Cython extension modules configuration."""
-    logger.debug("=== Starting _get_ext_modules ===")
+def _module_name(pyx_file: Path, package_paths: List[Path]) -> str:
+    """Full module name of a .pyx file in one of the packages."""
+    # Convert path to proper module path. Absolute paths are forbidden by pip
+    logger.debug(f"\nProcessing: {pyx_file}")
+    pkg_info = resolve_package_path(pyx_file, package_paths)
+    if pkg_info is None:
+        logger.warning(f"Could not determine package for {pyx_file}")
+
+    pkg_name, rel_path = pkg_info
+    logger.debug(f"Relative path: {rel_path}")
+
+    # Construct full module path including package name
+    module_parts = [pkg_name]
+    if rel_path.parent != Path("."):
+        module_parts.extend(part for part in rel_path.parent.parts)
+
+    if rel_path.name != "__init__.pyx":
+        module_parts.append(rel_path.stem)
+
+    module_path = ".".join(module_parts)  # .split(".", 1)[-1]
+    logger.debug(f"Constructed module path: {module_path}")
+    return module_path
+
+
+def _profile() -> Optional[str]:
+    """Build profile selected by the profile setting, see [tool.hwh.profiles]."""
+    return (_CONFIG_OPTIONS or {}).get("profile")
+
+
+def _hwh_config(project: PyProject) -> HwhConfig:
+    return project.get_hwh_config(_profile())
+
+
+def _build_dir() -> Path:
+    """Build directory of the selected profile, so that switching profiles
+    doesn't overwrite the objects and extensions built with another one."""
+    profile = _profile()
+    return Path("build", "profiles", profile) if profile else Path("build")
+
+
+def _discover_modules(
+    project: PyProject, config: CythonConfig
+) -> list[tuple[str, str]]:
+    """The .pyx files of the project and their module names."""
+    # Find all .pyx files in the package directory, unless the manifest of the
+    # last discovery shows that none of the searched directories changed
+    manifest = DiscoveryManifest.load(_build_dir(), project.pyproject_path)
+    with report.span("discovery"):
+        fresh = not manifest.valid()
+        if fresh:
+            manifest.reset()
+        else:
+            logger.debug(f"Using discovered packages from {manifest.path}")
+            project.restore_packages(manifest.packages, manifest.package_where)
+            if manifest.updated:
+                manifest.save()
+        package_paths = project.get_all_package_paths()
+    logger.debug(f"Package paths: {package_paths}")
+    # FIXME: Extension class' docstrings state that files are searched from the
+    #  root downwards. Currently we only support <pkg_name>/<pkg_name>/<pyx files here>
+    # kind of file tree
+    # TODO: Add support for src/ structure
+    package_dir = Path(project.package_name).parent
+    logger.debug(
+        f"Looking for .pyx files in package dir: {package_dir.absolute().as_posix()}"
+    )
+    with report.span("find_cython_files"):
+        modules = manifest.modules
+        if modules is None:
+            # Only walked directories can be revalidated by their mtimes
+            walk = not config.sources and not config.git_ls_files
+            pyx_files = []
+            for pkg_path in package_paths:
+                pkg_pyx_files = find_cython_files(
+                    pkg_path,
+                    sources=config.sources,
+                    exclude_dirs=config.exclude_dirs + ["build"],
+                    use_git=config.git_ls_files,
+                    visited=manifest.dirs if fresh and walk else None,
+                )
+                pyx_files.extend(pkg_pyx_files)
+            logger.debug(f"Found .pyx files: {pyx_files}")
+            modules = [
+                (str(pyx_file), _module_name(pyx_file, package_paths))
+                for pyx_file in pyx_files
+            ]
+
+            if fresh:
+                manifest.packages = project.packages
+                manifest.package_where = project.package_where
+                manifest.record_dirs(
+                    package_search_dirs(
+                        project.project_dir, project.package_where, Path("build")
+                    )
+                )
+                manifest.modules = modules if walk else None
+                manifest.save()
+    return modules
+
+
+def _get_extensions(
+    project: PyProject, config_settings: Optional[dict] = None
+) -> tuple[List[Extension], dict[str, Any]]:
+    """Create the (not yet cythonized) extension modules of the project.
+
+    returns: extensions and the keyword arguments to cythonize them with
+    """
+    logger.debug("=== Starting _get_extensions ===")
     logger.debug(f"Project name: {project.package_name}")
     logger.debug(f"Project version: {project.package_version}")
     logger.debug(f"get ext Config settings: {config_settings}")
@@ -133,13 +340,14 @@ def _get_ext_modules(project: PyProject, config_settings: Optional[dict] = None)
     logger.debug(f"Parsed build settings: {_CONFIG_OPTIONS}")
 
     # Create directory lists for Extension ctor and cythonize()
-    config = project.get_hwh_config().cython
-    site_packages = get_sitepackages(config.site_packages)
-    logger.debug(f"Site packages: {site_packages}")
+    config = _hwh_config(project).cython
+    with report.span("search_paths"):
+        search_paths = _search_paths(project, config.site_packages)
+    logger.debug(f"Dependency search paths: {search_paths}")
 
-    library_dirs = config.library_dirs + site_packages
+    library_dirs = config.library_dirs + search_paths.library_dirs
     runtime_library_dirs = config.runtime_library_dirs
-    include_dirs = config.include_dirs + site_packages
+    include_dirs = config.include_dirs + search_paths.include_dirs
 
     if config.use_numpy_include:
         try:
@@ -156,176 +364,332 @@ def _get_ext_modules(project: PyProject, config_settings: Optional[dict] = None)
     logger.debug(f"Runtime library dirs: {runtime_library_dirs}")
     logger.debug(f"Include dirs: {include_dirs}")
 
-    # Find all .pyx files in the package directory
-    package_paths = project.get_all_package_paths()
-    logger.debug(f"Package paths: {package_paths}")
-    # FIXME: Extension class' docstrings state that files are searched from the
-    #  root downwards. Currently we only support <pkg_name>/<pkg_name>/<pyx files here>
-    # kind of file tree
-    # TODO: Add support for src/ structure
-    package_dir = Path(project.package_name).parent
-    logger.debug(
-        f"Looking for .pyx files in package dir: {package_dir.absolute().as_posix()}"
-    )
-    pyx_files = []
-    for pkg_path in package_paths:
-        pkg_pyx_files = find_cython_files(
-            pkg_path,
-            sources=config.sources,
-            exclude_dirs=config.exclude_dirs + [str(pkg_path / "build")],
-        )
-        pyx_files.extend(pkg_pyx_files)
-    logger.debug(f"Found .pyx files: {pyx_files}")
+    modules = _discover_modules(project, config)
 
     # Create Extensions
     ext_modules = []
-    for pyx_file in pyx_files:
-        # Convert path to proper module path. Absolute paths are forbidden by pip
-        logger.debug(f"\nProcessing: {pyx_file}")
-        pkg_info = resolve_package_path(pyx_file, package_paths)
-        if pkg_info is None:
-            logger.warning(f"Could not determine package for {pyx_file}")
-
-        pkg_name, rel_path = pkg_info
-        logger.debug(f"Relative path: {rel_path}")
-
-        # Construct full module path including package name
-        module_parts = [pkg_name]
-        if rel_path.parent != Path("."):
-            module_parts.extend(part for part in rel_path.parent.parts)
-
-        if rel_path.name != "__init__.pyx":
-            module_parts.append(rel_path.stem)
-
-        module_path = ".".join(module_parts)  # .split(".", 1)[-1]
-        logger.debug(f"Constructed module path: {module_path}")
+    for pyx_file, module_path in modules:
         logger.debug(f"Include directories: {config.include_dirs}")
         logger.debug(f"Linking libraries: {config.libraries}")
         ext = Extension(
             module_path,
-            [str(pyx_file)],
-            include_dirs=include_dirs,
+            [pyx_file],
+            include_dirs=list(include_dirs),
             language=config.language,
-            library_dirs=library_dirs,
-            libraries=config.libraries,
-            extra_compile_args=config.extra_compile_args,
-            extra_link_args=config.extra_link_args,
+            library_dirs=list(library_dirs),
+            libraries=list(config.libraries),
+            extra_compile_args=list(config.extra_compile_args),
+            extra_link_args=list(config.extra_link_args),
             runtime_library_dirs=runtime_library_dirs,
         )
+        _apply_overrides(ext, config.overrides_for(module_path))
         logger.debug(f"Created Extension object: {ext.name}")
         ext_modules.append(ext)
 
     logger.debug(f"\nTotal extensions to build: {len(ext_modules)}")
-    logger.debug("=== Finished _get_ext_modules ===\n")
+    logger.debug("=== Finished _get_extensions ===\n")
 
     # Override config values with build settings.
     if not _CONFIG_OPTIONS:
         _CONFIG_OPTIONS = {}
     nthreads = _CONFIG_OPTIONS.get("nthreads", config.nthreads)
     force = _CONFIG_OPTIONS.get("force", config.force)
-    annotate = _CONFIG_OPTIONS.get("annotate", config.annotate)
+    # Thresholds are checked against the annotation
+    annotate = _CONFIG_OPTIONS.get("annotate", config.annotate) or bool(
+        _python_interaction_thresholds(project)
+    )
     logger.debug(f"\n=== FORCE = {force} ")
     logger.debug(f"\n=== ANNOTATE = {annotate} ")
     logger.debug(f"\n=== NTHREADS = {nthreads} ")
+    if config.lto != Lto.OFF and ext_modules:
+        _apply_lto(ext_modules, config.lto, nthreads)
+
+    cythonize_kwargs = {
+        "nthreads": nthreads,
+        "force": force,
+        "annotate": annotate,
+        "compiler_directives": config.compiler_directives.as_dict(),
+        # This helps find .pxd files
+        "include_path": list(dict.fromkeys(include_dirs + search_paths.include_path)),
+    }
+    return ext_modules, cythonize_kwargs
 
-    cythonized = cythonize(
-        ext_modules,
-        nthreads=nthreads,
-        force=force,
-        annotate=annotate,
-        compiler_directives=config.compiler_directives.as_dict(),
-        include_path=include_dirs,  # This helps find .pxd files
-    )
 
-    return cythonized
+def _apply_lto(ext_modules: List[Extension], mode: Lto, nthreads: int) -> None:
+    """Add the compile and link flags of the LTO mode to every extension.
+
+    build_ext links up to nthreads extensions at once, so every link gets an
+    even share of nthreads for its LTO jobs.
+    """
+    compiler = compiler_command()
+    # nthreads = 0 builds serially
+    nthreads = max(1, nthreads)
+    jobs = max(1, nthreads // min(nthreads, len(ext_modules)))
+    compile_flags, link_flags = lto_flags(mode, compiler_family(compiler[0]), jobs)
+    check_lto(tuple(compiler), tuple(link_flags))
+    logger.debug(f"LTO flags: {compile_flags} {link_flags}")
+    for ext in ext_modules:
+        ext.extra_compile_args += compile_flags
+        ext.extra_link_args += link_flags
+
+
+def _apply_overrides(ext: Extension, overrides: list[ModuleOverride]) -> None:
+    """Apply the [tool.hwh.cython.modules.overrides] matching the extension."""
+    directives = {}
+    for override in overrides:
+        logger.debug(f"Applying overrides for {override.pattern} to {ext.name}")
+        if override.language is not None:
+            ext.language = override.language
+        directives.update(override.compiler_directives)
+        ext.extra_compile_args += override.extra_compile_args
+        ext.extra_link_args += override.extra_link_args
+        ext.libraries += override.libraries
+        ext.include_dirs += override.include_dirs
+        ext.library_dirs += override.library_dirs
+    if directives:
+        # Same attribute as Cython.Distutils.Extension, merged over the
+        # project's directives by extension_directives()
+        ext.cython_directives = directives
+
+
+def _cythonize(ext_modules: List[Extension], **cythonize_kwargs) -> List[Extension]:
+    """cythonize() with the compiler directives of every extension.
+
+    cythonize() applies the same directives to all modules of a call, so the
+    extensions are cythonized in groups with equal directives. Cython skips
+    modules whose C is up to date without annotating them, so when annotating
+    those without a current annotation are forced.
+    """
+    from Cython.Build import cythonize
+
+    groups: dict[str, List[Extension]] = {}
+    for ext in ext_modules:
+        directives = extension_directives(ext, cythonize_kwargs["compiler_directives"])
+        force = cythonize_kwargs["force"] or (
+            cythonize_kwargs["annotate"] and not _annotation_current(ext)
+        )
+        groups.setdefault(json.dumps([directives, force], sort_keys=True), []).append(
+            ext
+        )
 
+    cythonized = {}
+    for group_key, group in groups.items():
+        directives, force = json.loads(group_key)
+        kwargs = dict(cythonize_kwargs, compiler_directives=directives, force=force)
+        with report.instrument_cython():
+            group_cythonized = cythonize(group, **kwargs)
+        for original, ext in zip(group, group_cythonized, strict=True):
+            if hasattr(original, "cython_directives"):
+                ext.cython_directives = original.cython_directives
+            cythonized[ext.name] = ext
+    return [cythonized[ext.name] for ext in ext_modules]
+
+
+def _annotation_current(ext: Extension) -> bool:
+    """Whether the annotated HTML of ext is as new as its generated C."""
+    pyx_file = Path(ext.sources[0])
+    html_file = pyx_file.with_suffix(".html")
+    for c_file in (pyx_file.with_suffix(".c"), pyx_file.with_suffix(".cpp")):
+        if c_file.exists():
+            return (
+                html_file.exists()
+                and html_file.stat().st_mtime >= c_file.stat().st_mtime
+            )
+    return True
 
-class EditableBuildExt(build_ext):
-    """Custom build_ext that handles editable installs properly."""
 
-    def initialize_options(self):
-        super().initialize_options()
-        self._is_editable = False
-        self._original_build_lib = None
+def _get_ext_modules(project: PyProject, config_settings: Optional[dict] = None):
+    """Get cythonized extension modules."""
+    ext_modules, cythonize_kwargs = _get_extensions(project, config_settings)
+    return _cythonize_extensions(project, ext_modules, cythonize_kwargs)
+
+
+def _cythonize_extensions(
+    project: PyProject, ext_modules: List[Extension], cythonize_kwargs: dict
+) -> List[Extension]:
+    """Cythonize all extensions, through the build cache if it's enabled.
+    Extensions compiled from generated C shipped in an sdist are left as is."""
+    pending = [ext for ext in ext_modules if not _is_generated(ext)]
+    if not pending:
+        return ext_modules
+
+    cache = _get_cache(_hwh_config(project).cache, "cython")
+    if cache is None:
+        cythonized = _cythonize(pending, **cythonize_kwargs)
+    else:
+        cythonized = _cythonize_with_cache(pending, cache, **cythonize_kwargs)
+        logger.info(
+            f"Cython cache: {cache.hits} hits, {cache.misses} misses in {cache.root}"
+        )
+    by_name = {ext.name: ext for ext in cythonized}
+    return [by_name.get(ext.name, ext) for ext in ext_modules]
 
-    def finalize_options(self):
-        """Finalize build options and set up editable install if needed."""
-        super().finalize_options()
-        self._is_editable = _is_editable_install()
 
-        if self._is_editable:
-            logger.debug("Configuring for editable install")
-            # Store original build_lib for later
-            self._original_build_lib = self.build_lib
-            # For editable install, build directly in source tree
-            self.inplace = True
-            self.build_lib = str(Path.cwd())
-        else:
-            logger.debug("Configuring for regular install")
-
-        project = PyProject(Path())
-        config = project.get_hwh_config().cython
-        nthreads = config.nthreads
-        if _CONFIG_OPTIONS and "nthreads" in _CONFIG_OPTIONS:
-            nthreads = _CONFIG_OPTIONS["nthreads"]
-            logger.debug("nthreads overridden by command line option")
-        logger.debug(f"Using nthreads={nthreads}")
-        self.parallel = nthreads
-
-    def run(self):
-        """Run the build process."""
-        logger.debug(f"Running build_ext (editable={self._is_editable})")
-        logger.debug(f"Build lib: {self.build_lib}")
-        logger.debug(f"Build temp: {self.build_temp}")
-
-        # Run the actual build
-        super().run()
-
-    def _copy_extension_files(self):
-        """Copy extension files to their final locations for editable installs."""
-        if not self._original_build_lib:
-            return
+def _is_generated(ext: Extension) -> bool:
+    """Whether the extension is compiled from generated C, see
+    _use_generated_sources."""
+    return Path(ext.sources[0]).suffix in (".c", ".cpp")
+
+
+def _use_cythonized(tree: "DependencyTree", ext: Extension, c_files: list[str]) -> None:
+    """Compile ext from C generated earlier instead of its .pyx. Cython isn't
+    run, but the `# distutils:` comments of the .pyx still apply."""
+    fields = extension_fields(resolve_extension(tree, ext))
+    fields["sources"] = c_files + fields["sources"][1:]
+    for attr, value in fields.items():
+        setattr(ext, attr, value)
+
 
-        build_lib_path = Path(self._original_build_lib)
-        source_path = Path.cwd()
+def _use_generated_sources(
+    project: PyProject, ext_modules: List[Extension], cythonize_kwargs: dict
+) -> None:
+    """Compile extensions from the generated C of the sdist they're built
+    from, if it was generated from the same inputs and options."""
+    if cythonize_kwargs["force"] or cythonize_kwargs["annotate"]:
+        return
+    generated = GeneratedSources.load(project.project_dir)
+    if generated is None:
+        return
+    tree = dependency_tree(cythonize_kwargs["include_path"])
+    used = 0
+    for ext in ext_modules:
+        directives = extension_directives(ext, cythonize_kwargs["compiler_directives"])
+        if source := generated.source_for(ext, directives):
+            _use_cythonized(tree, ext, [source])
+            used += 1
+    logger.info(
+        f"Compiling {used} of {len(ext_modules)} extensions from generated "
+        f"sources in {MANIFEST_NAME}"
+    )
 
-        logger.debug(f"Copying extension files from {build_lib_path} to {source_path}")
 
-        # Find all built extension files
-        for ext in self.extensions:
-            # Get the full path to the built extension
-            ext_path = self.get_ext_fullpath(ext.name)
-            rel_path = Path(ext_path).relative_to(build_lib_path)
-            target_path = source_path / rel_path
+def _get_cache(config: CacheConfig, namespace: str) -> Optional[BuildCache]:
+    """Open the build cache namespace, unless disabled by config or settings."""
+    options = _CONFIG_OPTIONS or {}
+    if not options.get("cache", config.enabled):
+        logger.debug(f"Build cache '{namespace}' disabled")
+        return None
+
+    root = Path(options.get("cache_dir", config.dir)).expanduser()
+    if profile := _profile():
+        root = root / "profiles" / profile
+    logger.debug(f"Using build cache '{namespace}' in {root}")
+    return BuildCache(root / namespace, config.max_size_bytes)
+
+
+def _cythonize_with_cache(
+    ext_modules: List[Extension], cache: BuildCache, **cythonize_kwargs
+) -> List[Extension]:
+    """cythonize() that restores generated C from the build cache when the
+    module's inputs, the Cython version and the directives are unchanged.
+    Only cache misses reach the Cython compiler."""
+    tree = dependency_tree(cythonize_kwargs["include_path"])
+    force = cythonize_kwargs["force"]
+
+    keys = {}
+    hits = {}
+    misses = []
+    for ext in ext_modules:
+        pyx_file = Path(ext.sources[0])
+        keys[ext.name] = cythonize_key(
+            tree,
+            ext.name,
+            pyx_file,
+            ext.language,
+            extension_directives(ext, cythonize_kwargs["compiler_directives"]),
+            cythonize_kwargs["annotate"],
+        )
+        restored = None if force else cache.get(keys[ext.name], pyx_file.parent)
+        if restored is None:
+            misses.append(ext)
+            continue
+
+        c_files = [str(f) for f in restored if f.suffix in (".c", ".cpp")]
+        _use_cythonized(tree, ext, c_files)
+        hits[ext.name] = ext
+
+    cythonized = {}
+    if misses:
+        cythonized = {ext.name: ext for ext in _cythonize(misses, **cythonize_kwargs)}
+
+    for ext in cythonized.values():
+        c_file = Path(ext.sources[0])
+        artifacts = [c_file] + [
+            artifact
+            for artifact in (
+                c_file.with_suffix(".h"),
+                c_file.with_name(f"{c_file.stem}_api.h"),
+                c_file.with_suffix(".html"),
+            )
+            if artifact.exists()
+        ]
+        cache.put(keys[ext.name], artifacts)
 
-            # Ensure target directory exists
-            target_path.parent.mkdir(parents=True, exist_ok=True)
+    return [hits.get(ext.name) or cythonized[ext.name] for ext in ext_modules]
 
-            # Copy the extension file
-            if ext_path.exists():
-                shutil.copy2(ext_path, target_path)
-                logger.debug(f"Copied {ext_path} to {target_path}")
 
+def _cythonize_one(
+    ext: Extension, cache_root: Optional[Path], cache_size: int, cythonize_kwargs
+) -> tuple[dict, bool]:
+    """Cythonize a single extension, used as a pipeline job in a worker process.
 
-def _parse_build_settings(config_settings: dict | None = None) -> dict[str, bool | int]:
+    returns: the fields of the cythonized extension, see extension_fields,
+        and whether its sources came from the cache
+    """
+    if _is_generated(ext):
+        return {"sources": ext.sources}, False
+    kwargs = dict(cythonize_kwargs, nthreads=0)
+    if cache_root is None:
+        return extension_fields(_cythonize([ext], **kwargs)[0]), False
+
+    cache = BuildCache(cache_root, cache_size)
+    [cythonized] = _cythonize_with_cache([ext], cache, **kwargs)
+    return extension_fields(cythonized), cache.hits > 0
+
+
+def _setting_bool(value: str) -> bool:
+    return value.lower() == "true"
+
+
+# Build settings read from config_settings and the converters of their values
+_BUILD_SETTINGS: tuple[tuple[str, Callable[[str], bool | int | str]], ...] = (
+    ("annotate", _setting_bool),
+    ("nthreads", int),
+    ("force", _setting_bool),
+    ("cache", _setting_bool),
+    ("cache_dir", str),
+    ("pipeline", _setting_bool),
+    ("rebuild_on_import", _setting_bool),
+    ("report", str),
+    ("trace", str),
+    ("profile", str),
+    ("pgo", _setting_bool),
+    ("strip", str),
+    ("sdist_cythonize", _setting_bool),
+    ("annotation_report", str),
+    ("max_python_interaction", int),
+    ("executor", str),
+    ("workers", str),
+    ("compression", int),
+)
+
+
+def _parse_build_settings(
+    config_settings: dict | None = None,
+) -> dict[str, bool | int | str]:
     """Parse build settings from config_settings dict."""
     if not config_settings:
         return {}
 
     result = {}
     try:
-        if annotate := config_settings.get("annotate"):
-            result["annotate"] = annotate.lower() == "true"
-
-        if nthreads := config_settings.get("nthreads"):
+        for key, convert in _BUILD_SETTINGS:
+            if not (value := config_settings.get(key)):
+                continue
             try:
-                result["nthreads"] = int(nthreads)
+                result[key] = convert(value)
             except ValueError:
-                logger.error(f"Invalid nthreads value: {nthreads}")
-
-        if force := config_settings.get("force"):
-            result["force"] = force.lower() == "true"
-
+                logger.error(f"Invalid {key} value: {value}")
     except Exception as e:
         logger.error(f"Error parsing config settings: {e}")
         return {}
@@ -333,11 +697,112 @@ def _parse_build_settings(config_settings: dict | None = None) -> dict[str, bool
     return result
 
 
+def _outdated_extensions(
+    ext_modules: List[Extension], cythonize_kwargs: dict
+) -> tuple[IncrementalState, List[Extension]]:
+    """The extensions an incremental build has to rebuild, see
+    IncrementalState."""
+    # Shared by all profiles, like the extensions built in place
+    state = IncrementalState.load(Path("build"))
+    outdated = state.outdated(ext_modules, cythonize_kwargs)
+    logger.info(state.summary(len(ext_modules)))
+    return state, outdated
+
+
+def _apply_pgo(ext_modules: List[Extension], pgo: ProfileGuidedBuild) -> None:
+    for ext in ext_modules:
+        ext.extra_compile_args += pgo.compile_args
+        ext.extra_link_args += pgo.link_args
+
+
+def _build_pipeline(
+    project: PyProject, cythonize_kwargs: dict
+) -> Optional[BuildPipeline]:
+    """Pipeline that cythonizes the extensions as build_ext compiles them,
+    None if pipelining is disabled."""
+    if not _CONFIG_OPTIONS.get("pipeline", _hwh_config(project).cython.pipeline):
+        return None
+    cache = _get_cache(_hwh_config(project).cache, "cython")
+    return BuildPipeline(
+        cythonize_kwargs["nthreads"],
+        partial(
+            _cythonize_one,
+            cache_root=cache.root if cache else None,
+            cache_size=cache.max_size if cache else 0,
+            cythonize_kwargs=cythonize_kwargs,
+        ),
+    )
+
+
+def _stage_build(
+    dist: Distribution, cmd, ext_modules: List[Extension], inplace: bool
+) -> None:
+    """Build the pure Python modules into the staging directory next to the
+    extensions, and copy the extensions in place if inplace is set."""
+    dist.script_name = "fubar"
+    build_py = dist.get_command_obj("build_py")
+    dist.run_command("build_py")
+    outputs = [cmd.get_ext_fullpath(ext.name) for ext in ext_modules]
+    _prune_staging(
+        _staging_dir(), outputs + build_py.get_outputs(include_bytecode=False)
+    )
+    if inplace:
+        # Editable installs import the extensions from the sources
+        cmd.inplace = True
+        for ext, output in zip(ext_modules, outputs, strict=True):
+            shutil.copy2(output, cmd.get_ext_fullpath(ext.name))
+        cmd.inplace = False
+
+
+def _build_ext_command(
+    dist: Distribution,
+    project: PyProject,
+    ext_modules: List[Extension],
+    inplace: bool,
+    stage: bool,
+    pipeline: Optional[BuildPipeline],
+    pgo: Optional[ProfileGuidedBuild],
+):
+    """Finalized build_ext command of the build, see _build_extension."""
+    # Imports the setuptools build commands, which the metadata hooks don't need
+    from .build_ext import EditableBuildExt
+
+    cmd = EditableBuildExt(dist)
+    cmd.project = project
+    cmd.inplace = inplace and not stage
+    cmd.staged = stage
+    cmd.pipeline = pipeline
+    if pgo is not None:
+        # Extensions built with other profiles may look up to date
+        cmd.force = True
+    cmd.ensure_finalized()
+    if pgo is not None and pgo.profile_dir is None:
+        pgo.stash([cmd.get_ext_fullpath(ext.name) for ext in ext_modules])
+    return cmd
+
+
 def _build_extension(
-    inplace: bool = False, config_settings={}
+    inplace: bool = False,
+    config_settings: Optional[dict] = None,
+    incremental: bool = False,
+    modules: Optional[list[str]] = None,
+    project: Optional[PyProject] = None,
+    pgo: Optional[ProfileGuidedBuild] = None,
+    stage: bool = False,
+    force: bool = False,
 ) -> Optional[dict[str, Any]]:
     """Build the extension modules with better editable install handling.
 
+    incremental: only build extensions whose inputs or build options changed
+        since the last incremental build, see IncrementalState
+    modules: names of the extensions to build, all of them if not given
+    project: project to build, the one in the working directory by default
+    pgo: build instrumented extensions for it, or optimized ones once it has
+        profiles
+    stage: build the extensions and pure Python modules of a wheel into its
+        staging directory, see _staging_dir. Extensions are copied in place
+        from there if inplace is set as well.
+    force: build even if this process already built the extensions
     returns: dict of kwargs for Distribution object
     """
 
@@ -345,19 +810,40 @@ def _build_extension(
     logger.debug(f"\n with config {config_settings}")
     global _EXTENSIONS_BUILT
 
-    if _EXTENSIONS_BUILT:
+    if _EXTENSIONS_BUILT and not force:
         logger.debug("Extensions already built, skipping")
         return
 
-    project = PyProject(Path())
+    project = project or load_project()
     name = project.package_name
 
+    ext_modules, cythonize_kwargs = _get_extensions(project, config_settings)
+    if modules is not None:
+        ext_modules = [ext for ext in ext_modules if ext.name in modules]
+    # Reported on once built, including the ones that are up to date
+    annotated = [(ext.name, ext.sources[0]) for ext in ext_modules]
+    state = None
+    if incremental:
+        state, ext_modules = _outdated_extensions(ext_modules, cythonize_kwargs)
+    _use_generated_sources(project, ext_modules, cythonize_kwargs)
+    if pgo is not None:
+        _apply_pgo(ext_modules, pgo)
+
+    # Pipelined extensions are cythonized by build_ext as it compiles them
+    pipeline = _build_pipeline(project, cythonize_kwargs)
+    if pipeline is None:
+        ext_modules = _cythonize_extensions(project, ext_modules, cythonize_kwargs)
+
     dist_kwargs = {
         "name": name,
         "version": str(project.package_version),
-        "ext_modules": _get_ext_modules(project, config_settings=config_settings),
+        "ext_modules": ext_modules,
         "packages": project.packages,
-        "package_data": {pkg: ["*.pxd", "*.so"] for pkg in project.packages},
+        # Extensions built in place end up in wheels as package data, staged
+        # builds leave them alone
+        "package_data": {
+            pkg: ["*.pxd"] if stage else ["*.pxd", "*.so"] for pkg in project.packages
+        },
         "include_package_data": True,
     }
 
@@ -365,58 +851,224 @@ def _build_extension(
 
     dist = Distribution(dist_kwargs)
     dist.has_ext_modules = lambda: True
+    _set_build_base(dist, stage)
 
-    cmd = EditableBuildExt(dist)
-    cmd.inplace = inplace
-    cmd.ensure_finalized()
+    cmd = _build_ext_command(dist, project, ext_modules, inplace, stage, pipeline, pgo)
     cmd.run()
 
+    if cythonize_kwargs["annotate"]:
+        with report.span("annotation"):
+            _check_annotation(project, annotated)
+
+    if stage:
+        with report.span("stage"):
+            _stage_build(dist, cmd, ext_modules, inplace)
+
+    if pipeline is not None:
+        logger.info(
+            f"Pipelined {len(ext_modules)} extensions, "
+            f"{pipeline.cache_hits} restored from the Cython cache"
+        )
+
+    if state is not None:
+        built = [(ext, cmd.get_ext_fullpath(ext.name)) for ext in ext_modules]
+        state.record(built, dict(annotated), cythonize_kwargs)
+        state.profile = _profile()
+        state.save()
+
     _EXTENSIONS_BUILT = True
     logger.debug("=== Finished _build_extension ===\n")
     return dist_kwargs
 
 
-def build_wheel(wheel_directory, config_settings=None, metadata_directory=None):
-    """Build wheel with explicit editable install handling."""
+def _python_interaction_thresholds(project: PyProject) -> dict[str, int]:
+    """max_python_interaction of [tool.hwh.annotation], a value passed as a
+    build setting applies to every function."""
+    if (limit := (_CONFIG_OPTIONS or {}).get("max_python_interaction")) is not None:
+        return {"*": limit}
+    return _hwh_config(project).annotation.max_python_interaction
+
+
+def _check_annotation(project: PyProject, modules: list[tuple[str, str]]) -> None:
+    """Write the Python interaction report of the annotated modules and fail
+    the build if a function exceeds its max_python_interaction."""
+    config = _hwh_config(project).annotation
+    report_path = Path(
+        (_CONFIG_OPTIONS or {}).get("annotation_report")
+        or config.report
+        or _build_dir() / "hwh" / "annotation.json"
+    )
+    annotation = annotation_report(modules)
+    write_report(annotation, report_path)
+
+    if found := violations(annotation, _python_interaction_thresholds(project)):
+        for violation in found:
+            logger.error(violation)
+        raise RuntimeError(
+            f"{len(found)} functions exceed max_python_interaction, see {report_path}"
+        )
 
-    setup_logging(config_settings)
-    logger.info("=== Starting build_wheel ===")
 
-    project = PyProject(Path())
+def _train_pgo(
+    project: PyProject, config_settings: Optional[dict]
+) -> Optional[ProfileGuidedBuild]:
+    """Profiles to build the extensions with if PGO is enabled, restored from
+    the build cache or trained against an instrumented build."""
+    config = _hwh_config(project).pgo
+    if not _parse_build_settings(config_settings).get("pgo", config.enabled):
+        return None
 
-    # Build extensions first, this now handles all the Distribution setup
-    dist_kwargs = _build_extension(
-        _is_editable_install(), config_settings=config_settings
+    ext_modules, cythonize_kwargs = _get_extensions(project, config_settings)
+    pgo = ProfileGuidedBuild(
+        config, _build_dir(), _get_cache(_hwh_config(project).cache, "pgo")
     )
+    key = pgo.key(ext_modules, cythonize_kwargs)
+    if pgo.restore(key):
+        return pgo
+
+    # In place, so the training imports them like it would in development
+    logger.info("PGO: building instrumented extensions")
+    _build_extension(True, config_settings, project=project, pgo=pgo)
+    with report.span("pgo"):
+        pgo.train(
+            sorted({os.path.abspath(where) for where in project.package_where.values()})
+        )
+    pgo.collect(key)
+    return pgo
 
-    from wheel.bdist_wheel import bdist_wheel as wheel_command
 
-    class BdistWheelCommand(wheel_command):
-        def finalize_options(self):
-            super().finalize_options()
-            self.root_is_pure = False
-            self.user_options = config_settings
+def _staging_dir() -> Path:
+    """Directory the files of a wheel are built into, laid out like the wheel.
 
-        def run(self):
-            logger.debug("Running custom bdist_wheel command")
-            super().run()
+    Extensions are built into it once, then the wheel is assembled from it
+    without running build_ext again.
+    """
+    return _build_dir() / "wheel"
 
-    # Create distribution using same config from _build_extension
-    dist = Distribution(dist_kwargs)
-    dist.cmdclass = {"build_ext": EditableBuildExt}
-    dist.has_ext_modules = lambda: True
 
-    cmd = BdistWheelCommand(dist)
-    cmd.dist_dir = wheel_directory
-    cmd.distribution.script_name = "fubar"
-    cmd.ensure_finalized()
-    logger.debug("Starting wheel build")
-    cmd.run()
-    logger.debug("Finished wheel build")
+def _prune_staging(staging: Path, outputs: list[str]) -> None:
+    """Remove files left in the staging directory by earlier builds, such as
+    modules that were deleted since."""
+    keep = {os.path.abspath(output) for output in outputs}
+    for dirpath, _, filenames in os.walk(staging):
+        for filename in filenames:
+            path = os.path.abspath(os.path.join(dirpath, filename))
+            if path not in keep:
+                logger.debug(f"Removing stale {path} from {staging}")
+                os.remove(path)
+
+
+def _set_build_base(dist: Distribution, stage: bool = False) -> None:
+    """Build in the build directory of the selected profile, and into the
+    wheel staging directory if stage is set."""
+    options = dist.get_option_dict("build")
+    options["build_base"] = ("hwh-backend", str(_build_dir()))
+    if stage:
+        options["build_lib"] = ("hwh-backend", str(_staging_dir()))
+
+
+def build_wheel(wheel_directory, config_settings=None, metadata_directory=None):
+    """Build wheel with explicit editable install handling."""
+
+    setup_logging(config_settings)
+    logger.info("=== Starting build_wheel ===")
+    _start_report(config_settings)
+    try:
+        with report.span("config"):
+            project = load_project()
+            _hwh_config(project)
+        pgo = _train_pgo(project, config_settings)
+
+        # Build the extensions and modules once into the staging directory, this
+        # handles all the Distribution setup
+        dist_kwargs = _build_extension(
+            _is_editable_install(project),
+            config_settings=config_settings,
+            project=project,
+            pgo=pgo,
+            stage=True,
+            # Again after the instrumented build of the PGO training
+            force=pgo is not None,
+        )
 
-    # Find the built wheel
-    wheel_path = next(Path(wheel_directory).glob("*.whl"))
-    logger.debug(f"Built wheel: {wheel_path}")
+        wheel_config = project.get_hwh_config().wheel
+        strip = Strip(_CONFIG_OPTIONS.get("strip", wheel_config.strip))
+        compression = _CONFIG_OPTIONS.get("compression", wheel_config.compression)
+        debug_dir = None
+        if strip != Strip.OFF and (
+            wheel_config.debug_dir or wheel_config.debug_archive
+        ):
+            debug_dir = Path(
+                wheel_config.debug_dir or tempfile.mkdtemp(prefix="hwh-debug-")
+            ).absolute()
+        debug_files = []
+
+        # Create distribution using same config from _build_extension, it only
+        # provides the metadata and the tags of the wheel
+        dist = Distribution(dist_kwargs)
+        dist.has_ext_modules = lambda: True
+        dist.script_name = "fubar"
+        _set_build_base(dist, stage=True)
+        bdist_wheel = dist.get_command_obj("bdist_wheel")
+        bdist_wheel.ensure_finalized()
+        tag = "-".join(bdist_wheel.get_tag())
+        wheel_path = Path(wheel_directory) / f"{bdist_wheel.wheel_dist_name}-{tag}.whl"
+        wheel_path.parent.mkdir(parents=True, exist_ok=True)
+
+        staging = _staging_dir()
+        files = tree_files(staging)
+        with tempfile.TemporaryDirectory(prefix="hwh-wheel-") as tmp:
+            if strip != Strip.OFF:
+                # The staged extensions keep their debug info
+                stripped = Path(tmp) / "stripped"
+                with report.span("strip"):
+                    debug_files = strip_extensions(staging, strip, debug_dir, stripped)
+                files.update(tree_files(stripped))
+
+            logger.debug("Starting wheel build")
+            with report.span("wheel"):
+                # Reuse the metadata prepared for the frontend, if it passed it.
+                # Frontends pass either the .dist-info or the directory holding it.
+                dist_info = (
+                    Path(metadata_directory)
+                    if metadata_directory
+                    else write_dist_info(project, Path(tmp))
+                )
+                if dist_info.suffix != ".dist-info":
+                    dist_info /= dist_info_name(project)
+                bdist_wheel.write_wheelfile(tmp)
+                writer = WheelWriter(
+                    wheel_path,
+                    dist_info.name,
+                    compression,
+                    _CONFIG_OPTIONS.get(
+                        "nthreads", _hwh_config(project).cython.nthreads
+                    ),
+                )
+                for name in sorted(files):
+                    writer.add_file(name, files[name])
+                for name, path in sorted(tree_files(dist_info).items()):
+                    writer.add_file(f"{dist_info.name}/{name}", path)
+                writer.add_file(f"{dist_info.name}/WHEEL", Path(tmp) / "WHEEL")
+                # Lets hwh builds of dependent projects skip reading RECORD
+                writer.add_bytes(
+                    f"{dist_info.name}/{PATHS_NAME}",
+                    json.dumps(exported_paths(files), indent=1).encode(),
+                )
+                writer.write()
+            logger.debug("Finished wheel build")
+
+        logger.debug(f"Built wheel: {wheel_path}")
+        if wheel_config.debug_archive and debug_files:
+            _write_debug_archive(
+                wheel_path.with_name(f"{wheel_path.stem}.debug.zip"),
+                debug_dir,
+                debug_files,
+            )
+            if not wheel_config.debug_dir:
+                shutil.rmtree(debug_dir)
+    finally:
+        report.finish()
     logger.debug("=== Finished build_wheel ===\n")
     return wheel_path.name
 
@@ -430,21 +1082,238 @@ def build_editable(wheel_directory, config_settings=None, metadata_directory=Non
     logger.debug(f"Config settings: {config_settings}")
     logger.debug(f"Metadata directory: {metadata_directory}")
 
-    # Editable install=inplace
-    logger.debug(f"passing config {config_settings}")
-    _build_extension(inplace=True, config_settings=config_settings)
+    _start_report(config_settings)
+    try:
+        # Editable install=inplace
+        logger.debug(f"passing config {config_settings}")
+        with report.span("config"):
+            project = load_project()
+            _hwh_config(project)
+        _build_extension(
+            inplace=True,
+            config_settings=config_settings,
+            incremental=True,
+            project=project,
+        )
+
+        from setuptools.build_meta import build_editable as _build_editable
 
-    logger.debug("Calling setuptools build_editable")
-    result = _build_editable(wheel_directory, config_settings, metadata_directory)
-    logger.debug(f"Editable build result: {result}")
+        logger.debug("Calling setuptools build_editable")
+        with report.span("wheel"):
+            result = _build_editable(
+                wheel_directory, config_settings, metadata_directory
+            )
+        logger.debug(f"Editable build result: {result}")
+
+        if (_CONFIG_OPTIONS or {}).get(
+            "rebuild_on_import", _hwh_config(project).cython.rebuild_on_import
+        ):
+            _add_import_hook(Path(wheel_directory) / result, project)
+    finally:
+        report.finish()
     logger.debug("=== Finished build_editable ===\n")
     return result
 
 
+def _start_report(config_settings: Optional[dict]) -> None:
+    """Collect a build report and/or trace if requested by the report and
+    trace settings."""
+    settings = _parse_build_settings(config_settings)
+    report_path = settings.get("report")
+    trace_path = settings.get("trace")
+    if report_path or trace_path:
+        report.start(
+            Path(report_path).absolute() if report_path else None,
+            Path(trace_path).absolute() if trace_path else None,
+        )
+
+
+def _write_debug_archive(
+    archive_path: Path, debug_dir: Path, debug_files: list[Path]
+) -> None:
+    """Zip the debug files of a wheel, laid out like its extensions."""
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for debug_file in debug_files:
+            archive.write(debug_file, debug_file.relative_to(debug_dir).as_posix())
+    logger.info(f"Debug info of {len(debug_files)} extensions in {archive_path}")
+
+
+def _add_import_hook(wheel_path: Path, project: PyProject) -> None:
+    """Make the editable wheel install hwh_backend.import_hook.RebuildFinder
+    at interpreter startup, if hwh_backend is importable there."""
+    hook_module = f"__hwh_import_hook_{project.package_name.replace('-', '_')}"
+    hook_source = (
+        "try:\n"
+        "    from hwh_backend.import_hook import install\n"
+        "except ImportError:\n"
+        "    pass\n"
+        "else:\n"
+        f"    install({str(Path.cwd())!r})\n"
+    )
+    logger.debug(f"Adding import hook {hook_module} to {wheel_path}")
+    _add_files_to_wheel(
+        wheel_path,
+        {
+            f"{hook_module}.py": hook_source.encode(),
+            f"{hook_module}.pth": f"import {hook_module}\n".encode(),
+        },
+    )
+
+
+def _add_files_to_wheel(wheel_path: Path, files: dict[str, bytes]) -> None:
+    """Add files to the root of a wheel, keeping its RECORD up to date."""
+    tmp_path = wheel_path.with_suffix(".tmp")
+    with (
+        zipfile.ZipFile(wheel_path) as src,
+        zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as dst,
+    ):
+        record_name = next(
+            name for name in src.namelist() if name.endswith(".dist-info/RECORD")
+        )
+        for info in src.infolist():
+            if info.filename != record_name:
+                dst.writestr(info, src.read(info))
+
+        record = src.read(record_name).decode()
+        if record and not record.endswith("\n"):
+            record += "\n"
+        for name, data in files.items():
+            dst.writestr(name, data)
+            digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest())
+            record += f"{name},sha256={digest.rstrip(b'=').decode()},{len(data)}\n"
+        dst.writestr(record_name, record)
+    tmp_path.replace(wheel_path)
+
+
 def build_sdist(sdist_directory, config_settings=None):
-    """Build source distribution. How is that meant to work with compiled code?"""
+    """Build source distribution. How is that meant to work with compiled code?
+
+    With [tool.hwh.sdist] cythonize, the generated C is shipped as well, see
+    GeneratedSources.
+    """
 
     setup_logging(config_settings)
     from setuptools.build_meta import build_sdist as _build_sdist
 
-    return _build_sdist(sdist_directory, config_settings)
+    result = _build_sdist(sdist_directory, config_settings)
+
+    project = load_project()
+    settings = _parse_build_settings(config_settings)
+    sdist_config = project.get_hwh_config(settings.get("profile")).sdist
+    if settings.get("sdist_cythonize", sdist_config.cythonize):
+        _add_generated_sources(Path(sdist_directory) / result, project, config_settings)
+    return result
+
+
+def _add_generated_sources(
+    sdist_path: Path, project: PyProject, config_settings: Optional[dict]
+) -> None:
+    """Cythonize the extensions and add the generated C, the inputs it was
+    generated from and their manifest to the sdist."""
+    ext_modules, cythonize_kwargs = _get_extensions(project, config_settings)
+    tree = dependency_tree(cythonize_kwargs["include_path"])
+    pyx_files = {ext.name: ext.sources[0] for ext in ext_modules}
+    # Compared against the extensions of builds from the sdist, before their
+    # `# distutils:` comments are applied
+    languages = {ext.name: ext.language for ext in ext_modules}
+    inputs = {
+        ext.name: module_inputs(tree, Path(ext.sources[0])) for ext in ext_modules
+    }
+    directives = {
+        ext.name: extension_directives(ext, cythonize_kwargs["compiler_directives"])
+        for ext in ext_modules
+    }
+    with report.span("cythonize"):
+        cythonized = _cythonize_extensions(project, ext_modules, cythonize_kwargs)
+
+    generated = GeneratedSources(project.project_dir)
+    files = {}
+    for ext in cythonized:
+        generated.add(
+            ext.name,
+            pyx_files[ext.name],
+            ext.sources[0],
+            languages[ext.name],
+            directives[ext.name],
+            inputs[ext.name],
+        )
+        paths = generated_artifacts(Path(ext.sources[0])) + [
+            Path(path) for path in inputs[ext.name]
+        ]
+        for path in paths:
+            if (rel_path := relative_path(path, project.project_dir)) is not None:
+                files[rel_path] = path
+    files[MANIFEST_NAME] = generated.dumps()
+    _add_files_to_sdist(sdist_path, files)
+    logger.info(f"Added generated sources of {len(cythonized)} extensions to sdist")
+
+
+def _add_files_to_sdist(sdist_path: Path, files: dict[str, Path | bytes]) -> None:
+    """Add files to an sdist, relative to its top directory, replacing the
+    ones it already has."""
+    tmp_path = sdist_path.with_name(f"{sdist_path.name}.tmp")
+    with (
+        tarfile.open(sdist_path, "r:gz") as src,
+        tarfile.open(tmp_path, "w:gz", format=tarfile.PAX_FORMAT) as dst,
+    ):
+        members = src.getmembers()
+        top = members[0].name.split("/")[0]
+        added = {f"{top}/{name}" for name in files}
+        for member in members:
+            if member.name not in added:
+                dst.addfile(
+                    member, src.extractfile(member) if member.isfile() else None
+                )
+
+        mtime = max(
+            (int(os.stat(f).st_mtime) for f in files.values() if isinstance(f, Path)),
+            default=0,
+        )
+        for name, source in sorted(files.items()):
+            data = source if isinstance(source, bytes) else source.read_bytes()
+            info = tarfile.TarInfo(f"{top}/{name}")
+            info.size = len(data)
+            info.mode = 0o644
+            info.mtime = (
+                mtime if isinstance(source, bytes) else int(os.stat(source).st_mtime)
+            )
+            dst.addfile(info, io.BytesIO(data))
+    tmp_path.replace(sdist_path)
+
+
+def prepare_metadata_for_build_wheel(metadata_directory, config_settings=None):
+    """Write the .dist-info of the wheel from pyproject.toml, without building
+    anything, so that frontends resolving dependencies don't compile."""
+    setup_logging(config_settings)
+    dist_info = write_dist_info(load_project(), Path(metadata_directory))
+    logger.debug(f"Prepared metadata in {dist_info}")
+    return dist_info.name
+
+
+def prepare_metadata_for_build_editable(metadata_directory, config_settings=None):
+    """Write the .dist-info of the editable wheel, which is the same as the
+    one of the wheel."""
+    return prepare_metadata_for_build_wheel(metadata_directory, config_settings)
+
+
+def _build_requires(config_settings: Optional[dict]) -> list[str]:
+    """Requirements of a build besides the build-system ones, for the
+    configuration and profile of the build."""
+    profile = _parse_build_settings(config_settings).get("profile")
+    config = load_project().get_hwh_config(profile).cython
+    return ["numpy"] if config.use_numpy_include else []
+
+
+def get_requires_for_build_wheel(config_settings=None):
+    setup_logging(config_settings)
+    return _build_requires(config_settings)
+
+
+def get_requires_for_build_editable(config_settings=None):
+    setup_logging(config_settings)
+    return _build_requires(config_settings)
+
+
+def get_requires_for_build_sdist(config_settings=None):
+    """sdists don't build extensions, nothing else is needed."""
+    return []
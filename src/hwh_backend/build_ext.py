@@ -0,0 +1,143 @@
+import shutil
+from pathlib import Path
+from typing import Optional
+
+from setuptools.command.build_ext import build_ext
+
+from . import build, report
+from .build import _get_cache, _hwh_config, _is_editable_install
+from .executor import CompileExecutor, install_executor, load_executor
+from .logger import logger
+from .object_cache import ObjectCache
+from .parser import PyProject, load_project
+from .pipeline import BuildPipeline
+
+
+class EditableBuildExt(build_ext):
+    """Custom build_ext that handles editable installs properly."""
+
+    def initialize_options(self):
+        super().initialize_options()
+        self._is_editable = False
+        self._original_build_lib = None
+        # Shared project of the build, see load_project
+        self.project: Optional[PyProject] = None
+        # Set to cythonize extensions while they are compiled, see BuildPipeline
+        self.pipeline: Optional[BuildPipeline] = None
+        # Building into the staging directory of a wheel, never in place
+        self.staged = False
+
+    def finalize_options(self):
+        """Finalize build options and set up editable install if needed."""
+        super().finalize_options()
+        if self.project is None:
+            self.project = load_project()
+        self._is_editable = not self.staged and _is_editable_install(self.project)
+
+        if self._is_editable:
+            logger.debug("Configuring for editable install")
+            # Store original build_lib for later
+            self._original_build_lib = self.build_lib
+            # For editable install, build directly in source tree
+            self.inplace = True
+            self.build_lib = str(Path.cwd())
+        else:
+            logger.debug("Configuring for regular install")
+
+        config = _hwh_config(self.project).cython
+        nthreads = config.nthreads
+        if build._CONFIG_OPTIONS and "nthreads" in build._CONFIG_OPTIONS:
+            nthreads = build._CONFIG_OPTIONS["nthreads"]
+            logger.debug("nthreads overridden by command line option")
+        logger.debug(f"Using nthreads={nthreads}")
+        self.parallel = nthreads
+
+    def run(self):
+        """Run the build process."""
+        logger.debug(f"Running build_ext (editable={self._is_editable})")
+        logger.debug(f"Build lib: {self.build_lib}")
+        logger.debug(f"Build temp: {self.build_temp}")
+
+        # Run the actual build
+        super().run()
+
+    def build_extensions(self):
+        """Build extensions, serving compiled objects from the build cache."""
+        cache = None
+        executor = None
+        if self.compiler.compiler_type == "unix":
+            cache = _get_cache(_hwh_config(self.project).cache, "objects")
+            executor = self._executor()
+        if executor is not None:
+            # Cache hits don't reach the executor
+            install_executor(self.compiler, executor)
+            if executor.jobs:
+                self.parallel = executor.jobs
+        if cache is not None:
+            ObjectCache(self.compiler, cache).install()
+
+        try:
+            with report.instrument_compiler(self.compiler):
+                if self.pipeline is not None:
+                    self.check_extensions_list(self.extensions)
+                    self.pipeline.run(self.extensions, self.build_extension)
+                else:
+                    super().build_extensions()
+        finally:
+            if executor is not None:
+                executor.close()
+
+        if cache is not None and cache.hits + cache.misses:
+            logger.info(
+                f"Object cache: {cache.hits} hits, {cache.misses} misses "
+                f"in {cache.root}"
+            )
+
+    def _executor(self) -> Optional[CompileExecutor]:
+        """Executor of [tool.hwh.compile], None to compile as usual."""
+        config = _hwh_config(self.project).compile
+        options = build._CONFIG_OPTIONS or {}
+        workers = config.workers
+        if "workers" in options:
+            workers = [w for w in options["workers"].split(",") if w]
+        name = options.get("executor") or (
+            "workers" if "workers" in options else config.executor
+        )
+        if name == "local":
+            return None
+        return load_executor(
+            name,
+            workers,
+            nthreads=self.parallel or 1,
+            jobs=config.jobs,
+            timeout=config.timeout,
+        )
+
+    def build_extension(self, ext):
+        with report.extension(ext.name):
+            super().build_extension(ext)
+
+    def _copy_extension_files(self):
+        """Copy extension files to their final locations for editable installs."""
+        if not self._original_build_lib:
+            return
+
+        build_lib_path = Path(self._original_build_lib)
+        source_path = Path.cwd()
+
+        logger.debug(f"Copying extension files from {build_lib_path} to {source_path}")
+
+        # Find all built extension files
+        for ext in self.extensions:
+            # Get the full path to the built extension
+            ext_path = self.get_ext_fullpath(ext.name)
+            rel_path = Path(ext_path).relative_to(build_lib_path)
+            target_path = source_path / rel_path
+
+            # Ensure target directory exists
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+
+            # Copy the extension file
+            if ext_path.exists():
+                shutil.copy2(ext_path, target_path)
+                logger.debug(f"Copied {ext_path} to {target_path}")
@@ -0,0 +1,155 @@
+import fcntl
+import filecmp
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from .logger import logger
+
+# Evict down to this fraction of max_size, so that a full cache doesn't
+# trigger eviction on every single store.
+_EVICT_RATIO = 0.85
+
+
+def file_digest(path: Path) -> str:
+    """sha256 of the file contents."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class BuildCache:
+    """Content-addressed on-disk store for build artifacts.
+
+    Entries are directories named after their key and hold one or more files.
+    The cache may be shared by concurrent builds: entries are staged in a
+    private directory and renamed into place, and readers hold a shared
+    lock so that eviction never deletes an entry while it's being copied out.
+    Entry directory mtimes are bumped on every hit and used for LRU eviction
+    once the total size grows past max_size bytes.
+    """
+
+    def __init__(self, root: Path, max_size: int):
+        self.root = Path(root)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # Builds look up entries from worker threads
+        self._stats_lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+        (self.root / "tmp").mkdir(exist_ok=True)
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    @contextmanager
+    def _lock(self, exclusive: bool) -> Iterator[None]:
+        with open(self.root / ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get(self, key: str, dest_dir: Path) -> Optional[list[Path]]:
+        """Copy the files of entry key into dest_dir. Files dest_dir already
+        has with the same content are left alone, so that timestamp-based
+        tools don't rebuild what they made of them.
+
+        returns: restored file paths, or None on a cache miss
+        """
+        entry = self._entry_dir(key)
+        with self._lock(exclusive=False):
+            if not entry.is_dir():
+                with self._stats_lock:
+                    self.misses += 1
+                return None
+            restored = []
+            dest_dir.mkdir(parents=True, exist_ok=True)
+            for cached in sorted(entry.iterdir()):
+                target = dest_dir / cached.name
+                if not (
+                    target.is_file() and filecmp.cmp(cached, target, shallow=False)
+                ):
+                    # copyfile (not copy2) so the restored file is newer than
+                    # its inputs and timestamp-based tools see it as up to date.
+                    shutil.copyfile(cached, target)
+                restored.append(target)
+            os.utime(entry)
+        with self._stats_lock:
+            self.hits += 1
+        logger.debug(f"Cache hit {key} in {self.root}")
+        return restored
+
+    def put(self, key: str, files: Iterable[Path]) -> None:
+        """Store files under key. Existing entries are left untouched."""
+        entry = self._entry_dir(key)
+        if entry.is_dir():
+            return
+
+        staging = self.root / "tmp" / uuid.uuid4().hex
+        staging.mkdir()
+        size = 0
+        try:
+            for path in files:
+                shutil.copyfile(path, staging / path.name)
+                size += path.stat().st_size
+
+            with self._lock(exclusive=True):
+                entry.parent.mkdir(exist_ok=True)
+                try:
+                    staging.rename(entry)
+                except OSError:
+                    # Lost the race against another build storing the same key
+                    return
+                total = self._add_size(size)
+                if total > self.max_size:
+                    self._evict()
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        logger.debug(f"Cache store {key} ({size} bytes) in {self.root}")
+
+    def _add_size(self, size: int) -> int:
+        """Update the running size total. Caller must hold the exclusive lock."""
+        size_file = self.root / "size"
+        try:
+            total = int(size_file.read_text())
+        except (OSError, ValueError):
+            total = self._scan_size()
+        else:
+            total += size
+        size_file.write_text(str(total))
+        return total
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        for shard in self.root.iterdir():
+            if not shard.is_dir() or shard.name == "tmp":
+                continue
+            for entry in shard.iterdir():
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        """Drop least recently used entries. Caller must hold the exclusive lock."""
+        entries = sorted(self._entries(), key=lambda e: e[0])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_size * _EVICT_RATIO)
+        for _, size, entry in entries:
+            if total <= target:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            logger.debug(f"Cache evicted {entry.name} ({size} bytes)")
+        (self.root / "size").write_text(str(total))
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from setuptools.extension import Extension
+
+from .cache import file_digest
+
+# Cython is imported where it's used, so that the hooks that don't build
+# don't import it
+if TYPE_CHECKING:
+    from Cython.Build.Dependencies import DependencyTree
+
+
+def dependency_tree(include_path: list[str]) -> "DependencyTree":
+    """Cython's cimport/include dependency tree, resolved like cythonize() does."""
+    from Cython.Build.Dependencies import DependencyTree
+    from Cython.Compiler.Main import CompilationOptions
+
+    options = CompilationOptions(include_path=list(include_path))
+    return DependencyTree(options.create_context(), quiet=True)
+
+
+def extension_directives(ext: Extension, compiler_directives: dict) -> dict:
+    """Project-wide compiler directives with the extension's own on top,
+    see ModuleOverride."""
+    return {**compiler_directives, **getattr(ext, "cython_directives", {})}
+
+
+def extension_fields(ext: Extension) -> dict:
+    """The Extension attributes cythonize() may set from the `# distutils:`
+    comments of a .pyx, the sources included."""
+    from Cython.Build.Dependencies import distutils_settings
+
+    return {
+        key: getattr(ext, key)
+        for key in distutils_settings
+        if key != "name" and hasattr(ext, key)
+    }
+
+
+def resolve_extension(tree: "DependencyTree", ext: Extension) -> Extension:
+    """ext with the `# distutils:` comments of its .pyx applied, the way
+    cythonize() applies them, without compiling it."""
+    from Cython.Build.Dependencies import create_extension_list
+
+    [resolved], _ = create_extension_list([ext], ctx=tree.context, quiet=True)
+    return resolved
+
+
+def module_inputs(tree: "DependencyTree", pyx_file: Path) -> list[str]:
+    """The .pyx and every transitively cimported .pxd and included .pxi."""
+    return sorted(tree.all_dependencies(str(pyx_file)))
+
+
+def cythonize_key(
+    tree: "DependencyTree",
+    module_name: str,
+    pyx_file: Path,
+    language: str,
+    compiler_directives: dict,
+    annotate: bool,
+) -> str:
+    """Content hash of everything that affects the code Cython generates.
+
+    Input files are identified by name and content only, so the key is stable
+    across the throwaway source copies pip makes for isolated builds.
+    """
+    import Cython
+
+    h = hashlib.sha256()
+    h.update(Cython.__version__.encode())
+    h.update(json.dumps(compiler_directives, sort_keys=True).encode())
+    h.update(
+        json.dumps([module_name, str(pyx_file), str(language), bool(annotate)]).encode()
+    )
+    inputs = sorted(
+        (os.path.basename(dep), file_digest(Path(dep)))
+        for dep in module_inputs(tree, pyx_file)
+    )
+    h.update(json.dumps(inputs).encode())
+    return h.hexdigest()
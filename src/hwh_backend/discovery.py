@@ -0,0 +1,285 @@
+import fnmatch
+import hashlib
+import json
+import os
+import subprocess
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .logger import logger
+
+# Directories that never hold sources of the package, besides hidden ones
+PRUNED_DIRS = {"__pycache__", "node_modules"}
+
+
+def is_glob(pattern: str) -> bool:
+    return any(char in pattern for char in "*?[")
+
+
+class ExcludeFilter:
+    """Matches directories against the exclude_dirs of the modules config.
+
+    Plain entries exclude the directory at that path, relative to the source
+    dir unless absolute. Glob patterns are matched against the path relative
+    to the source dir, where `*` also matches `/` and a leading `**/` matches
+    no directory as well, e.g. `**/tests` excludes every tests directory.
+    """
+
+    def __init__(self, source_dir: Path, exclude_dirs: list[str]):
+        self.paths = set()
+        self.patterns = []
+        for entry in exclude_dirs:
+            entry = entry.rstrip("/")
+            if is_glob(entry):
+                self.patterns.append(entry)
+            else:
+                self.paths.add(os.path.abspath(os.path.join(source_dir, entry)))
+
+    def excluded(self, path: str, rel_path: str) -> bool:
+        name = os.path.basename(rel_path)
+        if name.startswith(".") or name in PRUNED_DIRS:
+            return True
+        if self.paths and os.path.abspath(path) in self.paths:
+            return True
+        return any(
+            fnmatch.fnmatchcase(rel_path, pattern)
+            or (
+                pattern.startswith("**/") and fnmatch.fnmatchcase(rel_path, pattern[3:])
+            )
+            for pattern in self.patterns
+        )
+
+
+def walk_files(
+    source_dir: Path,
+    suffix: str,
+    exclude: ExcludeFilter,
+    visited: Optional[dict[str, tuple[int, str]]] = None,
+) -> list[Path]:
+    """Files with suffix under source_dir, in a single os.scandir pass.
+
+    Excluded directories and virtualenvs are pruned before descending into
+    them. Symlinked directories aren't followed.
+
+    visited: if given, the state of every walked directory is added to it,
+        see DiscoveryManifest
+    """
+    found = []
+    stack = [(str(source_dir), "")]
+    while stack:
+        dirpath, rel_dir = stack.pop()
+        try:
+            # Taken before listing, so changes while listing aren't missed
+            mtime_ns = os.stat(dirpath).st_mtime_ns if visited is not None else 0
+            entries = os.scandir(dirpath)
+        except OSError as e:
+            logger.debug(f"Skipping unreadable directory {dirpath}: {e}")
+            continue
+        names = []
+        with entries:
+            for entry in entries:
+                if _affects_discovery(entry):
+                    names.append(entry.name)
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if exclude.excluded(entry.path, rel_path) or os.path.exists(
+                        os.path.join(entry.path, "pyvenv.cfg")
+                    ):
+                        logger.debug(f"Pruned {entry.path}")
+                        continue
+                    stack.append((entry.path, rel_path))
+                elif entry.name.endswith(suffix):
+                    found.append(Path(entry.path))
+        if visited is not None:
+            visited[os.path.normpath(dirpath)] = (mtime_ns, _signature(names))
+    return sorted(found)
+
+
+def git_files(
+    source_dir: Path, suffix: str, exclude: ExcludeFilter
+) -> Optional[list[Path]]:
+    """Files with suffix under source_dir known to git: tracked ones and
+    untracked ones that aren't ignored. None if git can't list them."""
+    try:
+        result = subprocess.run(
+            ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"]
+            + ["--", f"*{suffix}"],
+            cwd=source_dir,
+            capture_output=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.debug(f"git ls-files failed in {source_dir}, walking it instead: {e}")
+        return None
+
+    excluded_dirs: dict[str, bool] = {}
+
+    def is_excluded(rel_dir: str) -> bool:
+        if not rel_dir:
+            return False
+        if rel_dir not in excluded_dirs:
+            excluded_dirs[rel_dir] = is_excluded(
+                os.path.dirname(rel_dir)
+            ) or exclude.excluded(os.path.join(source_dir, rel_dir), rel_dir)
+        return excluded_dirs[rel_dir]
+
+    found = []
+    for rel_path in os.fsdecode(result.stdout).split("\0"):
+        # Tracked files may have been deleted from the work tree
+        path = source_dir / rel_path
+        if rel_path and not is_excluded(os.path.dirname(rel_path)) and path.exists():
+            found.append(path)
+    return sorted(found)
+
+
+MANIFEST_VERSION = 1
+
+
+def _affects_discovery(entry: os.DirEntry) -> bool:
+    """Whether adding or removing the entry can change discovered modules."""
+    if entry.name.endswith(".pyx") or entry.name == "__init__.py":
+        return True
+    # Neither setuptools nor module names allow dots in package directories
+    return "." not in entry.name and entry.is_dir()
+
+
+def _signature(names: Iterable[str]) -> str:
+    return hashlib.sha256("\0".join(sorted(names)).encode()).hexdigest()
+
+
+def scan_dir(dirpath: str) -> tuple[int, str]:
+    """mtime of a directory and the signature of its entries that matter for
+    discovery."""
+    mtime_ns = os.stat(dirpath).st_mtime_ns
+    with os.scandir(dirpath) as entries:
+        names = [entry.name for entry in entries if _affects_discovery(entry)]
+    return mtime_ns, _signature(names)
+
+
+def package_search_dirs(
+    project_dir: Path, package_where: dict[str, str], build_dir: Path
+) -> list[str]:
+    """Directories whose entries decide which packages are found.
+
+    These are the directories packages are searched in, the package
+    directories and their subdirectories, which become packages once they
+    get an __init__.py. Directories setuptools never considers as packages
+    and the build directory are left out.
+    """
+    dirs = {
+        os.path.normpath(os.path.join(project_dir, where))
+        for where in package_where.values()
+    }
+    dirs |= {
+        os.path.normpath(os.path.join(project_dir, where, *package.split(".")))
+        for package, where in package_where.items()
+    }
+    build_dir = os.path.abspath(build_dir)
+    for dirpath in list(dirs):
+        try:
+            entries = list(os.scandir(dirpath))
+        except OSError:
+            continue
+        dirs |= {
+            os.path.normpath(entry.path)
+            for entry in entries
+            if entry.is_dir()
+            and "." not in entry.name
+            and entry.name != "__pycache__"
+            and os.path.abspath(entry.path) != build_dir
+        }
+    return sorted(dirs)
+
+
+class DiscoveryManifest:
+    """Packages and .pyx modules found by the last discovery of a project.
+
+    It is persisted as JSON under the build directory, along with the state
+    of every directory that was searched: its mtime and a signature of its
+    subdirectories, .pyx files and __init__.py. Adding, removing or renaming
+    files changes the mtime of their directory, so as long as no mtime
+    changed and the pyproject.toml is the same, the manifest is valid without
+    listing any directory. Directories with a new mtime, e.g. from built
+    extensions written next to their sources, are listed again and only
+    invalidate the manifest if their signature changed.
+    """
+
+    def __init__(self, path: Path, fingerprint: str):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.dirs: dict[str, tuple[int, str]] = {}
+        # Whether dirs got new mtimes in valid() and should be saved
+        self.updated = False
+        self.packages: list[str] = []
+        self.package_where: dict[str, str] = {}
+        # .pyx files and their module names, None if not stored
+        self.modules: Optional[list[tuple[str, str]]] = None
+
+    @classmethod
+    def load(cls, build_dir: Path, pyproject_path: Path) -> "DiscoveryManifest":
+        fingerprint = hashlib.sha256(pyproject_path.read_bytes()).hexdigest()
+        manifest = cls(build_dir / "hwh" / "discovery.json", fingerprint)
+        try:
+            data = json.loads(manifest.path.read_text())
+        except (OSError, ValueError):
+            return manifest
+
+        if (data.get("version"), data.get("fingerprint")) != (
+            MANIFEST_VERSION,
+            fingerprint,
+        ):
+            return manifest
+        manifest.dirs = {path: tuple(state) for path, state in data["dirs"].items()}
+        manifest.packages = data["packages"]
+        manifest.package_where = data["package_where"]
+        if data["modules"] is not None:
+            manifest.modules = [tuple(module) for module in data["modules"]]
+        return manifest
+
+    def valid(self) -> bool:
+        """Whether the searched directories are unchanged since discovery."""
+        if not self.dirs:
+            return False
+        for dirpath, (mtime_ns, signature) in self.dirs.items():
+            try:
+                if os.stat(dirpath).st_mtime_ns == mtime_ns:
+                    continue
+                state = scan_dir(dirpath)
+            except OSError:
+                return False
+            if state[1] != signature:
+                logger.debug(f"Discovery manifest outdated by {dirpath}")
+                return False
+            self.dirs[dirpath] = state
+            self.updated = True
+        return True
+
+    def reset(self) -> None:
+        self.dirs = {}
+        self.packages = []
+        self.package_where = {}
+        self.modules = None
+
+    def record_dirs(self, dirs: Iterable[str]) -> None:
+        # The build directory is created next to the packages on save
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        for dirpath in dirs:
+            if dirpath not in self.dirs:
+                try:
+                    self.dirs[dirpath] = scan_dir(dirpath)
+                except OSError:
+                    pass
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "fingerprint": self.fingerprint,
+            "dirs": self.dirs,
+            "packages": self.packages,
+            "package_where": self.package_where,
+            "modules": self.modules,
+        }
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, indent=1))
+        tmp.replace(self.path)
@@ -0,0 +1,91 @@
+import importlib
+from dataclasses import dataclass, field
+from typing import Callable
+
+from .logger import logger
+
+
+def compile_command(compiler, src: str, cc_args, extra_postargs) -> list[str]:
+    """Command line a distutils unix compiler compiles src with, without the
+    source and output file."""
+    compiler_so = compiler.compiler_so
+    if compiler.detect_language(src) == "c++":
+        compiler_so = getattr(compiler, "compiler_so_cxx", compiler_so)
+    return list(compiler_so) + list(cc_args) + list(extra_postargs or [])
+
+
+@dataclass
+class CompileJob:
+    """A single source file to compile into an object file."""
+
+    obj: str
+    src: str
+    # Full compile command, as compile_command() returns it
+    command: list[str]
+    language: str
+    # Compiles the job with the compiler itself, the way it does without an
+    # executor
+    compile_locally: Callable[[], None] = field(repr=False, compare=False)
+
+
+class CompileExecutor:
+    """Runs the compile jobs of a build, see install_executor.
+
+    compile() is called concurrently from the threads of build_ext and must
+    either produce job.obj or raise CompileError. Executors that can't run
+    a job fall back to job.compile_locally().
+    """
+
+    # Parallel compiles build_ext should run, None keeps nthreads
+    jobs = None
+
+    def compile(self, job: CompileJob) -> None:
+        job.compile_locally()
+
+    def close(self) -> None:
+        """Called once the build is done."""
+
+
+def install_executor(compiler, executor: CompileExecutor) -> None:
+    """Route all compilation of a distutils unix compiler through executor."""
+    compile_locally = compiler._compile
+
+    def _compile(obj, src, ext, cc_args, extra_postargs, pp_opts):
+        def local():
+            compile_locally(obj, src, ext, cc_args, extra_postargs, pp_opts)
+
+        executor.compile(
+            CompileJob(
+                obj,
+                src,
+                compile_command(compiler, src, cc_args, extra_postargs),
+                compiler.detect_language(src) or "c",
+                local,
+            )
+        )
+
+    compiler._compile = _compile
+
+
+def load_executor(name: str, workers: list[str], **kwargs) -> CompileExecutor:
+    """Executor selected by the executor option of [tool.hwh.compile].
+
+    name: "local", "workers", or "module:factory" for a callable that takes
+        the workers and keyword arguments and returns a CompileExecutor
+    """
+    match name:
+        case "local":
+            return CompileExecutor()
+        case "workers":
+            from .worker import WorkerExecutor
+
+            return WorkerExecutor(workers, **kwargs)
+    module_name, sep, attr = name.partition(":")
+    if not sep:
+        raise ValueError(
+            f"Invalid executor: {name}. Valid options ['local', 'workers', "
+            "'module:factory']"
+        )
+    factory = getattr(importlib.import_module(module_name), attr)
+    logger.debug(f"Using compile executor {name}")
+    return factory(workers, **kwargs)
@@ -0,0 +1,114 @@
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from setuptools.extension import Extension
+
+from .cache import file_digest
+from .logger import logger
+
+# Written to the root of sdists built with [tool.hwh.sdist] cythonize
+MANIFEST_NAME = "hwh-generated.json"
+MANIFEST_VERSION = 1
+
+
+def relative_path(path: str | Path, project_dir: Path) -> Optional[str]:
+    """path relative to project_dir, None if it's outside of it."""
+    rel_path = os.path.relpath(os.path.abspath(path), os.path.abspath(project_dir))
+    if rel_path.startswith(os.pardir):
+        return None
+    return Path(rel_path).as_posix()
+
+
+def generated_artifacts(c_file: Path) -> list[Path]:
+    """The generated C and the headers Cython writes next to it for public
+    and api declarations."""
+    return [c_file] + [
+        header
+        for header in (
+            c_file.with_suffix(".h"),
+            c_file.with_name(f"{c_file.stem}_api.h"),
+        )
+        if header.exists()
+    ]
+
+
+class GeneratedSources:
+    """Generated C shipped in an sdist, with the hashes of its inputs.
+
+    For every module the manifest records its .pyx, the generated file, the
+    language and compiler directives, and the sha256 of the .pyx and every
+    .pxd/.pxi it cimports or includes from the project. Builds from the sdist
+    compile the generated file instead of running Cython as long as all of
+    them match. Inputs outside of the project, such as the .pxd files of
+    Cython or of dependencies, aren't checked.
+    """
+
+    def __init__(self, project_dir: Path, modules: Optional[dict] = None):
+        self.project_dir = project_dir
+        self.modules: dict[str, dict] = modules or {}
+
+    @classmethod
+    def load(cls, project_dir: Path) -> Optional["GeneratedSources"]:
+        try:
+            data = json.loads((project_dir / MANIFEST_NAME).read_text())
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != MANIFEST_VERSION:
+            return None
+        return cls(project_dir, data["modules"])
+
+    def add(
+        self,
+        ext_name: str,
+        pyx_file: str,
+        c_file: str,
+        language: str,
+        directives: dict,
+        inputs: list[str],
+    ) -> None:
+        self.modules[ext_name] = {
+            "pyx": relative_path(pyx_file, self.project_dir),
+            "source": relative_path(c_file, self.project_dir),
+            "language": str(language),
+            "directives": directives,
+            "inputs": {
+                rel_path: file_digest(Path(path))
+                for path in inputs
+                if (rel_path := relative_path(path, self.project_dir)) is not None
+            },
+        }
+
+    def source_for(self, ext: Extension, directives: dict) -> Optional[str]:
+        """Generated file to compile ext from, None if it's missing or was
+        generated from other inputs or options."""
+        module = self.modules.get(ext.name)
+        if module is None:
+            return None
+        source = self.project_dir / module["source"]
+        if (
+            module["pyx"] != relative_path(ext.sources[0], self.project_dir)
+            or module["language"] != str(ext.language)
+            or json.dumps(module["directives"], sort_keys=True)
+            != json.dumps(directives, sort_keys=True)
+            or not source.exists()
+        ):
+            logger.debug(f"Generated source of {ext.name} doesn't match its build")
+            return None
+        for rel_path, digest in module["inputs"].items():
+            path = self.project_dir / rel_path
+            if not path.exists() or file_digest(path) != digest:
+                logger.debug(f"Generated source of {ext.name} outdated by {rel_path}")
+                return None
+        return str(source)
+
+    def dumps(self) -> bytes:
+        import Cython
+
+        data = {
+            "version": MANIFEST_VERSION,
+            "cython": Cython.__version__,
+            "modules": self.modules,
+        }
+        return json.dumps(data, indent=1, sort_keys=True).encode()
@@ -1,7 +1,9 @@
+import fnmatch
 import os
-from dataclasses import dataclass, field
+import shlex
+from dataclasses import dataclass, field, fields
 from enum import StrEnum
-from typing import Union, get_args, get_origin
+from typing import Optional, Union, get_args, get_origin
 
 
 class Language(StrEnum):
@@ -9,7 +11,20 @@ class Language(StrEnum):
     CPP = "c++"
 
 
+class Lto(StrEnum):
+    OFF = "off"
+    THIN = "thin"  # partitioned, optimized in parallel
+    FULL = "full"  # whole program at once
+
+
+class Strip(StrEnum):
+    OFF = "off"
+    DEBUG = "debug"  # debug info only
+    ALL = "all"  # debug info and symbols not needed for dynamic linking
+
+
 class SitePackages(StrEnum):
+    DEPENDENCIES = "dependencies"  # only where the declared dependencies are
     PURELIB = "pure"  # use sysconfig.get_path('purelib')
     USER = "user"  # use site.getusersitepackages()
     SITE = "site"  # use site.getsitepackages()
@@ -100,6 +115,49 @@ class CythonCompilerDirectives:
                     )
 
 
+@dataclass
+class ModuleOverride:
+    """Build options for the modules whose full name matches a glob pattern.
+
+    The language replaces the project's one, compiler directives are merged
+    over the project's ones and the lists are appended to the project's.
+    """
+
+    pattern: str
+    language: Optional[Language] = None
+    compiler_directives: dict[str, bool | None] = field(default_factory=dict)
+    extra_compile_args: list[str] = field(default_factory=list)
+    extra_link_args: list[str] = field(default_factory=list)
+    libraries: list[str] = field(default_factory=list)
+    include_dirs: list[str] = field(default_factory=list)
+    library_dirs: list[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        if isinstance(self.language, str):
+            try:
+                self.language = Language(self.language.lower())
+            except ValueError as e:
+                valid_options = [lang.value for lang in Language]
+                raise ValueError(
+                    f"Invalid language for modules {self.pattern}: {self.language}. "
+                    f"Valid options {valid_options}"
+                ) from e
+        # Validates names and types of the directives
+        CythonCompilerDirectives(**self.compiler_directives)
+
+    def matches(self, module_name: str) -> bool:
+        return fnmatch.fnmatchcase(module_name, self.pattern)
+
+    @classmethod
+    def from_pyproject(cls, pattern: str, override: dict) -> "ModuleOverride":
+        known = {f.name for f in fields(cls)} - {"pattern"}
+        if unknown := set(override) - known:
+            raise ValueError(
+                f"Unknown options for modules {pattern}: {', '.join(sorted(unknown))}"
+            )
+        return cls(pattern=pattern, **override)
+
+
 @dataclass
 class CythonConfig:
     language: Language = field(default=Language.C)
@@ -109,8 +167,14 @@ class CythonConfig:
     nthreads: int = field(default_factory=lambda: os.cpu_count() or 1)
     force: bool = False
     annotate: bool = False
+    # Compile each extension as soon as it is cythonized
+    pipeline: bool = False
+    # Editable installs rebuild stale extensions when they are imported
+    rebuild_on_import: bool = False
     sources: list[str] = field(default_factory=list)
     exclude_dirs: list[str] = field(default_factory=list)
+    # Enumerate sources with git ls-files instead of walking the package
+    git_ls_files: bool = False
     include_dirs: list[str] = field(default_factory=list)
     library_dirs: list[str] = field(default_factory=list)
     extra_compile_args: list[str] = field(default_factory=list)
@@ -118,6 +182,9 @@ class CythonConfig:
     libraries: list[str] = field(default_factory=list)
     runtime_library_dirs: list[str] = field(default_factory=list)
     site_packages: SitePackages = field(default=SitePackages.PURELIB)
+    lto: Lto = field(default=Lto.OFF)
+    # Applied in order to the modules they match
+    overrides: list[ModuleOverride] = field(default_factory=list)
 
     # include_dirs += numpy.get_include()
     use_numpy_include: bool = False
@@ -137,6 +204,18 @@ class CythonConfig:
                     f"Invalid language: {self.language}. Valid options {valid_options}"
                 ) from e
 
+        if isinstance(self.lto, str):
+            try:
+                self.lto = Lto(self.lto.lower())
+            except ValueError as e:
+                valid_options = [lto.value for lto in Lto]
+                raise ValueError(
+                    f"Invalid lto: {self.lto}. Valid options {valid_options}"
+                ) from e
+
+    def overrides_for(self, module_name: str) -> list[ModuleOverride]:
+        return [o for o in self.overrides if o.matches(module_name)]
+
     @classmethod
     def from_pyproject(cls, tool_config: dict) -> "CythonConfig":
         cython_config = tool_config.get("cython", {})
@@ -156,8 +235,11 @@ class CythonConfig:
             nthreads=cython_config.get("nthreads", os.cpu_count() or 1),
             force=cython_config.get("force", False),
             annotate=cython_config.get("annotate", False),
+            pipeline=cython_config.get("pipeline", False),
+            rebuild_on_import=cython_config.get("rebuild_on_import", False),
             sources=sources,
             exclude_dirs=exclude_dirs,
+            git_ls_files=modules.get("git_ls_files", False),
             include_dirs=include_dirs,
             library_dirs=library_dirs,
             libraries=modules.get("libraries", []),
@@ -165,15 +247,221 @@ class CythonConfig:
             extra_link_args=modules.get("extra_link_args", []),
             runtime_library_dirs=runtime_library_dirs,
             site_packages=cython_config.get("site_packages") or SitePackages.PURELIB,
+            lto=cython_config.get("lto") or Lto.OFF,
             use_numpy_include=cython_config.get("use_numpy_include", False),
+            overrides=[
+                ModuleOverride.from_pyproject(pattern, override)
+                for pattern, override in modules.get("overrides", {}).items()
+            ],
         )
 
 
+def default_cache_dir() -> str:
+    """Per-user cache location, honouring HWH_CACHE_DIR and XDG_CACHE_HOME."""
+    if cache_dir := os.environ.get("HWH_CACHE_DIR"):
+        return cache_dir
+    xdg_cache = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(xdg_cache, "hwh-backend")
+
+
+@dataclass
+class AnnotationConfig:
+    # JSON report of the Python interaction of the annotated modules, in the
+    # build directory by default
+    report: Optional[str] = None
+    # Highest Python interaction score allowed for each function, or for the
+    # qualified function names matching glob patterns, the last match wins.
+    # The module level only matches patterns naming "<module>". Setting it
+    # annotates the modules.
+    max_python_interaction: dict[str, int] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if not isinstance(self.max_python_interaction, dict):
+            self.max_python_interaction = {"*": self.max_python_interaction}
+        for pattern, limit in self.max_python_interaction.items():
+            if isinstance(limit, bool) or not isinstance(limit, int) or limit < 0:
+                raise ValueError(
+                    "max_python_interaction must be a non-negative integer, "
+                    f"got {limit} for {pattern}"
+                )
+
+    @classmethod
+    def from_pyproject(cls, tool_config: dict) -> "AnnotationConfig":
+        annotation_config = tool_config.get("annotation", {})
+        return cls(
+            report=annotation_config.get("report"),
+            max_python_interaction=annotation_config.get("max_python_interaction", {}),
+        )
+
+
+@dataclass
+class CompileConfig:
+    # "local", "workers" or "module:factory", see load_executor. Defaults to
+    # "workers" if there are any.
+    executor: Optional[str] = None
+    # Addresses of `python -m hwh_backend worker` servers
+    workers: list[str] = field(default_factory=list)
+    # Parallel compiles when not compiling locally, nthreads plus 4 per
+    # worker by default
+    jobs: Optional[int] = None
+    # Seconds to wait for a worker to compile a source
+    timeout: float = 600
+
+    def __post_init__(self):
+        if isinstance(self.workers, str):
+            self.workers = [w for w in self.workers.split(",") if w]
+        if self.executor is None:
+            self.executor = "workers" if self.workers else "local"
+        if self.jobs is not None and (not isinstance(self.jobs, int) or self.jobs <= 0):
+            raise ValueError(
+                f"Compile jobs must be a positive integer, got {self.jobs}"
+            )
+
+    @classmethod
+    def from_pyproject(cls, tool_config: dict) -> "CompileConfig":
+        compile_config = tool_config.get("compile", {})
+        return cls(
+            executor=compile_config.get("executor"),
+            workers=compile_config.get("workers", []),
+            jobs=compile_config.get("jobs"),
+            timeout=compile_config.get("timeout", 600),
+        )
+
+
+@dataclass
+class CacheConfig:
+    enabled: bool = True
+    dir: str = field(default_factory=default_cache_dir)
+    # Upper bound for each cache namespace, in MiB. Least recently used
+    # entries are evicted once it is exceeded.
+    max_size: int = 1024
+
+    def __post_init__(self):
+        self.dir = os.path.expanduser(self.dir)
+        if not isinstance(self.max_size, int) or self.max_size <= 0:
+            raise ValueError(
+                f"Cache max_size must be a positive integer (MiB), got {self.max_size}"
+            )
+
+    @property
+    def max_size_bytes(self) -> int:
+        return self.max_size * 1024 * 1024
+
+    @classmethod
+    def from_pyproject(cls, tool_config: dict) -> "CacheConfig":
+        cache_config = tool_config.get("cache", {})
+        return cls(
+            enabled=cache_config.get("enabled", True),
+            dir=cache_config.get("dir") or default_cache_dir(),
+            max_size=cache_config.get("max_size", 1024),
+        )
+
+
+@dataclass
+class PgoConfig:
+    enabled: bool = False
+    # Training command, run with the instrumented extensions importable. A
+    # leading "python" is replaced by the interpreter of the build.
+    command: list[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        if isinstance(self.command, str):
+            self.command = shlex.split(self.command)
+
+    @classmethod
+    def from_pyproject(cls, tool_config: dict) -> "PgoConfig":
+        pgo_config = tool_config.get("pgo", {})
+        return cls(
+            enabled=pgo_config.get("enabled", False),
+            command=pgo_config.get("command", []),
+        )
+
+
+@dataclass
+class SdistConfig:
+    # Cythonize during build_sdist and ship the generated C, which installs
+    # compile directly while the inputs are unchanged
+    cythonize: bool = False
+
+    @classmethod
+    def from_pyproject(cls, tool_config: dict) -> "SdistConfig":
+        sdist_config = tool_config.get("sdist", {})
+        return cls(cythonize=sdist_config.get("cythonize", False))
+
+
+@dataclass
+class WheelConfig:
+    strip: Strip = Strip.OFF
+    # Save the debug info of stripped extensions as .debug files there
+    debug_dir: Optional[str] = None
+    # Save it to a <wheel name>.debug.zip next to the wheel
+    debug_archive: bool = False
+    # zlib level of the files in the wheel, 0 stores them uncompressed
+    compression: int = 6
+
+    def __post_init__(self):
+        if not isinstance(self.compression, int) or not 0 <= self.compression <= 9:
+            raise ValueError(
+                f"Wheel compression must be a level from 0 to 9, got {self.compression}"
+            )
+        if isinstance(self.strip, str):
+            try:
+                self.strip = Strip(self.strip.lower())
+            except ValueError as e:
+                valid_options = [strip.value for strip in Strip]
+                raise ValueError(
+                    f"Invalid strip: {self.strip}. Valid options {valid_options}"
+                ) from e
+
+    @classmethod
+    def from_pyproject(cls, tool_config: dict) -> "WheelConfig":
+        wheel_config = tool_config.get("wheel", {})
+        return cls(
+            strip=wheel_config.get("strip") or Strip.OFF,
+            debug_dir=wheel_config.get("debug_dir"),
+            debug_archive=wheel_config.get("debug_archive", False),
+            compression=wheel_config.get("compression", 6),
+        )
+
+
+def merge_tables(base: dict, override: dict) -> dict:
+    """Merge TOML tables recursively, values other than tables are replaced."""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_tables(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
 class HwhConfig:
-    def __init__(self, pyproject_data: dict):
+    """[tool.hwh] configuration of a project.
+
+    profile: name of a [tool.hwh.profiles] entry, a table laid out like
+        [tool.hwh.cython] that is merged over it
+    """
+
+    def __init__(self, pyproject_data: dict, profile: Optional[str] = None):
         all_tools = pyproject_data.get("tool")
         config = {}
 
         if all_tools:
             config = all_tools.get("hwh", {})
+        if profile is not None:
+            profiles = config.get("profiles", {})
+            if profile not in profiles:
+                raise ValueError(
+                    f"Unknown profile: {profile}. " f"Valid options {sorted(profiles)}"
+                )
+            config = dict(
+                config, cython=merge_tables(config.get("cython", {}), profiles[profile])
+            )
+        self.profile = profile
         self.cython = CythonConfig.from_pyproject(config)
+        self.cache = CacheConfig.from_pyproject(config)
+        self.pgo = PgoConfig.from_pyproject(config)
+        self.wheel = WheelConfig.from_pyproject(config)
+        self.sdist = SdistConfig.from_pyproject(config)
+        self.annotation = AnnotationConfig.from_pyproject(config)
+        self.compile = CompileConfig.from_pyproject(config)
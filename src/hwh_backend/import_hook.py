@@ -0,0 +1,100 @@
+# Rebuilds stale extensions of an editable install when they are imported.
+#
+# This module is imported at interpreter startup through a .pth file of the
+# editable wheel, so it must only depend on the standard library.
+
+import fcntl
+import json
+import os
+import subprocess
+import sys
+from importlib.abc import MetaPathFinder
+from pathlib import Path
+from typing import Optional
+
+# Written by IncrementalState in hwh_backend.incremental
+_STATE_FILE = Path("build") / "hwh" / "incremental.json"
+
+
+class RebuildFinder(MetaPathFinder):
+    """Meta path finder that rebuilds an outdated extension before it's loaded.
+
+    Extensions and their inputs are taken from the incremental build state
+    of the project. An extension is stale if its built file is missing or
+    the mtime, size or inode of one of its inputs differs from the recorded
+    ones. Stale extensions are rebuilt by the incremental build in a
+    subprocess, holding a per-extension lock so that concurrent processes
+    (e.g. pytest-xdist workers) don't rebuild the same extension twice. The
+    actual loading is always left to the regular finders.
+    """
+
+    def __init__(self, project_dir: Path):
+        self.project_dir = project_dir
+        self._state: Optional[dict] = None
+
+    def _load_state(self) -> dict:
+        try:
+            return json.loads((self.project_dir / _STATE_FILE).read_text())
+        except (OSError, ValueError):
+            return {"modules": {}, "files": {}}
+
+    def _is_stale(self, state: dict, module: dict) -> bool:
+        if not os.path.exists(module["output"]):
+            return True
+        for path in module["inputs"]:
+            known = state["files"].get(path)
+            try:
+                stat = os.stat(self.project_dir / path)
+            except OSError:
+                return True
+            if known is None or (known["mtime_ns"], known["size"], known["inode"]) != (
+                stat.st_mtime_ns,
+                stat.st_size,
+                stat.st_ino,
+            ):
+                return True
+        return False
+
+    def _rebuild(self, fullname: str) -> None:
+        lock_dir = self.project_dir / _STATE_FILE.parent / "locks"
+        lock_dir.mkdir(parents=True, exist_ok=True)
+        with open(lock_dir / f"{fullname}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another process may have rebuilt it while we waited for the lock
+            state = self._load_state()
+            module = state["modules"].get(fullname)
+            if module is None or not self._is_stale(state, module):
+                self._state = state
+                return
+
+            sys.stderr.write(f"hwh-backend: rebuilding stale extension {fullname}\n")
+            cmd = [sys.executable, "-m", "hwh_backend", "rebuild", fullname]
+            # Rebuild with the profile the extensions were built with
+            if state.get("profile"):
+                cmd += ["-C", f"profile={state['profile']}"]
+            result = subprocess.run(cmd, cwd=self.project_dir)
+            if result.returncode != 0:
+                sys.stderr.write(
+                    f"hwh-backend: rebuilding {fullname} failed, "
+                    "importing the previous build\n"
+                )
+            self._state = self._load_state()
+
+    def find_spec(self, fullname, path, target=None):
+        if self._state is None:
+            self._state = self._load_state()
+
+        module = self._state["modules"].get(fullname)
+        if module is not None and self._is_stale(self._state, module):
+            self._rebuild(fullname)
+        # Regular finders load the (now up to date) extension
+        return None
+
+
+def install(project_dir: str) -> None:
+    """Put a RebuildFinder for project_dir first on sys.meta_path."""
+    if not any(
+        isinstance(finder, RebuildFinder) and str(finder.project_dir) == project_dir
+        for finder in sys.meta_path
+    ):
+        sys.meta_path.insert(0, RebuildFinder(Path(project_dir)))
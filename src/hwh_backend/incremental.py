@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+from setuptools.extension import Extension
+
+from .cache import file_digest
+from .dependencies import dependency_tree, extension_directives, module_inputs
+from .logger import logger
+
+STATE_VERSION = 1
+
+
+@dataclass
+class FileState:
+    mtime_ns: int
+    size: int
+    inode: int
+    sha256: str
+
+
+class FileStateIndex:
+    """Tracks file contents by stat data, falling back to a content hash.
+
+    A file whose mtime, size and inode are unchanged is assumed unchanged.
+    Otherwise its hash is compared, so touching a file or checking out the
+    same content again doesn't cause a rebuild.
+    """
+
+    def __init__(self, entries: Optional[dict[str, dict]] = None):
+        self.entries = {
+            path: FileState(**state) for path, state in (entries or {}).items()
+        }
+
+    def changed(self, path: str) -> bool:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return True
+
+        known = self.entries.get(path)
+        if known is None:
+            return True
+        if (known.mtime_ns, known.size, known.inode) == (
+            stat.st_mtime_ns,
+            stat.st_size,
+            stat.st_ino,
+        ):
+            return False
+
+        digest = file_digest(Path(path))
+        if digest != known.sha256:
+            return True
+        # Same content, remember the new stat data to skip hashing next time
+        self.entries[path] = FileState(
+            stat.st_mtime_ns, stat.st_size, stat.st_ino, digest
+        )
+        return False
+
+    def record(self, path: str) -> None:
+        stat = os.stat(path)
+        self.entries[path] = FileState(
+            stat.st_mtime_ns, stat.st_size, stat.st_ino, file_digest(Path(path))
+        )
+
+
+def extension_fingerprint(ext: Extension, cythonize_kwargs: dict) -> str:
+    """Hash of the build options of an extension that affect its output."""
+    options = {
+        "language": ext.language,
+        "include_dirs": ext.include_dirs,
+        "library_dirs": ext.library_dirs,
+        "libraries": ext.libraries,
+        "runtime_library_dirs": ext.runtime_library_dirs,
+        "extra_compile_args": ext.extra_compile_args,
+        "extra_link_args": ext.extra_link_args,
+        "define_macros": ext.define_macros,
+        "compiler_directives": extension_directives(
+            ext, cythonize_kwargs["compiler_directives"]
+        ),
+        "annotate": cythonize_kwargs["annotate"],
+    }
+    return hashlib.sha256(json.dumps(options, default=str).encode()).hexdigest()
+
+
+def header_dependencies(tree, inputs: Iterable[str], include_dirs: list[str]):
+    """Headers named in `cdef extern from` blocks of the given Cython files."""
+    headers = set()
+    for filename in inputs:
+        _, externs, _ = tree.cimports_externs_incdirs(filename)
+        for extern in externs:
+            if os.path.isfile(extern):
+                headers.add(extern)
+                continue
+            for include_dir in include_dirs:
+                candidate = os.path.join(include_dir, extern)
+                if os.path.isfile(candidate):
+                    headers.add(candidate)
+                    break
+    return sorted(headers)
+
+
+class IncrementalState:
+    """Dependency graph and file-state index of the last in-place build.
+
+    For every extension the graph holds its inputs (the .pyx, transitively
+    cimported .pxd, included .pxi and extern headers), a fingerprint of its
+    build options and its built extension file. It is persisted as JSON under
+    the build directory and used to rebuild only outdated extensions.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.modules: dict[str, dict] = {}
+        self.files = FileStateIndex()
+        self.reasons: dict[str, str] = {}
+        # Build profile of the last build, used by the import hook to rebuild
+        self.profile: Optional[str] = None
+
+    @classmethod
+    def load(cls, build_dir: Path) -> "IncrementalState":
+        state = cls(build_dir / "hwh" / "incremental.json")
+        try:
+            data = json.loads(state.path.read_text())
+        except (OSError, ValueError):
+            logger.debug(f"No incremental build state at {state.path}")
+            return state
+
+        if data.get("version") != STATE_VERSION:
+            return state
+        state.modules = data["modules"]
+        state.files = FileStateIndex(data["files"])
+        state.profile = data.get("profile")
+        return state
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": STATE_VERSION,
+            "profile": self.profile,
+            "modules": self.modules,
+            "files": {path: asdict(s) for path, s in self.files.entries.items()},
+        }
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, indent=1))
+        tmp.replace(self.path)
+
+    def _outdated_reason(self, ext: Extension, fingerprint: str) -> Optional[str]:
+        known = self.modules.get(ext.name)
+        if known is None:
+            return "new extension"
+        if known["fingerprint"] != fingerprint:
+            return "build options changed"
+        if not os.path.exists(known["output"]):
+            return f"{known['output']} is missing"
+        for path in known["inputs"]:
+            if self.files.changed(path):
+                return f"{path} changed"
+        return None
+
+    def outdated(
+        self, ext_modules: list[Extension], cythonize_kwargs: dict
+    ) -> list[Extension]:
+        """Select the extensions that need to be rebuilt, and note why."""
+        force = cythonize_kwargs["force"]
+        self.reasons = {}
+        for ext in ext_modules:
+            fingerprint = extension_fingerprint(ext, cythonize_kwargs)
+            reason = "forced" if force else self._outdated_reason(ext, fingerprint)
+            if reason is not None:
+                self.reasons[ext.name] = reason
+        return [ext for ext in ext_modules if ext.name in self.reasons]
+
+    def record(
+        self,
+        built: list[tuple[Extension, str]],
+        pyx_sources: dict[str, str],
+        cythonize_kwargs: dict,
+    ) -> None:
+        """Record inputs and file states of freshly built extensions.
+
+        built: extensions along with the path of their built extension file
+        pyx_sources: .pyx source of every extension, by extension name
+        """
+        tree = dependency_tree(cythonize_kwargs["include_path"])
+        for ext, output in built:
+            pyx_file = pyx_sources[ext.name]
+            inputs = module_inputs(tree, Path(pyx_file))
+            inputs += header_dependencies(tree, inputs, ext.include_dirs)
+            for path in inputs:
+                self.files.record(path)
+            self.modules[ext.name] = {
+                "fingerprint": extension_fingerprint(ext, cythonize_kwargs),
+                "inputs": inputs,
+                "output": output,
+            }
+
+    def summary(self, total: int) -> str:
+        if not self.reasons:
+            return f"All {total} extensions up to date"
+        lines = [f"Rebuilding {len(self.reasons)} of {total} extensions:"]
+        lines += [f"  {name}: {reason}" for name, reason in self.reasons.items()]
+        return "\n".join(lines)
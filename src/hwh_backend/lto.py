@@ -0,0 +1,63 @@
+import os
+import shlex
+import subprocess
+import sysconfig
+import tempfile
+from functools import cache
+from pathlib import Path
+
+from .hwh_config import Lto
+from .logger import logger
+
+
+def compiler_command() -> list[str]:
+    """C compiler the extensions are built with, as distutils picks it."""
+    return shlex.split(os.environ.get("CC") or sysconfig.get_config_var("CC") or "cc")
+
+
+@cache
+def compiler_family(executable: str) -> str:
+    """ "clang" or "gcc", from the version banner of the compiler."""
+    try:
+        result = subprocess.run(
+            [executable, "--version"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "gcc"
+    return "clang" if "clang" in result.stdout.lower() else "gcc"
+
+
+def lto_flags(mode: Lto, family: str, jobs: int) -> tuple[list[str], list[str]]:
+    """Compile and link flags for LTO, optimizing with up to jobs threads per
+    link.
+
+    GCC has no thin LTO, "thin" uses its default partitioned mode and "full"
+    optimizes the extension as a single partition. Clang's full LTO runs in a
+    single thread whatever the job count.
+    """
+    if mode == Lto.OFF:
+        return [], []
+    if family == "clang":
+        flag = f"-flto={mode.value}"
+        jobs_flags = [f"-flto-jobs={jobs}"] if mode == Lto.THIN else []
+        return [flag], [flag] + jobs_flags
+    partition = ["-flto-partition=one"] if mode == Lto.FULL else []
+    return ["-flto"], [f"-flto={jobs}"] + partition
+
+
+@cache
+def check_lto(compiler: tuple[str, ...], link_flags: tuple[str, ...]) -> None:
+    """Compile and link a probe extension with LTO, which fails if the linker
+    has no LTO plugin for the compiler."""
+    with tempfile.TemporaryDirectory(prefix="hwh-lto-") as tmp:
+        source = Path(tmp) / "probe.c"
+        source.write_text("int probe(int x) { return x + 1; }\n")
+        command = list(compiler) + list(link_flags)
+        command += ["-fPIC", "-shared", str(source), "-o", str(Path(tmp) / "probe.so")]
+        result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        logger.error(f"LTO probe failed: {subprocess.list2cmdline(command)}")
+        raise RuntimeError(
+            "LTO was requested, but the compiler can't link with it. Is the "
+            f"linker plugin for {compiler[0]} installed?\n{result.stderr}"
+        )
@@ -0,0 +1,53 @@
+import re
+import shutil
+from pathlib import Path
+
+from .parser import PyProject
+
+
+def normalize_dist_name(name: str) -> str:
+    """Distribution name as used in .dist-info directory names."""
+    return re.sub(r"[-_.]+", "_", name).lower()
+
+
+def dist_info_name(project: PyProject) -> str:
+    return (
+        f"{normalize_dist_name(project.package_name)}-"
+        f"{project.package_version}.dist-info"
+    )
+
+
+def _entry_points(project: PyProject) -> str:
+    """entry_points.txt contents, empty if the project has no entry points."""
+    metadata = project.metadata
+    groups = {
+        "console_scripts": metadata.scripts,
+        "gui_scripts": metadata.gui_scripts,
+        **metadata.entrypoints,
+    }
+    sections = []
+    for group, entries in groups.items():
+        if entries:
+            lines = [f"{name} = {value}" for name, value in entries.items()]
+            sections.append("\n".join([f"[{group}]", *lines]) + "\n")
+    return "\n".join(sections)
+
+
+def write_dist_info(project: PyProject, output_dir: Path) -> Path:
+    """Write the .dist-info directory of project to output_dir.
+
+    Everything comes from the [project] table, so neither setuptools nor
+    Cython are involved. The WHEEL file is left to build_wheel, which knows
+    the tags.
+    returns: the .dist-info directory
+    """
+    dist_info = output_dir / dist_info_name(project)
+    dist_info.mkdir(parents=True, exist_ok=True)
+    (dist_info / "METADATA").write_bytes(bytes(project.metadata.as_rfc822()))
+    if entry_points := _entry_points(project):
+        (dist_info / "entry_points.txt").write_text(entry_points)
+    for license_file in project.metadata.license_files or []:
+        target = dist_info / "licenses" / license_file
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(project.project_dir / license_file, target)
+    return dist_info
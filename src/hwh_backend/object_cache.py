@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+from functools import cache
+from pathlib import Path
+
+from .cache import BuildCache
+from .executor import compile_command
+from .logger import logger
+
+
+@cache
+def _compiler_identity(executable: str) -> str:
+    """Identify a compiler by its resolved path, size and mtime (ccache's
+    default compiler_check), so an upgraded compiler invalidates old objects."""
+    path = shutil.which(executable) or executable
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return executable
+    return f"{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class ObjectCache:
+    """ccache-like cache of compiled objects for a distutils unix compiler.
+
+    Objects are keyed on the preprocessed source, the compiler identity and
+    the complete command line, which already holds the sysconfig CFLAGS along
+    with the include dirs, macros and extra_compile_args of the extension.
+    Compiling is delegated to the compiler's own _compile, or to the
+    executor installed before the cache, on a miss, so nothing beyond the
+    compiler itself needs to be installed.
+    """
+
+    def __init__(self, compiler, cache: BuildCache):
+        self.compiler = compiler
+        self.cache = cache
+        self._compile = compiler._compile
+        # Objects are cached across build directories, so keep the absolute
+        # path of this one out of their debug info.
+        self._prefix_map = f"-fdebug-prefix-map={os.getcwd()}=."
+
+    def install(self) -> None:
+        """Route all compilation of the compiler through the cache."""
+        self.compiler._compile = self.compile
+
+    def _key(self, obj: str, src: str, command: list[str]) -> str | None:
+        """Hash of the preprocessed source and the compile command line."""
+        preprocess = [arg for arg in command if arg != "-c"] + ["-E", "-P", src]
+        try:
+            result = subprocess.run(preprocess, capture_output=True, check=True)
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.debug(f"Preprocessing {src} failed, not caching it: {e}")
+            return None
+
+        h = hashlib.sha256(result.stdout)
+        h.update(_compiler_identity(command[0]).encode())
+        h.update(json.dumps([os.path.basename(obj), command]).encode())
+        return h.hexdigest()
+
+    def compile(self, obj, src, ext, cc_args, extra_postargs, pp_opts):
+        extra_postargs = list(extra_postargs or [])
+        command = compile_command(self.compiler, src, cc_args, extra_postargs)
+        key = self._key(obj, src, command)
+        if key is not None and self.cache.get(key, Path(obj).parent) is not None:
+            logger.debug(f"Object cache hit for {src}")
+            return
+
+        self._compile(
+            obj, src, ext, cc_args, extra_postargs + [self._prefix_map], pp_opts
+        )
+        if key is not None:
+            self.cache.put(key, [Path(obj)])
@@ -55,7 +55,7 @@ class PyProject:
 
         return self._data
 
-    @property
+    @cached_property
     def metadata(self) -> StandardMetadata:
         return StandardMetadata.from_pyproject(self.toml)
 
@@ -87,9 +87,22 @@ class PyProject:
         """Get the package version from pyproject.toml"""
         return self.metadata.version
 
-    def get_hwh_config(self) -> HwhConfig:
-        # TODO: switch to property
-        return HwhConfig(self.toml)
+    def get_hwh_config(self, profile: Optional[str] = None) -> HwhConfig:
+        """hwh configuration, with the [tool.hwh.profiles] entry of profile
+        applied if given"""
+        if profile not in self._hwh_configs:
+            self._hwh_configs[profile] = HwhConfig(self.toml, profile)
+        return self._hwh_configs[profile]
+
+    @cached_property
+    def _hwh_configs(self) -> Dict[Optional[str], HwhConfig]:
+        return {}
+
+    @cached_property
+    def direct_urls(self) -> Dict[tuple, Optional[dict]]:
+        """direct_url.json of the installed project by the site packages it
+        was looked up in, see build._is_editable_install"""
+        return {}
 
     @property
     def setuptools_config(self) -> dict:
@@ -100,7 +113,7 @@ class PyProject:
     def setuptools_package_config(self) -> SetuptoolsPackageConfig:
         cfg = self.setuptools_config
         try:
-            packages = cfg.pop("packages")
+            packages = cfg["packages"]
         except KeyError:
             return AutoDiscover()
 
@@ -145,6 +158,8 @@ class PyProject:
             case PackageList(packages=pkgs): return pkgs
             case AutoDiscover(): return rooted_find_packages()
             case FindConfig(cfg=cfg):
+                # Don't modify the parsed pyproject.toml, the project is shared
+                cfg = dict(cfg)
                 try:
                     where_cfg = cfg.pop("where")
                 except KeyError:
@@ -162,6 +177,16 @@ class PyProject:
 
             case _: raise TypeError("Bug in setuptools_package_config")
 
+    @property
+    def package_where(self) -> dict[str, str]:
+        """Directory each package was found in, relative to the project."""
+        return {package: self._package_where[package] for package in self.packages}
+
+    def restore_packages(self, packages: list[str], package_where: Mapping[str, str]):
+        """Use the packages of an earlier discovery instead of searching again."""
+        self.__dict__["packages"] = packages
+        self._package_where = defaultdict(lambda: '.', package_where)
+
     def get_package_path(self, package: str) -> Path:
         """Convert a package name to its directory path."""
         # HACK: Make sure we compute the list of packages if needed
@@ -178,3 +203,28 @@ class PyProject:
             root_pkg = self.packages[0].split(".")[0]
             return [self.get_package_path(root_pkg)]
         return []
+
+
+# Projects by directory, along with the pyproject.toml stat they were read at
+_PROJECTS: dict[Path, tuple[tuple[int, int], PyProject]] = {}
+
+
+def load_project(project_dir: Path = Path(), reload: bool = False) -> PyProject:
+    """Get the PyProject of project_dir, shared by all hooks and commands.
+
+    pyproject.toml is parsed and packages are discovered only once per
+    directory. A changed pyproject.toml (mtime or size) or reload=True gives
+    a fresh PyProject.
+    """
+    key = project_dir.absolute()
+    try:
+        stat = (project_dir / "pyproject.toml").stat()
+    except OSError:
+        # Let PyProject raise its usual error
+        return PyProject(project_dir)
+
+    version = (stat.st_mtime_ns, stat.st_size)
+    known = _PROJECTS.get(key)
+    if reload or known is None or known[0] != version:
+        known = _PROJECTS[key] = (version, PyProject(project_dir))
+    return known[1]
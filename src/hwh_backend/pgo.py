@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import sysconfig
+from pathlib import Path
+from typing import Optional
+
+from setuptools.extension import Extension
+
+from .cache import BuildCache, file_digest
+from .dependencies import (
+    cythonize_key,
+    dependency_tree,
+    extension_directives,
+    module_inputs,
+)
+from .hwh_config import PgoConfig
+from .incremental import header_dependencies
+from .logger import logger
+from .object_cache import _compiler_identity
+
+
+class ProfileGuidedBuild:
+    """Profile-guided optimization of the extensions of a build, with GCC.
+
+    The extensions are first built in place with -fprofile-generate and the
+    training command of [tool.hwh.pgo] is run against them, which writes a
+    .gcda profile per object. Extensions built in place before are put back
+    afterwards. The profiles are then moved to a directory named
+    after their content and the extensions are rebuilt from them with
+    -fprofile-use. Objects are compiled in the same build directory in both
+    builds, as GCC finds the profile of an object by its path.
+
+    Profiles are stored in the build cache, keyed on the inputs and build
+    options of all extensions, the compiler and the training command, so
+    they are only trained again once one of those changes.
+    """
+
+    def __init__(self, config: PgoConfig, build_dir: Path, cache: Optional[BuildCache]):
+        if not config.command:
+            raise ValueError("PGO needs a training command in [tool.hwh.pgo]")
+        self.command = config.command
+        self.cache = cache
+        self.pgo_dir = build_dir / "pgo"
+        # gcda files of the instrumented build are written here when trained
+        self.raw_dir = (self.pgo_dir / "raw").absolute()
+        # Profiles to build with, None while building instrumented extensions
+        self.profile_dir: Optional[Path] = None
+        # Instrumented extension files, and the ones they replaced
+        self.outputs: list[str] = []
+        self.stashed: list[str] = []
+
+    @property
+    def compile_args(self) -> list[str]:
+        # Name the profiles after the object paths relative to the project,
+        # so that cached profiles work in other copies of it
+        prefix = f"-fprofile-prefix-path={os.getcwd()}"
+        if self.profile_dir is None:
+            return [
+                f"-fprofile-generate={self.raw_dir}",
+                "-fprofile-update=atomic",
+                prefix,
+            ]
+        # Named after its contents, so the command line keys the object cache
+        # on the profiles
+        return [f"-fprofile-use={self.profile_dir}", "-fprofile-correction", prefix]
+
+    @property
+    def link_args(self) -> list[str]:
+        # Instrumented extensions need libgcov
+        return (
+            [f"-fprofile-generate={self.raw_dir}"] if self.profile_dir is None else []
+        )
+
+    def key(self, ext_modules: list[Extension], cythonize_kwargs: dict) -> str:
+        """Hash of everything the profiles depend on."""
+        tree = dependency_tree(cythonize_kwargs["include_path"])
+        h = hashlib.sha256()
+        h.update(json.dumps(self.command).encode())
+        h.update(_compiler_identity(sysconfig.get_config_var("CC").split()[0]).encode())
+        for ext in sorted(ext_modules, key=lambda ext: ext.name):
+            pyx_file = Path(ext.sources[0])
+            directives = extension_directives(
+                ext, cythonize_kwargs["compiler_directives"]
+            )
+            headers = header_dependencies(
+                tree, module_inputs(tree, pyx_file), ext.include_dirs
+            )
+            h.update(
+                cythonize_key(
+                    tree, ext.name, pyx_file, ext.language, directives, False
+                ).encode()
+            )
+            h.update(
+                json.dumps(
+                    [
+                        ext.extra_compile_args,
+                        ext.extra_link_args,
+                        ext.define_macros,
+                        [(os.path.basename(p), file_digest(Path(p))) for p in headers],
+                    ],
+                    default=str,
+                ).encode()
+            )
+        return h.hexdigest()
+
+    def restore(self, key: str) -> bool:
+        """Use the cached profiles for key, if any."""
+        if self.cache is None:
+            return False
+        shutil.rmtree(self.raw_dir, ignore_errors=True)
+        if self.cache.get(key, self.raw_dir) is None:
+            return False
+        self._use_raw_profiles()
+        logger.info(f"PGO: using cached profiles {self.profile_dir}")
+        return True
+
+    def stash(self, outputs: list[str]) -> None:
+        """Move extensions out of the way of the instrumented ones."""
+        self.outputs = outputs
+        self.stashed = [output for output in outputs if os.path.exists(output)]
+        for output in self.stashed:
+            os.replace(output, f"{output}.hwh-pgo")
+
+    def train(self, pythonpath: list[str]) -> None:
+        """Run the training command against the instrumented extensions, with
+        pythonpath prepended to PYTHONPATH."""
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            pythonpath + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+        )
+        command = list(self.command)
+        # Run the training with the interpreter the extensions are built for
+        if command[0] == "python":
+            command[0] = sys.executable
+
+        shutil.rmtree(self.raw_dir, ignore_errors=True)
+        logger.info(f"PGO: training with {subprocess.list2cmdline(command)}")
+        try:
+            subprocess.run(command, env=env, check=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.error(f"PGO training command failed: {e}")
+            raise
+        finally:
+            for output in self.outputs:
+                if os.path.exists(output):
+                    os.remove(output)
+            for output in self.stashed:
+                os.replace(f"{output}.hwh-pgo", output)
+
+    def collect(self, key: str) -> None:
+        """Build with the profiles written by the training, and cache them."""
+        profiles = sorted(self.raw_dir.glob("*.gcda"))
+        if not profiles:
+            raise RuntimeError(
+                f"PGO training wrote no profiles to {self.raw_dir}, "
+                "did it import the extensions?"
+            )
+        if self.cache is not None:
+            self.cache.put(key, profiles)
+        self._use_raw_profiles()
+        logger.info(f"PGO: collected {len(profiles)} profiles in {self.profile_dir}")
+
+    def _use_raw_profiles(self) -> None:
+        """Move the profiles to a directory named after their contents."""
+        profiles = sorted(self.raw_dir.glob("*.gcda"))
+        digest = hashlib.sha256(
+            json.dumps([(p.name, file_digest(p)) for p in profiles]).encode()
+        ).hexdigest()
+        profile_dir = self.pgo_dir / digest[:16]
+        if not profile_dir.is_dir():
+            self.raw_dir.rename(profile_dir)
+        else:
+            shutil.rmtree(self.raw_dir)
+        self.profile_dir = profile_dir
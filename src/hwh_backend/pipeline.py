@@ -0,0 +1,72 @@
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import Callable
+
+from setuptools.extension import Extension
+
+from .logger import logger
+
+# Returns the attributes to set on the extension and whether it was a cache hit
+CythonizeJob = Callable[[Extension], tuple[dict, bool]]
+CompileJob = Callable[[Extension], None]
+
+
+class BuildPipeline:
+    """Streams extensions from cythonize straight into compilation.
+
+    Instead of cythonizing everything before the first compiler starts, each
+    extension is handed to a compile job as soon as its C source exists. At
+    most nthreads jobs of either kind run at once. Cython isn't thread safe,
+    so cythonize jobs run in worker processes; compile jobs only wait for the
+    compiler subprocess and run in threads. Ready compile jobs are scheduled
+    before new cythonize jobs to keep the number of half built extensions low.
+    """
+
+    def __init__(self, nthreads: int, cythonize_job: CythonizeJob):
+        self.nthreads = max(1, nthreads)
+        self.cythonize_job = cythonize_job
+        self.cache_hits = 0
+
+    def run(self, extensions: list[Extension], compile_job: CompileJob) -> None:
+        """Cythonize and compile extensions, replacing their .pyx sources with
+        the generated C and applying the settings of their `# distutils:`
+        comments in place."""
+        to_cythonize = deque(extensions)
+        to_compile: deque[Extension] = deque()
+        running: dict[Future, tuple[str, Extension]] = {}
+
+        logger.debug(
+            f"Pipelining {len(extensions)} extensions on {self.nthreads} workers"
+        )
+        with (
+            ProcessPoolExecutor(self.nthreads) as processes,
+            ThreadPoolExecutor(self.nthreads) as threads,
+        ):
+            while to_cythonize or to_compile or running:
+                while len(running) < self.nthreads and (to_compile or to_cythonize):
+                    if to_compile:
+                        ext = to_compile.popleft()
+                        running[threads.submit(compile_job, ext)] = ("compile", ext)
+                    else:
+                        ext = to_cythonize.popleft()
+                        future = processes.submit(self.cythonize_job, ext)
+                        running[future] = ("cythonize", ext)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, ext = running.pop(future)
+                    # Re-raises failures from the worker, aborting the build
+                    result = future.result()
+                    if stage == "cythonize":
+                        fields, hit = result
+                        for attr, value in fields.items():
+                            setattr(ext, attr, value)
+                        self.cache_hits += hit
+                        to_compile.append(ext)
+                    logger.debug(f"Finished {stage} of {ext.name}")
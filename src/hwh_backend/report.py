@@ -0,0 +1,339 @@
+import json
+import os
+import resource
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from functools import wraps
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .logger import logger
+
+# Spans of jobs run in parallel, used for the achieved parallelism
+JOB_PHASES = ("cythonize", "compile", "link")
+
+
+@dataclass
+class Span:
+    """Resources used by one phase of the build, or one job of a phase.
+
+    start: wall clock time, comparable across processes
+    cpu: CPU seconds of the thread that ran it and of the compiler or linker
+        subprocesses it waited for
+    peak_rss: high-water mark in KiB of the process that ran it, or of its
+        subprocesses if that's higher
+    """
+
+    phase: str
+    name: str
+    pid: int
+    tid: int
+    start: float
+    wall: float
+    cpu: float
+    peak_rss: int
+
+
+class BuildReport:
+    """Collects spans of a build and writes a JSON report and/or a Chrome
+    trace of them.
+
+    Spans are spooled to one file per process, so jobs running in Cython's
+    or the pipeline's worker processes end up in the report as well.
+    """
+
+    def __init__(self, path: Optional[Path] = None, trace_path: Optional[Path] = None):
+        self.path = path
+        self.trace_path = trace_path
+        self.spool = Path(tempfile.mkdtemp(prefix="hwh-report-"))
+        self.start = time.time()
+        self._start_cpu = _process_tree_cpu()
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock, open(self.spool / f"{os.getpid()}.jsonl", "a") as f:
+            f.write(json.dumps(asdict(span)) + "\n")
+
+    def spans(self) -> list[Span]:
+        spans = []
+        for spool_file in self.spool.glob("*.jsonl"):
+            spans += [Span(**json.loads(line)) for line in spool_file.open()]
+        return sorted(spans, key=lambda span: span.start)
+
+    def summary(self) -> dict:
+        spans = self.spans()
+        wall = time.time() - self.start
+        self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        phases: dict[str, dict] = {}
+        for span in spans:
+            phase = phases.setdefault(
+                span.phase, {"count": 0, "wall": 0.0, "cpu": 0.0, "peak_rss": 0}
+            )
+            phase["count"] += 1
+            phase["wall"] += span.wall
+            phase["cpu"] += span.cpu
+            phase["peak_rss"] = max(phase["peak_rss"], span.peak_rss)
+        for name in JOB_PHASES:
+            if name in phases:
+                phases[name]["parallelism"] = _parallelism(
+                    [span for span in spans if span.phase == name]
+                )
+
+        return {
+            "total": {
+                "wall": wall,
+                "cpu": _process_tree_cpu() - self._start_cpu,
+                "peak_rss": max(self_usage.ru_maxrss, children_usage.ru_maxrss),
+                "parallelism": _parallelism(
+                    [span for span in spans if span.phase in JOB_PHASES]
+                ),
+            },
+            "phases": phases,
+            "spans": [asdict(span) for span in spans],
+        }
+
+    def trace(self) -> dict:
+        """Chrome/Perfetto trace-event format of the spans, one track per
+        worker process or thread."""
+        spans = self.spans()
+        events = []
+        tracks: dict[tuple[int, int], str] = {}
+        for span in spans:
+            track = (span.pid, span.tid)
+            if track not in tracks:
+                main = span.pid == os.getpid() and span.tid == span.pid
+                tracks[track] = "main" if main else f"worker {len(tracks)}"
+            events.append(
+                {
+                    "name": span.name or span.phase,
+                    "cat": span.phase,
+                    "ph": "X",
+                    "ts": round(span.start * 1e6),
+                    "dur": round(span.wall * 1e6),
+                    "pid": span.pid,
+                    "tid": span.tid,
+                    "args": {"cpu": span.cpu, "peak_rss": span.peak_rss}
+                    | ({"module": span.name} if span.name else {}),
+                }
+            )
+
+        for (pid, tid), name in tracks.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {"name": name},
+                }
+            )
+        for pid in sorted({pid for pid, _ in tracks}):
+            name = "hwh build" if pid == os.getpid() else f"worker process {pid}"
+            events.append(
+                {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": name}}
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self) -> None:
+        if self.path is not None:
+            _write_json(self.path, self.summary())
+            logger.info(f"Build report written to {self.path}")
+        if self.trace_path is not None:
+            _write_json(self.trace_path, self.trace())
+            logger.info(f"Build trace written to {self.trace_path}")
+        shutil.rmtree(self.spool, ignore_errors=True)
+
+
+def _write_json(path: Path, data: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, indent=1))
+
+
+def _process_tree_cpu() -> float:
+    """CPU seconds of this process and its waited for children."""
+    return sum(
+        usage.ru_utime + usage.ru_stime
+        for usage in (
+            resource.getrusage(resource.RUSAGE_SELF),
+            resource.getrusage(resource.RUSAGE_CHILDREN),
+        )
+    )
+
+
+def _parallelism(spans: list[Span]) -> float:
+    """Busy time of the spans over the time between the first and last one."""
+    if not spans:
+        return 0.0
+    elapsed = max(s.start + s.wall for s in spans) - min(s.start for s in spans)
+    return sum(s.wall for s in spans) / elapsed if elapsed > 0 else 1.0
+
+
+_REPORT: Optional[BuildReport] = None
+_local = threading.local()
+
+
+def start(
+    path: Optional[Path] = None, trace_path: Optional[Path] = None
+) -> BuildReport:
+    """Start collecting spans of this build (and its worker processes)."""
+    global _REPORT
+    _REPORT = BuildReport(path, trace_path)
+    return _REPORT
+
+
+def finish() -> None:
+    """Write the report of the build started with start()."""
+    global _REPORT
+    if _REPORT is not None:
+        _REPORT.write()
+        _REPORT = None
+
+
+@contextmanager
+def span(phase: str, name: str = "") -> Iterator[None]:
+    """Record the wall time, CPU time and peak RSS of the block, if a report
+    is being collected."""
+    report = _REPORT
+    if report is None:
+        yield
+        return
+
+    # Subprocess resources of nested spans add up to the enclosing one
+    outer = getattr(_local, "children", None)
+    _local.children = [0.0, 0]
+    start_time = time.time()
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        children_cpu, children_rss = _local.children
+        report.add(
+            Span(
+                phase=phase,
+                name=name,
+                pid=os.getpid(),
+                tid=threading.get_native_id(),
+                start=start_time - report.start,
+                wall=time.perf_counter() - start_wall,
+                cpu=time.thread_time() - start_cpu + children_cpu,
+                peak_rss=max(
+                    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, children_rss
+                ),
+            )
+        )
+        if outer is not None:
+            outer[0] += children_cpu
+            outer[1] = max(outer[1], children_rss)
+        _local.children = outer
+
+
+@contextmanager
+def extension(name: str) -> Iterator[None]:
+    """Name compile and link spans in the block after the extension."""
+    _local.extension = name
+    try:
+        yield
+    finally:
+        _local.extension = None
+
+
+def _accounted(call):
+    """Wrap CCompiler.call to add the resources of its subprocess to the
+    enclosing span.
+
+    They are taken from the growth of RUSAGE_CHILDREN, which also covers
+    subprocesses of other threads that finished in the meantime, so with
+    parallel compiles the CPU of a span is an upper bound.
+    """
+
+    @wraps(call)
+    def wrapper(cmd, **kwargs):
+        before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        try:
+            return call(cmd, **kwargs)
+        finally:
+            after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            children = getattr(_local, "children", None)
+            if children is not None:
+                children[0] += (after.ru_utime + after.ru_stime) - (
+                    before.ru_utime + before.ru_stime
+                )
+                # Otherwise an earlier subprocess holds the high-water mark
+                if after.ru_maxrss > before.ru_maxrss:
+                    children[1] = max(children[1], after.ru_maxrss)
+
+    return wrapper
+
+
+@contextmanager
+def _patched(target, **attrs) -> Iterator[None]:
+    """Set attributes of target in the block, restoring them afterwards."""
+    originals = {name: vars(target)[name] for name in attrs if name in vars(target)}
+    for name, value in attrs.items():
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for name in attrs:
+            if name in originals:
+                setattr(target, name, originals[name])
+            else:
+                delattr(target, name)
+
+
+@contextmanager
+def instrument_compiler(compiler) -> Iterator[None]:
+    """Record compile and link spans for every extension built by compiler
+    in the block."""
+    if _REPORT is None:
+        yield
+        return
+
+    def spanned(phase, method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            with span(phase, getattr(_local, "extension", None) or ""):
+                return method(*args, **kwargs)
+
+        return wrapper
+
+    methods = {
+        "compile": spanned("compile", compiler.compile),
+        "link": spanned("link", compiler.link),
+    }
+    if hasattr(compiler, "call"):
+        methods["call"] = _accounted(compiler.call)
+    with _patched(compiler, **methods):
+        yield
+
+
+@contextmanager
+def instrument_cython() -> Iterator[None]:
+    """Record a span for every module cythonized by cythonize() in the
+    block."""
+    if _REPORT is None:
+        yield
+        return
+
+    from Cython.Build import Dependencies
+
+    cythonize_one = Dependencies.cythonize_one
+
+    @wraps(cythonize_one)
+    def wrapper(pyx_file, c_file, *args, **kwargs):
+        # full_module_name is passed positionally by cythonize()
+        name = kwargs.get("full_module_name") or (
+            args[5] if len(args) > 5 else pyx_file
+        )
+        with span("cythonize", name):
+            return cythonize_one(pyx_file, c_file, *args, **kwargs)
+
+    with _patched(Dependencies, cythonize_one=wrapper):
+        yield
@@ -0,0 +1,217 @@
+import csv
+import hashlib
+import json
+import os
+import posixpath
+import sys
+import sysconfig
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from email.parser import HeaderParser
+from pathlib import Path
+from typing import Iterable, Optional
+
+from packaging.requirements import InvalidRequirement, Requirement
+
+from .logger import logger
+from .metadata import normalize_dist_name
+
+# Written to the .dist-info of wheels built by hwh
+PATHS_NAME = "hwh-paths.json"
+CACHE_VERSION = 1
+
+_PXD_SUFFIXES = (".pxd", ".pxi")
+_HEADER_SUFFIXES = (".h", ".hpp")
+_LIBRARY_SUFFIXES = (".a", ".so", ".dylib")
+
+
+@dataclass
+class SearchPaths:
+    """Where the .pxd files, headers and libraries of dependencies are."""
+
+    # Roots Cython resolves cimports against
+    include_path: list[str] = field(default_factory=list)
+    include_dirs: list[str] = field(default_factory=list)
+    library_dirs: list[str] = field(default_factory=list)
+
+    def add(self, other: "SearchPaths") -> None:
+        for name, dirs in asdict(other).items():
+            own = getattr(self, name)
+            own.extend(d for d in dirs if d not in own)
+
+
+def _is_library(name: str) -> bool:
+    return (
+        name.startswith("lib")
+        and (name.endswith(_LIBRARY_SUFFIXES) or ".so." in name)
+        and not name.endswith(sysconfig.get_config_var("EXT_SUFFIX"))
+    )
+
+
+def exported_paths(files: Iterable[str]) -> dict[str, list[str]]:
+    """Search paths of a distribution, relative to the directory it's
+    installed to, from the paths of the files it installs.
+
+    cimports and includes are qualified with the package, so .pxd files and
+    headers only need the installation directory itself. Libraries are
+    linked by name and need the directories holding them.
+    """
+    pxd = headers = False
+    library_dirs = set()
+    for name in files:
+        if name.startswith("../") or ".dist-info/" in name:
+            continue
+        if name.endswith(_PXD_SUFFIXES):
+            pxd = True
+        elif name.endswith(_HEADER_SUFFIXES):
+            headers = True
+        elif _is_library(posixpath.basename(name)):
+            library_dirs.add(posixpath.dirname(name) or ".")
+    return {
+        "include_path": ["."] if pxd else [],
+        "include_dirs": ["."] if headers else [],
+        "library_dirs": sorted(library_dirs),
+    }
+
+
+def site_dirs(project_dir: Path) -> list[str]:
+    """Directories distributions are installed to: the ones on sys.path,
+    then purelib and platlib, which build isolation takes off sys.path."""
+    project_dir = os.path.abspath(project_dir)
+    dirs = [
+        os.path.abspath(path)
+        for path in sys.path
+        if path and os.path.abspath(path) != project_dir
+    ]
+    dirs += [sysconfig.get_path("purelib"), sysconfig.get_path("platlib")]
+    return [d for d in dict.fromkeys(dirs) if os.path.isdir(d)]
+
+
+def _installed(dirs: list[str]) -> dict[str, tuple[str, Path]]:
+    """.dist-info of every distribution by normalized name, with the
+    directory it's installed to. The first one found on the path wins."""
+    installed = {}
+    for site_dir in dirs:
+        try:
+            entries = os.scandir(site_dir)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.endswith(".dist-info"):
+                    name = normalize_dist_name(entry.name.partition("-")[0])
+                    installed.setdefault(name, (site_dir, Path(entry.path)))
+    return installed
+
+
+def _distribution_paths(site_dir: str, dist_info: Path) -> SearchPaths:
+    try:
+        exported = json.loads((dist_info / PATHS_NAME).read_text())
+    except (OSError, ValueError):
+        # Not built by hwh, every installed file is listed in RECORD
+        try:
+            with open(dist_info / "RECORD", newline="") as f:
+                exported = exported_paths(row[0] for row in csv.reader(f) if row)
+        except OSError:
+            return SearchPaths()
+    return SearchPaths(
+        **{
+            name: [
+                os.path.normpath(os.path.join(site_dir, path))
+                for path in exported.get(name, [])
+            ]
+            for name in ("include_path", "include_dirs", "library_dirs")
+        }
+    )
+
+
+def _requires(dist_info: Path) -> list[Requirement]:
+    try:
+        metadata = HeaderParser().parsestr((dist_info / "METADATA").read_text())
+    except OSError:
+        return []
+    requires = []
+    for value in metadata.get_all("Requires-Dist") or []:
+        try:
+            requires.append(Requirement(value))
+        except InvalidRequirement:
+            logger.debug(f"Skipping invalid requirement {value} of {dist_info}")
+    return requires
+
+
+def resolve(requirements: Iterable[Requirement], dirs: list[str]) -> SearchPaths:
+    """Search paths of the installed distributions of requirements and of
+    everything they require, in that order."""
+    installed = _installed(dirs)
+    paths = SearchPaths()
+    seen: set[tuple[str, str]] = set()
+    added: set[str] = set()
+    queue = deque((req, "") for req in requirements)
+    while queue:
+        req, extra = queue.popleft()
+        if req.marker and not req.marker.evaluate({"extra": extra}):
+            continue
+        name = normalize_dist_name(req.name)
+        extras = sorted(req.extras) or [""]
+        if all((name, e) in seen for e in extras):
+            continue
+        if name not in installed:
+            logger.debug(f"Dependency {req.name} is not installed")
+            continue
+        site_dir, dist_info = installed[name]
+        if name not in added:
+            added.add(name)
+            paths.add(_distribution_paths(site_dir, dist_info))
+        for e in extras:
+            if (name, e) not in seen:
+                seen.add((name, e))
+                queue.extend((dep, e) for dep in _requires(dist_info))
+    return paths
+
+
+def _fingerprint(requirements: Iterable[Requirement], dirs: list[str]) -> str:
+    """Installing or removing a distribution adds or removes its .dist-info,
+    which changes the mtime of the directory it's installed to."""
+    state = [sorted(str(req) for req in requirements)]
+    for site_dir in dirs:
+        try:
+            state.append([site_dir, os.stat(site_dir).st_mtime_ns])
+        except OSError:
+            state.append([site_dir, None])
+    return hashlib.sha256(json.dumps(state).encode()).hexdigest()
+
+
+def dependency_paths(
+    requirements: Iterable[Requirement], project_dir: Path, build_dir: Path
+) -> SearchPaths:
+    """Search paths of the declared dependencies of a project.
+
+    They are cached under the build directory for each interpreter, until a
+    distribution is installed to or removed from one of its site dirs or the
+    dependencies change.
+    """
+    requirements = list(requirements)
+    dirs = site_dirs(project_dir)
+    fingerprint = _fingerprint(requirements, dirs)
+    cache_path = build_dir / "hwh" / "dependency-paths.json"
+    data: dict = {}
+    try:
+        data = json.loads(cache_path.read_text())
+    except (OSError, ValueError):
+        pass
+    if data.get("version") != CACHE_VERSION:
+        data = {"version": CACHE_VERSION, "environments": {}}
+    cached: Optional[dict] = data["environments"].get(sys.executable)
+    if cached and cached["fingerprint"] == fingerprint:
+        logger.debug(f"Using dependency search paths from {cache_path}")
+        return SearchPaths(**cached["paths"])
+
+    paths = resolve(requirements, dirs)
+    logger.debug(f"Resolved dependency search paths: {paths}")
+    data["environments"][sys.executable] = {
+        "fingerprint": fingerprint,
+        "paths": asdict(paths),
+    }
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    cache_path.write_text(json.dumps(data, indent=1))
+    return paths
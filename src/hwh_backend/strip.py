@@ -0,0 +1,72 @@
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+from .hwh_config import Strip
+from .logger import logger
+
+
+def _tool(env_var: str, default: str) -> str:
+    """binutils tool to use, overridable like the compiler is with CC."""
+    tool = os.environ.get(env_var) or default
+    if shutil.which(tool) is None:
+        logger.error(f"{tool} not found, install binutils or set {env_var}")
+        raise RuntimeError(f"Stripping extensions needs {tool}")
+    return tool
+
+
+def _is_elf(path: Path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(4) == b"\x7fELF"
+
+
+def strip_extensions(
+    root: Path,
+    mode: Strip,
+    debug_dir: Optional[Path],
+    output_dir: Optional[Path] = None,
+) -> list[Path]:
+    """Strip the extension modules under root, in place unless output_dir is
+    given.
+
+    debug_dir: if given, the debug info of every extension is saved there
+        first, as <path relative to root>.debug, and the stripped extension
+        gets a GNU debuglink to it
+    output_dir: if given, stripped copies of the extensions are written there,
+        laid out like root, which is left as is
+    returns: the saved debug files
+    """
+    strip = _tool("STRIP", "strip")
+    objcopy = _tool("OBJCOPY", "objcopy") if debug_dir is not None else None
+    strip_flag = "--strip-debug" if mode == Strip.DEBUG else "--strip-unneeded"
+
+    debug_files = []
+    for ext in sorted(root.rglob("*.so")):
+        if not _is_elf(ext):
+            logger.debug(f"Not stripping {ext}, it's not an ELF file")
+            continue
+        rel_path = ext.relative_to(root)
+        size = ext.stat().st_size
+        stripped = ext
+        if output_dir is not None:
+            stripped = output_dir / rel_path
+            stripped.parent.mkdir(parents=True, exist_ok=True)
+        if objcopy is not None:
+            debug_file = debug_dir / rel_path.with_name(f"{ext.name}.debug")
+            debug_file.parent.mkdir(parents=True, exist_ok=True)
+            subprocess.run(
+                [objcopy, "--only-keep-debug", str(ext), str(debug_file)], check=True
+            )
+            debug_files.append(debug_file)
+        subprocess.run([strip, strip_flag, str(ext), "-o", str(stripped)], check=True)
+        if objcopy is not None:
+            # Records the name and CRC of the debug file, gdb looks for it next
+            # to the extension or under its debug-file-directory
+            subprocess.run(
+                [objcopy, f"--add-gnu-debuglink={debug_file}", str(stripped)],
+                check=True,
+            )
+        logger.info(f"Stripped {rel_path}: {size} -> {stripped.stat().st_size} bytes")
+    return debug_files
@@ -0,0 +1,248 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from pathlib import Path
+from typing import Optional, Protocol
+
+from . import build
+from .logger import logger
+from .parser import load_project
+
+# Files whose changes require rebuilding an extension. Generated .c files are
+# left out on purpose, rebuilding would trigger the watcher again.
+WATCHED_SUFFIXES = {".pyx", ".pxd", ".pxi", ".h", ".hpp"}
+SKIPPED_DIRS = {"build", "__pycache__"}
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_EVENT = struct.Struct("iIII")
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+
+def _is_watched(path: str) -> bool:
+    return os.path.splitext(path)[1] in WATCHED_SUFFIXES
+
+
+def _walk_dirs(roots: list[Path]):
+    for root in roots:
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [
+                d for d in dirnames if d not in SKIPPED_DIRS and not d.startswith(".")
+            ]
+            yield dirpath
+
+
+class Watcher(Protocol):
+    def wait(self, timeout: Optional[float]) -> set[str]:
+        """Block until files change or timeout passes, return changed files."""
+        ...
+
+    def close(self) -> None: ...
+
+
+class InotifyWatcher:
+    """Recursive directory watcher on top of Linux inotify, through ctypes.
+
+    Directories created later that can't be watched, e.g. because the
+    inotify watch limit is reached, are polled every poll_interval instead.
+    """
+
+    def __init__(self, roots: list[Path], poll_interval: float = 1.0):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1: {os.strerror(errno)}")
+        self.poll_interval = poll_interval
+        self._dirs: dict[int, str] = {}
+        self._polling: Optional[PollingWatcher] = None
+        for dirpath in _walk_dirs(roots):
+            self._add_watch(dirpath)
+
+    def _add_watch(self, dirpath: str) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dirpath), _WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watch {dirpath}: {os.strerror(errno)}")
+        self._dirs[wd] = dirpath
+
+    def _watch_new_dir(self, path: str) -> None:
+        """Watch a created directory and its subdirectories, falling back to
+        polling the ones inotify can't watch."""
+        polled: list[str] = []
+        for dirpath in _walk_dirs([Path(path)]):
+            if any(Path(dirpath).is_relative_to(p) for p in polled):
+                continue
+            try:
+                self._add_watch(dirpath)
+            except OSError as e:
+                if not os.path.isdir(dirpath):
+                    # Removed again in the meantime
+                    logger.debug(f"Not watching {dirpath}: {e}")
+                    continue
+                logger.warning(f"{e}, polling {dirpath} for changes instead")
+                polled.append(dirpath)
+                if self._polling is None:
+                    self._polling = PollingWatcher([], self.poll_interval)
+                self._polling.add(Path(dirpath))
+
+    def wait(self, timeout: Optional[float]) -> set[str]:
+        if self._polling is not None:
+            # Polled directories are scanned at least every interval
+            timeout = (
+                self.poll_interval
+                if timeout is None
+                else min(timeout, self.poll_interval)
+            )
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        changed = self._read_events() if readable else set()
+        if self._polling is not None:
+            changed |= self._polling.wait(0)
+        return changed
+
+    def _read_events(self) -> set[str]:
+        changed = set()
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify queue overflowed, some changes may be missed")
+                continue
+            path = os.path.join(self._dirs.get(wd, ""), name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_new_dir(path)
+            elif _is_watched(path):
+                changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback watcher comparing file mtimes and sizes every interval."""
+
+    def __init__(self, roots: list[Path], interval: float = 1.0):
+        self.roots = roots
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def add(self, root: Path) -> None:
+        """Poll root as well, from its current state on."""
+        self.roots.append(root)
+        self._snapshot.update(self._scan([root]))
+
+    def _scan(self, roots: Optional[list[Path]] = None) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+        for dirpath in _walk_dirs(self.roots if roots is None else roots):
+            with os.scandir(dirpath) as entries:
+                for entry in entries:
+                    if entry.is_file() and _is_watched(entry.name):
+                        stat = entry.stat()
+                        snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout: Optional[float]) -> set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changed = {
+                path
+                for path in snapshot.keys() | self._snapshot.keys()
+                if snapshot.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = snapshot
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(
+                self.interval
+                if deadline is None
+                else max(0.0, min(self.interval, deadline - time.monotonic()))
+            )
+
+    def close(self) -> None:
+        pass
+
+
+def _rebuild(config_settings: dict) -> None:
+    """Incrementally rebuild the extensions in place, in this process.
+
+    Cython stays imported between rebuilds, only per-build state is reset.
+    """
+    from Cython.Build import Dependencies
+
+    # cythonize() caches parsed dependencies and timestamps module-wide
+    Dependencies._dep_tree = None
+    # Rediscover packages, modules may have been added since the last build
+    build._build_extension(
+        inplace=True,
+        config_settings=config_settings,
+        incremental=True,
+        project=load_project(reload=True),
+        force=True,
+    )
+
+
+def watch(
+    project_dir: Path,
+    config_settings: Optional[dict] = None,
+    debounce: float = 0.3,
+    poll: bool = False,
+    poll_interval: float = 1.0,
+) -> None:
+    """Rebuild outdated extensions in place whenever their sources change."""
+    config_settings = config_settings or {}
+    os.chdir(project_dir)
+    roots = load_project().get_all_package_paths()
+    logger.info(f"Watching {', '.join(str(r) for r in roots)} for changes")
+
+    watcher: Watcher
+    if poll:
+        watcher = PollingWatcher(roots, poll_interval)
+    else:
+        try:
+            watcher = InotifyWatcher(roots, poll_interval)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify unavailable ({e}), polling for changes instead")
+            watcher = PollingWatcher(roots, poll_interval)
+
+    try:
+        _rebuild(config_settings)
+        while True:
+            changed = watcher.wait(None)
+            # Editors and checkouts save in bursts, wait for them to settle
+            while more := watcher.wait(debounce):
+                changed |= more
+            if not changed:
+                continue
+
+            logger.info(f"Changed: {', '.join(sorted(changed))}")
+            try:
+                _rebuild(config_settings)
+            except Exception as e:
+                # Keep watching, the next save is probably the fix
+                logger.error(f"Rebuild failed: {e}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
@@ -0,0 +1,303 @@
+import base64
+import csv
+import hashlib
+import io
+import os
+import stat
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .logger import logger
+
+# Oldest timestamp a zip file can hold
+ZIP_EPOCH = 315532800
+# Sizes, offsets and entry counts from which ZIP64 records are needed
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+
+CHUNK_SIZE = 1 << 20
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHLLLHH")
+_CENTRAL_HEADER = struct.Struct("<4sHHHHHHLLLHHHHHLL")
+_END_RECORD = struct.Struct("<4sHHHHLLH")
+_ZIP64_END_RECORD = struct.Struct("<4sQHHLLQQQQ")
+_ZIP64_END_LOCATOR = struct.Struct("<4sLQL")
+_ZIP64_EXTRA_ID = 0x0001
+
+_STORED = 0
+_DEFLATED = 8
+_UTF8_FLAG = 0x800
+# Made by a Unix host, so that installers keep the permissions
+_VERSION_MADE_BY = (3 << 8) | 45
+
+
+@dataclass
+class _Member:
+    name: str
+    data: list[bytes]
+    crc: int
+    size: int
+    compressed_size: int
+    digest: str
+    executable: bool
+
+
+def record_hash(digest: bytes) -> str:
+    """Hash of a file as written to RECORD."""
+    return "sha256=" + base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def source_date_epoch() -> int:
+    """Timestamp of every file in the wheel: $SOURCE_DATE_EPOCH if set, the
+    oldest one a zip file can hold otherwise."""
+    if epoch := os.environ.get("SOURCE_DATE_EPOCH"):
+        return max(int(epoch), ZIP_EPOCH)
+    return ZIP_EPOCH
+
+
+def tree_files(root: Path) -> dict[str, Path]:
+    """Files under root by their path in the wheel, without bytecode."""
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d != "__pycache__"]
+        for filename in filenames:
+            path = Path(dirpath, filename)
+            files[path.relative_to(root).as_posix()] = path
+    return files
+
+
+def _chunks(source: Path | bytes) -> Iterator[bytes]:
+    if isinstance(source, bytes):
+        yield source
+        return
+    with open(source, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
+
+
+def _read(name: str, source: Path | bytes, level: int) -> _Member:
+    """Compress a file in a single read, hashing and checksumming it along."""
+    compressor = (
+        zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS) if level else None
+    )
+    sha256 = hashlib.sha256()
+    crc = 0
+    size = 0
+    data = []
+    for chunk in _chunks(source):
+        sha256.update(chunk)
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        data.append(compressor.compress(chunk) if compressor else chunk)
+    if compressor:
+        data.append(compressor.flush())
+    executable = isinstance(source, Path) and bool(
+        os.stat(source).st_mode & stat.S_IXUSR
+    )
+    return _Member(
+        name,
+        data,
+        crc,
+        size,
+        sum(len(chunk) for chunk in data),
+        record_hash(sha256.digest()),
+        executable,
+    )
+
+
+class WheelWriter:
+    """Writes a wheel straight from the files that go in it.
+
+    Files are read once, which hashes them for RECORD and compresses them on
+    a thread pool, zlib releases the GIL while compressing. They are written
+    in the order they were added, followed by RECORD. Timestamps and
+    permissions are normalized, so the same files always give the same
+    wheel.
+
+    compression: zlib level from 1 to 9, or 0 to store files uncompressed
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        dist_info: str,
+        compression: int = 6,
+        nthreads: int = 1,
+        timestamp: Optional[int] = None,
+    ):
+        self.path = path
+        self.dist_info = dist_info
+        self.compression = compression
+        self.nthreads = max(1, nthreads)
+        date_time = time.gmtime(
+            source_date_epoch() if timestamp is None else max(timestamp, ZIP_EPOCH)
+        )
+        self._dos_time = (
+            date_time.tm_hour << 11 | date_time.tm_min << 5 | date_time.tm_sec // 2
+        )
+        self._dos_date = (
+            (date_time.tm_year - 1980) << 9 | date_time.tm_mon << 5 | date_time.tm_mday
+        )
+        self._sources: dict[str, Path | bytes] = {}
+
+    def add_file(self, name: str, path: Path) -> None:
+        self._sources[name] = path
+
+    def add_bytes(self, name: str, data: bytes) -> None:
+        self._sources[name] = data
+
+    def write(self) -> None:
+        record_name = f"{self.dist_info}/RECORD"
+        self._sources.pop(record_name, None)
+        record = io.StringIO()
+        writer = csv.writer(record, lineterminator="\n")
+        central = []
+        offset = 0
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                for member in self._read_members():
+                    writer.writerow([member.name, member.digest, member.size])
+                    central.append(self._central_header(member, offset))
+                    offset += self._write_member(f, member)
+                writer.writerow([record_name, "", ""])
+                member = _read(
+                    record_name, record.getvalue().encode(), self.compression
+                )
+                central.append(self._central_header(member, offset))
+                offset += self._write_member(f, member)
+                self._write_end(f, central, offset)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        tmp_path.replace(self.path)
+        logger.debug(f"Wrote {len(central)} files to {self.path}")
+
+    def _read_members(self) -> Iterator[_Member]:
+        """Members in the order they were added, read ahead on the thread
+        pool, a bounded number at a time."""
+        with ThreadPoolExecutor(self.nthreads) as executor:
+            pending = []
+            for name, source in self._sources.items():
+                pending.append(executor.submit(_read, name, source, self.compression))
+                if len(pending) >= 2 * self.nthreads:
+                    yield pending.pop(0).result()
+            for future in pending:
+                yield future.result()
+
+    def _flags(self, member: _Member) -> int:
+        return 0 if member.name.isascii() else _UTF8_FLAG
+
+    def _write_member(self, f, member: _Member) -> int:
+        name = member.name.encode()
+        extra = b""
+        size, compressed_size = member.size, member.compressed_size
+        if max(size, compressed_size) >= ZIP64_LIMIT:
+            extra = struct.pack("<HHQQ", _ZIP64_EXTRA_ID, 16, size, compressed_size)
+            size = compressed_size = ZIP64_LIMIT
+        header = _LOCAL_HEADER.pack(
+            b"PK\x03\x04",
+            45 if extra else 20,
+            self._flags(member),
+            _DEFLATED if self.compression else _STORED,
+            self._dos_time,
+            self._dos_date,
+            member.crc,
+            compressed_size,
+            size,
+            len(name),
+            len(extra),
+        )
+        f.write(header + name + extra)
+        for chunk in member.data:
+            f.write(chunk)
+        return len(header) + len(name) + len(extra) + member.compressed_size
+
+    def _central_header(self, member: _Member, offset: int) -> bytes:
+        name = member.name.encode()
+        # ZIP64 extra fields hold the values that don't fit, in this order
+        zip64 = []
+        size, compressed_size = member.size, member.compressed_size
+        if size >= ZIP64_LIMIT:
+            zip64.append(size)
+            size = ZIP64_LIMIT
+        if compressed_size >= ZIP64_LIMIT:
+            zip64.append(compressed_size)
+            compressed_size = ZIP64_LIMIT
+        if offset >= ZIP64_LIMIT:
+            zip64.append(offset)
+            offset = ZIP64_LIMIT
+        extra = (
+            struct.pack(f"<HH{len(zip64)}Q", _ZIP64_EXTRA_ID, 8 * len(zip64), *zip64)
+            if zip64
+            else b""
+        )
+        mode = stat.S_IFREG | (0o755 if member.executable else 0o644)
+        return (
+            _CENTRAL_HEADER.pack(
+                b"PK\x01\x02",
+                _VERSION_MADE_BY,
+                45 if zip64 else 20,
+                self._flags(member),
+                _DEFLATED if self.compression else _STORED,
+                self._dos_time,
+                self._dos_date,
+                member.crc,
+                compressed_size,
+                size,
+                len(name),
+                len(extra),
+                0,
+                0,
+                0,
+                mode << 16,
+                offset,
+            )
+            + name
+            + extra
+        )
+
+    def _write_end(self, f, central: list[bytes], offset: int) -> None:
+        directory = b"".join(central)
+        f.write(directory)
+        count = len(central)
+        end_offset = offset + len(directory)
+        if (
+            count >= ZIP64_COUNT_LIMIT
+            or len(directory) >= ZIP64_LIMIT
+            or offset >= ZIP64_LIMIT
+        ):
+            f.write(
+                _ZIP64_END_RECORD.pack(
+                    b"PK\x06\x06",
+                    _ZIP64_END_RECORD.size - 12,
+                    _VERSION_MADE_BY,
+                    45,
+                    0,
+                    0,
+                    count,
+                    count,
+                    len(directory),
+                    offset,
+                )
+            )
+            f.write(_ZIP64_END_LOCATOR.pack(b"PK\x06\x07", 0, end_offset, 1))
+            count = min(count, ZIP64_COUNT_LIMIT)
+            offset = min(offset, ZIP64_LIMIT)
+        f.write(
+            _END_RECORD.pack(
+                b"PK\x05\x06",
+                0,
+                0,
+                count,
+                count,
+                min(len(directory), ZIP64_LIMIT),
+                offset,
+                0,
+            )
+        )
@@ -0,0 +1,400 @@
+import ipaddress
+import json
+import os
+import shlex
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import sysconfig
+import tempfile
+import threading
+import zlib
+from pathlib import Path
+from typing import Optional
+
+from setuptools.errors import CompileError
+
+from .executor import CompileExecutor, CompileJob
+from .logger import logger
+
+_MAGIC = b"HWH1"
+_PREFIX = struct.Struct("!4sII")
+# Largest header accepted, payloads are only bounded by memory
+_MAX_HEADER = 1 << 20
+
+# Compile flags workers accept: optimization, code generation, warning and
+# debug flags. Anything else may pass options on to other programs or read
+# and write files, jobs with such flags are compiled locally and workers
+# refuse them.
+_ALLOWED_FLAGS = ("-O", "-f", "-m", "-W", "-g", "-std=", "--param=")
+_ALLOWED_EXACT = {"-pipe", "-pthread", "-pedantic", "-pedantic-errors", "-w"}
+# -f and -g flags among the allowed ones that still read or write files
+_FILE_FLAGS = (
+    "-fauto-profile",
+    "-fcallgraph-info",
+    "-fcreate-profile",
+    "-fdiagnostics-add-output",
+    "-fdiagnostics-format",
+    "-fdump-",
+    "-fopt-info",
+    "-fplugin",
+    "-fprofile",
+    "-fsave-optimization-record",
+    "-fstack-usage",
+    "-gsplit-dwarf",
+)
+# -W options that pass their arguments on to the assembler, preprocessor or
+# linker
+_PASSTHROUGH_FLAGS = ("-Wa,", "-Wp,", "-Wl,")
+# Preprocessor options, which preprocessed sources don't need. The ones
+# here take a separate argument unless it's joined to them.
+_PREPROCESSOR_ARGS = ("-I", "-D", "-U", "-include", "-imacros", "-isystem")
+_PREPROCESSOR_ARGS += ("-iquote", "-idirafter", "-MF", "-MT", "-MQ")
+# Options for the preprocessor only, passed on by the compiler driver
+_PREPROCESSOR_OPTIONS = ("-Wp,",)
+_PREPROCESSED_LANGUAGES = {"c": "cpp-output", "c++": "c++-cpp-output"}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def parse_address(address: str) -> tuple[int, str | tuple[str, int]]:
+    """Socket family and address of tcp://host:port, host:port or
+    unix:/path."""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address.removeprefix("unix:").removeprefix("//")
+    host, sep, port = address.removeprefix("tcp://").rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError(
+            f"Invalid worker address: {address}, expected tcp://host:port or "
+            "unix:/path"
+        )
+    return socket.AF_INET6 if ":" in host else socket.AF_INET, (
+        host.strip("[]"),
+        int(port),
+    )
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(min(size - len(data), 1 << 20))
+        if not chunk:
+            raise ProtocolError("Connection closed mid-message")
+        data += chunk
+    return bytes(data)
+
+
+def send_message(sock: socket.socket, header: dict, payload: bytes = b"") -> None:
+    """A JSON header followed by a zlib compressed payload."""
+    data = json.dumps(header).encode()
+    payload = zlib.compress(payload, 1)
+    sock.sendall(_PREFIX.pack(_MAGIC, len(data), len(payload)) + data + payload)
+
+
+def recv_message(sock: socket.socket) -> tuple[dict, bytes]:
+    magic, header_size, payload_size = _PREFIX.unpack(_recv_exact(sock, _PREFIX.size))
+    if magic != _MAGIC or header_size > _MAX_HEADER:
+        raise ProtocolError("Not a message of an hwh worker")
+    header = json.loads(_recv_exact(sock, header_size))
+    return header, zlib.decompress(_recv_exact(sock, payload_size))
+
+
+def _allowed_flag(flag: str) -> bool:
+    if flag in _ALLOWED_EXACT:
+        return True
+    if not flag.startswith(_ALLOWED_FLAGS) or flag.startswith(_PASSTHROUGH_FLAGS):
+        return False
+    if flag.startswith(_FILE_FLAGS):
+        return False
+    # Values that are paths, e.g. -ffile-prefix-map=/src=.
+    _, _, value = flag.partition("=")
+    return "/" not in value and os.sep not in value
+
+
+def refused_flags(flags: list[str]) -> list[str]:
+    """Flags a worker refuses to compile with, see _ALLOWED_FLAGS. -x is
+    allowed along with its language."""
+    refused = []
+    args = iter(flags)
+    for flag in args:
+        if flag == "-x":
+            if next(args, None) not in _PREPROCESSED_LANGUAGES.values():
+                refused.append(flag)
+        elif not _allowed_flag(flag):
+            refused.append(flag)
+    return refused
+
+
+def compile_flags(command: list[str]) -> list[str]:
+    """Flags of a compile command that still apply to its preprocessed
+    source: all but the compiler, -c and preprocessor options."""
+    flags = []
+    args = iter(command[1:])
+    for arg in args:
+        if arg == "-c" or arg.startswith(("-MD", "-MMD")):
+            continue
+        if arg in _PREPROCESSOR_ARGS:
+            next(args, None)
+            continue
+        if arg.startswith(_PREPROCESSOR_ARGS + _PREPROCESSOR_OPTIONS):
+            continue
+        flags.append(arg)
+    return flags
+
+
+class _Worker:
+    def __init__(self, address: str):
+        self.address = address
+        self.family, self.sockaddr = parse_address(address)
+        self.alive = True
+        self.running = 0
+
+    def compile(
+        self, header: dict, source: bytes, timeout: float
+    ) -> tuple[dict, bytes]:
+        with socket.socket(self.family, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(self.sockaddr)
+            send_message(sock, header, source)
+            return recv_message(sock)
+
+
+class WorkerExecutor(CompileExecutor):
+    """Compiles on `python -m hwh_backend worker` servers.
+
+    Sources are preprocessed locally and sent with the flags that still
+    apply to them, workers compile them with their own compiler and send
+    back the object files. Workers are expected to run the same compiler as
+    the build. Jobs go to the worker with the fewest jobs running. A worker
+    that can't be reached or drops a job is left out for the rest of the
+    build and its jobs are retried on the others, and once none is left
+    they are compiled locally, at most nthreads at a time.
+    """
+
+    def __init__(
+        self,
+        workers: list[str],
+        nthreads: int = 1,
+        jobs: Optional[int] = None,
+        timeout: float = 600,
+    ):
+        if not workers:
+            raise ValueError("The workers executor needs worker addresses")
+        self.workers = [_Worker(address) for address in workers]
+        self.jobs = jobs or max(1, nthreads) + 4 * len(self.workers)
+        self.timeout = timeout
+        self.remote = 0
+        self.local = 0
+        self._lock = threading.Lock()
+        self._local_slots = threading.Semaphore(max(1, nthreads))
+
+    def _next_worker(self) -> Optional[_Worker]:
+        with self._lock:
+            alive = [worker for worker in self.workers if worker.alive]
+            if not alive:
+                return None
+            worker = min(alive, key=lambda w: w.running)
+            worker.running += 1
+            return worker
+
+    def _compile_locally(self, job: CompileJob) -> None:
+        with self._local_slots:
+            job.compile_locally()
+        with self._lock:
+            self.local += 1
+
+    def compile(self, job: CompileJob) -> None:
+        language = _PREPROCESSED_LANGUAGES.get(job.language)
+        flags = compile_flags(job.command)
+        if language is None or refused_flags(flags):
+            logger.debug(f"Compiling {job.src} locally, it can't be sent")
+            return self._compile_locally(job)
+
+        source = None
+        while worker := self._next_worker():
+            try:
+                if source is None:
+                    source = self._preprocess(job)
+                    if source is None:
+                        break
+                header, obj = worker.compile(
+                    {
+                        "name": os.path.basename(job.src),
+                        "language": language,
+                        "flags": flags,
+                    },
+                    source,
+                    self.timeout,
+                )
+            except (OSError, ProtocolError, ValueError, zlib.error) as e:
+                logger.warning(
+                    f"Compile worker {worker.address} went away, "
+                    f"continuing without it: {e}"
+                )
+                worker.alive = False
+                continue
+            finally:
+                with self._lock:
+                    worker.running -= 1
+
+            sys.stderr.write(header.get("stderr", ""))
+            if header.get("returncode") != 0:
+                raise CompileError(
+                    f"Compiling {job.src} on {worker.address} failed with "
+                    f"exit code {header.get('returncode')}"
+                )
+            Path(job.obj).parent.mkdir(parents=True, exist_ok=True)
+            Path(job.obj).write_bytes(obj)
+            with self._lock:
+                self.remote += 1
+            return
+        self._compile_locally(job)
+
+    def _preprocess(self, job: CompileJob) -> Optional[bytes]:
+        """Preprocessed source, None if preprocessing fails, which compiling
+        locally reports."""
+        command = [arg for arg in job.command if arg != "-c"]
+        try:
+            result = subprocess.run(
+                command + ["-E", job.src], capture_output=True, check=True
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.debug(f"Preprocessing {job.src} failed: {e}")
+            return None
+        return result.stdout
+
+    def close(self) -> None:
+        if self.remote + self.local:
+            logger.info(
+                f"Compiled {self.remote} objects on workers, {self.local} locally"
+            )
+
+
+class CompileWorker:
+    """Compiles preprocessed sources sent by WorkerExecutor, at most jobs at
+    a time."""
+
+    def __init__(
+        self,
+        jobs: int,
+        cc: Optional[list[str]] = None,
+        cxx: Optional[list[str]] = None,
+    ):
+        self.cc = cc or shlex.split(sysconfig.get_config_var("CC") or "cc")
+        self.cxx = cxx or shlex.split(sysconfig.get_config_var("CXX") or "c++")
+        self.jobs = jobs
+        self._slots = threading.Semaphore(jobs)
+
+    def compile(self, header: dict, source: bytes) -> tuple[dict, bytes]:
+        flags = [str(flag) for flag in header.get("flags", [])]
+        language = header.get("language")
+        if refused := refused_flags(flags):
+            return {"returncode": 1, "stderr": f"Refused flags: {refused}\n"}, b""
+        if language not in _PREPROCESSED_LANGUAGES.values():
+            return {"returncode": 1, "stderr": f"Unknown language {language}\n"}, b""
+
+        compiler = self.cxx if language == "c++-cpp-output" else self.cc
+        name = Path(header.get("name") or "source").name
+        with self._slots, tempfile.TemporaryDirectory(prefix="hwh-worker-") as tmp:
+            src = Path(tmp, f"{name}.{'ii' if compiler is self.cxx else 'i'}")
+            obj = Path(tmp, "output.o")
+            src.write_bytes(source)
+            command = (
+                compiler + flags + ["-x", language, "-c", str(src), "-o", str(obj)]
+            )
+            try:
+                result = subprocess.run(command, capture_output=True, cwd=tmp)
+            except OSError as e:
+                return {"returncode": 1, "stderr": f"{e}\n"}, b""
+            response = {
+                "returncode": result.returncode,
+                "stderr": result.stderr.decode(errors="replace"),
+            }
+            logger.debug(f"Compiled {name}: exit code {result.returncode}")
+            if result.returncode != 0:
+                return response, b""
+            return response, obj.read_bytes()
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            header, source = recv_message(self.request)
+        except (OSError, ProtocolError, ValueError, zlib.error) as e:
+            logger.debug(f"Dropped a connection: {e}")
+            return
+        response, obj = self.server.worker.compile(header, source)
+        send_message(self.request, response, obj)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def is_loopback(host: str) -> bool:
+    """Whether every address host resolves to is a loopback address."""
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except OSError:
+        return False
+    return bool(infos) and all(
+        ipaddress.ip_address(info[4][0].split("%")[0]).is_loopback for info in infos
+    )
+
+
+def make_server(
+    address: str, worker: CompileWorker, allow_remote: bool = False
+) -> socketserver.BaseServer:
+    """Server for worker on address, a port of 0 picks a free one.
+
+    Workers compile for whoever connects, so TCP addresses other than
+    loopback ones need allow_remote.
+    """
+    family, sockaddr = parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(sockaddr):
+            os.unlink(sockaddr)
+        server = _UnixServer(sockaddr, _Handler)
+    else:
+        if not allow_remote and not is_loopback(sockaddr[0]):
+            raise ValueError(
+                f"Refusing to listen on {address}, workers don't authenticate "
+                "builds. Pass --allow-remote to listen on other than loopback "
+                "addresses."
+            )
+        server_class = type("_Server", (_TCPServer,), {"address_family": family})
+        server = server_class(sockaddr, _Handler)
+    server.worker = worker
+    return server
+
+
+def serve(
+    address: str,
+    jobs: int,
+    cc: Optional[str],
+    cxx: Optional[str],
+    allow_remote: bool = False,
+) -> None:
+    worker = CompileWorker(
+        jobs, shlex.split(cc) if cc else None, shlex.split(cxx) if cxx else None
+    )
+    server = make_server(address, worker, allow_remote)
+    logger.info(
+        f"Compile worker listening on {server.server_address} with {jobs} jobs, "
+        f"compiling with {shlex.join(worker.cc)} and {shlex.join(worker.cxx)}"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
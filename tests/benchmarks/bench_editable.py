@@ -0,0 +1,82 @@
+"""Times editable install detection against a large site-packages.
+
+Compares looking up the project's .dist-info directory by name with
+scanning all distributions through importlib.metadata:
+
+    python -m tests.benchmarks.bench_editable --distributions 800
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from importlib.metadata import FastPath, distributions
+from pathlib import Path
+
+from hwh_backend.build import _installed_direct_url
+
+DIRECT_URL = {"url": "file:///src/project", "dir_info": {"editable": True}}
+
+
+def create_site_packages(site_dir: Path, n: int) -> None:
+    """Fill site_dir with n distributions, the last of them project-N."""
+    for i in range(n):
+        dist_info = site_dir / f"package_{i}-1.0.dist-info"
+        dist_info.mkdir()
+        (dist_info / "METADATA").write_text(
+            f"Metadata-Version: 2.1\nName: package-{i}\nVersion: 1.0\n"
+        )
+        (dist_info / "RECORD").write_text("")
+    (site_dir / f"package_{n - 1}-1.0.dist-info" / "direct_url.json").write_text(
+        json.dumps(DIRECT_URL)
+    )
+
+
+def scan_distributions(name: str, site_dir: Path) -> dict | None:
+    """Detection as it was done before, for comparison."""
+    # Each build runs in a fresh process, don't reuse the directory listing
+    FastPath.__new__.cache_clear()
+    for dist in distributions(name=name, path=[str(site_dir)]):
+        content = dist.read_text("direct_url.json")
+        if content is not None:
+            return json.loads(content)
+    return None
+
+
+def best_of(repeat: int, func, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        assert func(*args) == DIRECT_URL
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--distributions", type=int, default=800)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    name = f"package-{args.distributions - 1}"
+    with tempfile.TemporaryDirectory(prefix="hwh-bench-") as tmp:
+        site_dir = Path(tmp)
+        create_site_packages(site_dir, args.distributions)
+
+        lookup = _installed_direct_url.__wrapped__
+        timings = {
+            "scan": best_of(args.repeat, scan_distributions, name, site_dir),
+            "lookup": best_of(args.repeat, lookup, name, "1.0", (str(site_dir),)),
+            "lookup, other version": best_of(
+                args.repeat, lookup, name, "2.0", (str(site_dir),)
+            ),
+        }
+
+    for method, seconds in timings.items():
+        print(f"{method:>22}: {seconds * 1000:8.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""Times the PEP 517 hooks of the backend on a synthetic project.
+
+Every hook runs in a fresh interpreter, like pip and build run it, on a
+project created by create_synthetic_project:
+
+- cold: clean source tree and an empty build cache
+- warm: clean source tree, build cache filled by the cold build
+- noop: the tree of the warm build again, nothing changed
+
+Results are compared against a stored baseline, run with --update-baseline
+after intentional changes:
+
+    python -m tests.benchmarks.bench_hooks --modules 200 --depth 4
+"""
+
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from ..utils.package_utils import create_synthetic_project
+
+BACKEND_DIR = Path(__file__).parent.parent.parent.absolute()
+BASELINE = Path(__file__).parent / "baseline.json"
+
+HOOKS = ["get_extensions", "build_wheel", "build_editable", "build_sdist"]
+STATES = ["cold", "warm", "noop"]
+
+# Run in the project directory, prints the wall time of the hook
+HOOK_SCRIPT = """
+import json, sys, tempfile, time
+start = time.perf_counter()
+from hwh_backend import build
+hook, config_settings = sys.argv[1], json.loads(sys.argv[2])
+if hook == "get_extensions":
+    build._get_extensions(build.PyProject(build.Path()), config_settings)
+else:
+    getattr(build, hook)(tempfile.mkdtemp(), config_settings)
+print(json.dumps(round(time.perf_counter() - start, 3)))
+"""
+
+
+def run_hook(project_dir: Path, hook: str, config_settings: dict) -> float:
+    result = subprocess.run(
+        [sys.executable, "-c", HOOK_SCRIPT, hook, json.dumps(config_settings)],
+        cwd=project_dir,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise RuntimeError(f"{hook} failed in {project_dir}")
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def bench_hook(template: Path, work_dir: Path, hook: str, nthreads: int) -> dict:
+    """Time a hook cold, warm and as a no-op on copies of the template."""
+    cache_dir = work_dir / f"cache-{hook}"
+    config_settings = {"nthreads": str(nthreads), "cache_dir": str(cache_dir)}
+
+    cold = work_dir / f"{hook}-cold"
+    shutil.copytree(template, cold)
+    warm = work_dir / f"{hook}-warm"
+    shutil.copytree(template, warm)
+
+    return {
+        "cold": run_hook(cold, hook, config_settings),
+        "warm": run_hook(warm, hook, config_settings),
+        "noop": run_hook(warm, hook, config_settings),
+    }
+
+
+def shape_key(args: argparse.Namespace) -> str:
+    return (
+        f"modules={args.modules},depth={args.depth},fan_out={args.fan_out},"
+        f"subpackages={args.subpackages},nesting={args.nesting},"
+        f"language={args.language}"
+    )
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Describe the timings that got slower than the baseline by more than
+    tolerance."""
+    regressions = []
+    for hook, states in results.items():
+        for state, seconds in states.items():
+            known = baseline.get(hook, {}).get(state)
+            if known is not None and seconds > known * (1 + tolerance):
+                regressions.append(
+                    f"{hook} ({state}): {seconds:.2f}s, baseline {known:.2f}s"
+                )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", type=int, default=100)
+    parser.add_argument("--depth", type=int, default=3, help="cimport layers")
+    parser.add_argument("--fan-out", type=int, default=2, help="cimports per module")
+    parser.add_argument("--subpackages", type=int, default=2)
+    parser.add_argument("--nesting", type=int, default=2)
+    parser.add_argument("--language", choices=["c", "c++"], default="c")
+    parser.add_argument("--nthreads", type=int, default=4)
+    parser.add_argument("--hooks", nargs="+", choices=HOOKS, default=HOOKS)
+    parser.add_argument("--repeat", type=int, default=1, help="keep the best of N")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    results: dict[str, dict[str, float]] = {}
+    with tempfile.TemporaryDirectory(prefix="hwh-bench-") as tmp:
+        template = create_synthetic_project(
+            Path(tmp),
+            BACKEND_DIR,
+            n_modules=args.modules,
+            depth=args.depth,
+            fan_out=args.fan_out,
+            subpackages=args.subpackages,
+            nesting=args.nesting,
+            language=args.language,
+        )
+        for hook in args.hooks:
+            for attempt in range(args.repeat):
+                work_dir = Path(tmp) / f"run{attempt}"
+                timings = bench_hook(template, work_dir, hook, args.nthreads)
+                best = results.setdefault(hook, timings)
+                for state in STATES:
+                    best[state] = min(best[state], timings[state])
+            print(
+                f"{hook:>15}: "
+                + "  ".join(f"{s} {results[hook][s]:7.2f}s" for s in STATES)
+            )
+
+    key = shape_key(args)
+    stored = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.update_baseline:
+        stored[key] = {**stored.get(key, {}), **results}
+        args.baseline.write_text(json.dumps(stored, indent=1, sort_keys=True) + "\n")
+        print(f"Baseline for {key} updated in {args.baseline}")
+        return 0
+
+    if key not in stored:
+        print(f"No baseline for {key}, store one with --update-baseline")
+        return 0
+    regressions = compare(results, stored[key], args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
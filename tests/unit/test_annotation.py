@@ -0,0 +1,95 @@
+import subprocess
+import sys
+
+import pytest
+
+from hwh_backend.annotation import annotation_report, line_scopes, violations
+from hwh_backend.hwh_config import AnnotationConfig
+
+SOURCE = '''\
+import math
+
+def untyped(n):
+    """Sums up to n.
+
+with a docstring at column 0
+    """
+    total = 0
+    for i in range(n):
+        total += i
+    return total
+
+cdef int typed(int n,
+        int start):
+    cdef int i, total = 0
+    for i in range(start, n):
+        total += i
+    return total
+
+cdef class Shape:
+    cpdef double area(self):
+        return math.pi
+'''
+
+
+def test_line_scopes():
+    scopes = line_scopes(SOURCE)
+    assert scopes[0] == "<module>"
+    assert set(scopes[2:11]) == {"untyped"}
+    assert set(scopes[12:18]) == {"typed"}
+    assert scopes[19] == "Shape"
+    assert scopes[20:22] == ["Shape.area", "Shape.area"]
+
+
+def test_annotation_report(tmp_path):
+    pyx_file = tmp_path / "mod.pyx"
+    pyx_file.write_text(SOURCE)
+    # Out of process, Cython caches resolved files globally
+    subprocess.run(
+        [sys.executable, "-m", "cython", "-3", "-a", str(pyx_file)], check=True
+    )
+
+    report = annotation_report([("pkg.mod", str(pyx_file))])
+    [module] = report["modules"]
+    functions = {f["name"]: f for f in module["functions"]}
+    assert functions["typed"]["score"] == 0
+    assert functions["untyped"]["python_lines"] >= 4
+    assert (
+        module["score"]
+        == report["score"]
+        == sum(f["score"] for f in module["functions"])
+    )
+    assert module["hotspots"][0]["score"] == max(
+        spot["score"] for spot in module["hotspots"]
+    )
+
+    assert violations(report, {"*": 1000}) == []
+    found = violations(report, {"*": 1000, "pkg.mod.untyped": 0})
+    assert len(found) == 1 and found[0].startswith("pkg.mod.untyped (")
+
+
+def test_max_python_interaction_config():
+    assert AnnotationConfig(max_python_interaction=10).max_python_interaction == {
+        "*": 10
+    }
+    with pytest.raises(ValueError, match="non-negative integer"):
+        AnnotationConfig(max_python_interaction={"pkg.*": -1})
+
+
+def test_module_level_thresholds():
+    report = {
+        "modules": [
+            {
+                "module": "pkg.mod",
+                "source": "mod.pyx",
+                "functions": [
+                    {"name": "<module>", "line": 1, "score": 5, "python_lines": 1}
+                ],
+            }
+        ]
+    }
+    assert violations(report, {"*": 0}) == []
+    assert violations(report, {"pkg.*": 0}) == []
+    [found] = violations(report, {"*": 0, "pkg.*.<module>": 0})
+    assert found.startswith("pkg.mod.<module> (mod.pyx:1)")
+    assert violations(report, {"*.<module>": 0, "pkg.mod.<module>": 5}) == []
@@ -1,9 +1,17 @@
+import json
+import subprocess
+
 import pytest
+from setuptools.extension import Extension
 
 from hwh_backend.build import (
+    _apply_overrides,
+    _installed_direct_url,
     _parse_build_settings,
     find_cython_files,
 )
+from hwh_backend.dependencies import extension_directives
+from hwh_backend.hwh_config import CythonConfig
 
 
 @pytest.mark.parametrize(
@@ -52,11 +60,17 @@ def test_find_cython_files_combinations(
 
 
 def test_parse_build_settings():
-    settings = {"annotate": "true", "nthreads": "4", "force": "false"}
+    settings = {
+        "annotate": "true",
+        "nthreads": "4",
+        "force": "false",
+        "profile": "release",
+    }
     parsed = _parse_build_settings(settings)
     assert parsed["annotate"] is True
     assert parsed["nthreads"] == 4
     assert parsed["force"] is False
+    assert parsed["profile"] == "release"
 
 
 def test_parse_invalid_build_settings():
@@ -67,3 +81,110 @@ def test_parse_invalid_build_settings():
 
 def test_parse_empty_build_settings():
     assert _parse_build_settings(None) == {}
+
+
+LOCAL_URL = {"url": "file:///src", "dir_info": {"editable": True}}
+
+
+@pytest.mark.parametrize(
+    "dist_info",
+    ["my_pkg-1.0.dist-info", "My_Pkg-1.0.dist-info", "my.pkg-0.9.dist-info"],
+)
+def test_installed_direct_url(tmp_path, dist_info):
+    (tmp_path / "other_pkg-1.0.dist-info").mkdir()
+    (tmp_path / dist_info).mkdir()
+    (tmp_path / dist_info / "direct_url.json").write_text(json.dumps(LOCAL_URL))
+
+    assert _installed_direct_url("My-Pkg", "1.0", (str(tmp_path),)) == LOCAL_URL
+    assert _installed_direct_url("other-pkg", "1.0", (str(tmp_path),)) is None
+
+
+def test_installed_direct_url_skips_non_local_installs(tmp_path):
+    site_dirs = [tmp_path / "user", tmp_path / "site"]
+    for site_dir, direct_url in zip(
+        site_dirs,
+        [{"url": "https://example.com/my_pkg.whl", "archive_info": {}}, LOCAL_URL],
+        strict=True,
+    ):
+        (site_dir / "my_pkg-1.0.dist-info").mkdir(parents=True)
+        (site_dir / "my_pkg-1.0.dist-info" / "direct_url.json").write_text(
+            json.dumps(direct_url)
+        )
+
+    site_packages = tuple(str(site_dir) for site_dir in site_dirs)
+    assert _installed_direct_url("my-pkg", "1.0", site_packages) == LOCAL_URL
+
+
+@pytest.mark.parametrize("use_git", [False, True])
+def test_find_cython_files_prunes_excluded_dirs(tmp_path, use_git):
+    for rel_path in [
+        "a.pyx",
+        "core/b.pyx",
+        "core/tests/test_b.pyx",
+        "vendor/deep/c.pyx",
+        "build/lib/a.pyx",
+        ".git/d.pyx",
+        "venv/lib/e.pyx",
+        "venv/pyvenv.cfg",
+    ]:
+        (tmp_path / rel_path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel_path).touch()
+    if use_git:
+        subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+        (tmp_path / ".gitignore").write_text("venv/\n")
+
+    result = find_cython_files(
+        tmp_path,
+        exclude_dirs=["build", "vendor/*", "**/tests"],
+        use_git=use_git,
+    )
+
+    assert result == [tmp_path / "a.pyx", tmp_path / "core/b.pyx"]
+
+
+def test_find_cython_files_glob_sources(tmp_path):
+    for rel_path in ["a.pyx", "core/b.pyx", "core/b.pxd", "other/c.pyx"]:
+        (tmp_path / rel_path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel_path).touch()
+
+    result = find_cython_files(tmp_path, sources=["core/*", "a.pyx"])
+
+    assert result == [tmp_path / "core/b.pyx", tmp_path / "a.pyx"]
+
+
+def test_apply_overrides():
+    config = CythonConfig.from_pyproject(
+        {
+            "cython": {
+                "modules": {
+                    "extra_compile_args": ["-O2"],
+                    "overrides": {
+                        "pkg.*": {
+                            "extra_compile_args": ["-O3"],
+                            "compiler_directives": {"boundscheck": False},
+                        },
+                        "pkg.kernels.*": {
+                            "language": "c++",
+                            "compiler_directives": {"boundscheck": True},
+                        },
+                    },
+                }
+            }
+        }
+    )
+    ext = Extension(
+        "pkg.kernels.fast",
+        ["fast.pyx"],
+        extra_compile_args=list(config.extra_compile_args),
+    )
+
+    _apply_overrides(ext, config.overrides_for(ext.name))
+
+    assert ext.language == "c++"
+    assert ext.extra_compile_args == ["-O2", "-O3"]
+    assert ext.cython_directives == {"boundscheck": True}
+    assert extension_directives(ext, {"boundscheck": None, "wraparound": False}) == {
+        "boundscheck": True,
+        "wraparound": False,
+    }
+    assert config.overrides_for("other.mod") == []
@@ -0,0 +1,115 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from distutils.ccompiler import new_compiler
+from distutils.sysconfig import customize_compiler
+
+from setuptools.extension import Extension
+
+from hwh_backend.build import _cythonize_one
+from hwh_backend.cache import BuildCache
+from hwh_backend.dependencies import cythonize_key, dependency_tree
+from hwh_backend.object_cache import ObjectCache
+
+
+def test_cache_roundtrip(tmp_path):
+    cache = BuildCache(tmp_path / "cache", max_size=1 << 20)
+    src = tmp_path / "mod.c"
+    src.write_text("int x;")
+
+    assert cache.get("abcdef", tmp_path / "out") is None
+    cache.put("abcdef", [src])
+    restored = cache.get("abcdef", tmp_path / "out")
+
+    assert restored == [tmp_path / "out" / "mod.c"]
+    assert restored[0].read_text() == "int x;"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Files that are already there are left alone, others are replaced
+    os.utime(restored[0], ns=(0, 0))
+    cache.get("abcdef", tmp_path / "out")
+    assert restored[0].stat().st_mtime_ns == 0
+    restored[0].write_text("int y;")
+    cache.get("abcdef", tmp_path / "out")
+    assert restored[0].read_text() == "int x;"
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = BuildCache(tmp_path / "cache", max_size=250)
+    for i, key in enumerate(["aa1", "bb2", "cc3"]):
+        f = tmp_path / f"{key}.c"
+        f.write_bytes(b"x" * 100)
+        cache.put(key, [f])
+        # Make the store order visible to the mtime based LRU
+        entry = tmp_path / "cache" / key[:2] / key
+        os.utime(entry, (i, i))
+
+    assert cache.get("aa1", tmp_path / "out") is None
+    assert cache.get("cc3", tmp_path / "out") is not None
+
+
+def test_cythonize_key_tracks_cimported_pxd(tmp_path):
+    pkg = tmp_path / "pkg"
+    pkg.mkdir()
+    (pkg / "__init__.py").touch()
+    (pkg / "base.pxd").write_text("cdef int twice(int x)\n")
+    pyx = pkg / "user.pyx"
+    pyx.write_text("from pkg.base cimport twice\n")
+
+    def key():
+        tree = dependency_tree([str(tmp_path)])
+        return cythonize_key(tree, "pkg.user", pyx, "c", {"boundscheck": True}, False)
+
+    before = key()
+    assert key() == before
+
+    (pkg / "base.pxd").write_text("cdef int twice(int x, int y)\n")
+    assert key() != before
+
+
+def test_cython_cache_hit_applies_distutils_directives(tmp_path):
+    pyx_file = tmp_path / "mod.pyx"
+    pyx_file.write_text(
+        "# distutils: language = c++\n"
+        "# distutils: libraries = m\n"
+        "def answer():\n    return 42\n"
+    )
+    cythonize_kwargs = {
+        "nthreads": 0,
+        "force": False,
+        "annotate": False,
+        "compiler_directives": {"language_level": 3},
+        "include_path": [],
+    }
+    # Out of process, Cython caches resolved files globally
+    with ProcessPoolExecutor(1) as processes:
+        results = [
+            processes.submit(
+                _cythonize_one,
+                Extension("mod", [str(pyx_file)]),
+                tmp_path / "cache",
+                1 << 20,
+                cythonize_kwargs,
+            ).result()
+            for _ in range(2)
+        ]
+
+    (miss, miss_hit), (hit, hit_hit) = results
+    assert (miss_hit, hit_hit) == (False, True)
+    assert hit == miss
+    assert hit["sources"] == [str(tmp_path / "mod.cpp")]
+    assert (hit["language"], hit["libraries"]) == ("c++", ["m"])
+
+
+def test_object_cache_reuses_objects(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "mod.c").write_text("int answer(void) { return 42; }\n")
+    cache = BuildCache(tmp_path / "cache", max_size=1 << 20)
+
+    for build_dir in ["build1", "build2"]:
+        compiler = new_compiler()
+        customize_compiler(compiler)
+        ObjectCache(compiler, cache).install()
+        objects = compiler.compile(["mod.c"], output_dir=build_dir)
+        assert (tmp_path / objects[0]).exists()
+
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -4,7 +4,9 @@ import tomli_w
 from hwh_backend.hwh_config import (
     CythonCompilerDirectives,
     CythonConfig,
+    HwhConfig,
     Language,
+    ModuleOverride,
     SitePackages,
 )
 
@@ -141,3 +143,48 @@ def test_library_config_from_pyproject(tmp_path):
     assert config.library_dirs == ["/usr/local/lib"]
     assert config.runtime_library_dirs == ["/usr/local/lib"]
     assert config.extra_link_args == ["-Wl,--no-as-needed"]
+
+
+def test_module_override_validation():
+    with pytest.raises(ValueError, match="Unknown options"):
+        ModuleOverride.from_pyproject("pkg.*", {"extra_compile_arg": ["-O3"]})
+    with pytest.raises(ValueError):
+        ModuleOverride.from_pyproject("pkg.*", {"language": "fortran"})
+    with pytest.raises(TypeError):
+        ModuleOverride.from_pyproject(
+            "pkg.*", {"compiler_directives": {"boundscheck": "no"}}
+        )
+
+
+def test_profiles():
+    pyproject = {
+        "tool": {
+            "hwh": {
+                "cython": {
+                    "annotate": True,
+                    "modules": {"extra_compile_args": ["-O2"], "libraries": ["m"]},
+                    "compiler_directives": {"boundscheck": True},
+                },
+                "profiles": {
+                    "release": {
+                        "modules": {"extra_compile_args": ["-O3"]},
+                        "compiler_directives": {"wraparound": False},
+                    }
+                },
+            }
+        }
+    }
+
+    base = HwhConfig(pyproject)
+    assert base.cython.extra_compile_args == ["-O2"]
+
+    release = HwhConfig(pyproject, "release")
+    assert release.profile == "release"
+    assert release.cython.annotate is True
+    assert release.cython.extra_compile_args == ["-O3"]
+    assert release.cython.libraries == ["m"]
+    assert release.cython.compiler_directives.boundscheck is True
+    assert release.cython.compiler_directives.wraparound is False
+
+    with pytest.raises(ValueError, match="Unknown profile"):
+        HwhConfig(pyproject, "debug")
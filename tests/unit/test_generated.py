@@ -0,0 +1,141 @@
+import io
+import os
+import tarfile
+from concurrent.futures import ProcessPoolExecutor
+
+from setuptools.extension import Extension
+
+from hwh_backend.build import (
+    _add_files_to_sdist,
+    _add_generated_sources,
+    _cythonize_extensions,
+    _get_extensions,
+    _use_generated_sources,
+)
+from hwh_backend.dependencies import extension_fields
+from hwh_backend.generated import MANIFEST_NAME, GeneratedSources
+from hwh_backend.parser import load_project
+
+DIRECTIVES = {"boundscheck": False}
+
+
+def _project(tmp_path):
+    pkg = tmp_path / "pkg"
+    pkg.mkdir()
+    (pkg / "base.pxd").write_text("cdef int twice(int x)\n")
+    (pkg / "mod.pyx").write_text("from pkg.base cimport twice\n")
+    (pkg / "mod.c").write_text("/* generated */\n")
+    generated = GeneratedSources(tmp_path)
+    generated.add(
+        "pkg.mod",
+        str(pkg / "mod.pyx"),
+        str(pkg / "mod.c"),
+        "c",
+        DIRECTIVES,
+        [str(pkg / "base.pxd"), str(pkg / "mod.pyx"), "/elsewhere/libc/math.pxd"],
+    )
+    (tmp_path / MANIFEST_NAME).write_bytes(generated.dumps())
+    return pkg
+
+
+def test_generated_source_matches_inputs(tmp_path):
+    pkg = _project(tmp_path)
+    ext = Extension("pkg.mod", [str(pkg / "mod.pyx")], language="c")
+    generated = GeneratedSources.load(tmp_path)
+
+    assert set(generated.modules["pkg.mod"]["inputs"]) == {
+        "pkg/base.pxd",
+        "pkg/mod.pyx",
+    }
+    assert generated.source_for(ext, DIRECTIVES) == str(pkg / "mod.c")
+    assert generated.source_for(ext, {"boundscheck": True}) is None
+    assert generated.source_for(Extension("pkg.other", ["x.pyx"]), DIRECTIVES) is None
+
+    (pkg / "base.pxd").write_text("cdef long twice(long x)\n")
+    assert generated.source_for(ext, DIRECTIVES) is None
+
+
+def test_generated_extensions_skip_cython(tmp_path):
+    ext = Extension("pkg.mod", [str(tmp_path / "mod.c")])
+    assert _cythonize_extensions(None, [ext], {}) == [ext]
+
+
+def test_add_files_to_sdist(tmp_path):
+    sdist = tmp_path / "pkg-1.0.tar.gz"
+    with tarfile.open(sdist, "w:gz") as tar:
+        for name, data in [("pkg-1.0/PKG-INFO", b"info"), ("pkg-1.0/a.c", b"old")]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    (tmp_path / "a.c").write_text("new")
+
+    _add_files_to_sdist(sdist, {"a.c": tmp_path / "a.c", MANIFEST_NAME: b"{}"})
+
+    with tarfile.open(sdist) as tar:
+        assert tar.getnames() == [
+            "pkg-1.0/PKG-INFO",
+            "pkg-1.0/a.c",
+            f"pkg-1.0/{MANIFEST_NAME}",
+        ]
+        assert tar.extractfile("pkg-1.0/a.c").read() == b"new"
+
+
+PYPROJECT = """
+[project]
+name = "pkg"
+version = "1.0"
+
+[tool.hwh.cython]
+site_packages = "none"
+
+[tool.hwh.cache]
+enabled = false
+"""
+
+
+def _make_sdist(project_dir):
+    """Cythonize the project into an sdist of it, see _add_generated_sources."""
+    os.chdir(project_dir)
+    sdist = project_dir / "pkg-1.0.tar.gz"
+    with tarfile.open(sdist, "w:gz") as tar:
+        for path in ["pyproject.toml", "pkg/__init__.py", "pkg/mod.pyx"]:
+            tar.add(path, f"pkg-1.0/{path}")
+    _add_generated_sources(sdist, load_project(), None)
+    return sdist
+
+
+def _sdist_extensions(project_dir):
+    """Fields of the extensions of a build from the unpacked sdist."""
+    os.chdir(project_dir)
+    project = load_project()
+    ext_modules, cythonize_kwargs = _get_extensions(project)
+    _use_generated_sources(project, ext_modules, cythonize_kwargs)
+    return {ext.name: extension_fields(ext) for ext in ext_modules}
+
+
+def test_builds_from_sdist_apply_distutils_comments(tmp_path):
+    project_dir = tmp_path / "project"
+    (project_dir / "pkg").mkdir(parents=True)
+    (project_dir / "pyproject.toml").write_text(PYPROJECT)
+    (project_dir / "pkg" / "__init__.py").touch()
+    (project_dir / "pkg" / "mod.pyx").write_text(
+        "# distutils: language = c++\n"
+        "# distutils: define_macros = HWH_FOO=1\n"
+        "def answer():\n    return 42\n"
+    )
+    cwd = os.getcwd()
+    # Out of process, Cython caches resolved files globally
+    try:
+        with ProcessPoolExecutor(1) as processes:
+            sdist = processes.submit(_make_sdist, project_dir).result()
+        with tarfile.open(sdist) as tar:
+            tar.extractall(tmp_path, filter="data")
+        with ProcessPoolExecutor(1) as processes:
+            fields = processes.submit(_sdist_extensions, tmp_path / "pkg-1.0").result()
+    finally:
+        os.chdir(cwd)
+
+    mod = fields["pkg.mod"]
+    assert [os.path.basename(source) for source in mod["sources"]] == ["mod.cpp"]
+    assert mod["language"] == "c++"
+    assert mod["define_macros"] == [("HWH_FOO", "1")]
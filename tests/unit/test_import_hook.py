@@ -0,0 +1,61 @@
+import json
+import zipfile
+
+from hwh_backend.build import _add_files_to_wheel
+from hwh_backend.import_hook import RebuildFinder
+
+
+def write_state(project_dir, pyx, output):
+    stat = pyx.stat()
+    state = {
+        "version": 1,
+        "modules": {"pkg.mod": {"inputs": ["pkg/mod.pyx"], "output": str(output)}},
+        "files": {
+            "pkg/mod.pyx": {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "inode": stat.st_ino,
+                "sha256": "",
+            }
+        },
+    }
+    state_file = project_dir / "build" / "hwh" / "incremental.json"
+    state_file.parent.mkdir(parents=True)
+    state_file.write_text(json.dumps(state))
+
+
+def test_rebuild_finder_detects_stale_extensions(tmp_path, monkeypatch):
+    (tmp_path / "pkg").mkdir()
+    pyx = tmp_path / "pkg" / "mod.pyx"
+    pyx.write_text("x = 1\n")
+    output = tmp_path / "pkg" / "mod.so"
+    output.touch()
+    write_state(tmp_path, pyx, output)
+
+    rebuilt = []
+    finder = RebuildFinder(tmp_path)
+    monkeypatch.setattr(finder, "_rebuild", rebuilt.append)
+
+    assert finder.find_spec("pkg.mod", None) is None
+    assert finder.find_spec("pkg.other", None) is None
+    assert rebuilt == []
+
+    pyx.write_text("x = 22\n")
+    finder.find_spec("pkg.mod", None)
+    assert rebuilt == ["pkg.mod"]
+
+
+def test_add_files_to_wheel_updates_record(tmp_path):
+    wheel = tmp_path / "pkg-0.1-py3-none-any.whl"
+    with zipfile.ZipFile(wheel, "w") as zf:
+        zf.writestr("pkg/__init__.py", "")
+        zf.writestr("pkg-0.1.dist-info/RECORD", "pkg/__init__.py,,0\n")
+
+    _add_files_to_wheel(wheel, {"hook.pth": b"import hook\n"})
+
+    with zipfile.ZipFile(wheel) as zf:
+        assert zf.read("hook.pth") == b"import hook\n"
+        record = zf.read("pkg-0.1.dist-info/RECORD").decode().splitlines()
+    assert record[0] == "pkg/__init__.py,,0"
+    assert record[1].startswith("hook.pth,sha256=")
+    assert record[1].endswith(",12")
@@ -0,0 +1,65 @@
+import os
+
+from setuptools.extension import Extension
+
+from hwh_backend.incremental import FileStateIndex, IncrementalState
+
+
+def test_file_state_index_ignores_touch(tmp_path):
+    f = tmp_path / "mod.pxd"
+    f.write_text("cdef int x")
+    index = FileStateIndex()
+    assert index.changed(str(f))
+
+    index.record(str(f))
+    assert not index.changed(str(f))
+
+    os.utime(f, (0, 0))
+    assert not index.changed(str(f))
+
+    f.write_text("cdef long x")
+    assert index.changed(str(f))
+
+
+def test_incremental_state_rebuilds_dependents(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pkg = tmp_path / "pkg"
+    pkg.mkdir()
+    (pkg / "__init__.py").touch()
+    (pkg / "base.pxd").write_text("cdef int twice(int x)\n")
+    (pkg / "user.pyx").write_text("from pkg.base cimport twice\n")
+    (pkg / "other.pyx").write_text("x = 1\n")
+    kwargs = {
+        "compiler_directives": {},
+        "annotate": False,
+        "force": False,
+        "include_path": ["."],
+    }
+
+    def extensions():
+        return [
+            Extension("pkg.user", ["pkg/user.pyx"]),
+            Extension("pkg.other", ["pkg/other.pyx"]),
+        ]
+
+    state = IncrementalState.load(tmp_path / "build")
+    assert len(state.outdated(extensions(), kwargs)) == 2
+
+    for name in ["user", "other"]:
+        (pkg / f"{name}.so").touch()
+    built = [(ext, f"pkg/{ext.name.split('.')[-1]}.so") for ext in extensions()]
+    state.record(
+        built, {"pkg.user": "pkg/user.pyx", "pkg.other": "pkg/other.pyx"}, kwargs
+    )
+    state.save()
+
+    state = IncrementalState.load(tmp_path / "build")
+    assert state.outdated(extensions(), kwargs) == []
+
+    (pkg / "base.pxd").write_text("cdef int twice(int x, int y)\n")
+    outdated = state.outdated(extensions(), kwargs)
+    assert [ext.name for ext in outdated] == ["pkg.user"]
+    assert state.reasons["pkg.user"].endswith("base.pxd changed")
+
+    (pkg / "other.so").unlink()
+    assert "pkg.other" in [ext.name for ext in state.outdated(extensions(), kwargs)]
@@ -0,0 +1,44 @@
+import pytest
+from setuptools.extension import Extension
+
+from hwh_backend.build import _apply_lto
+from hwh_backend.hwh_config import CythonConfig, Lto
+from hwh_backend.lto import check_lto, compiler_command, compiler_family, lto_flags
+
+
+@pytest.mark.parametrize(
+    "mode,family,expected",
+    [
+        (Lto.OFF, "gcc", ([], [])),
+        (Lto.THIN, "gcc", (["-flto"], ["-flto=4"])),
+        (Lto.FULL, "gcc", (["-flto"], ["-flto=4", "-flto-partition=one"])),
+        (Lto.THIN, "clang", (["-flto=thin"], ["-flto=thin", "-flto-jobs=4"])),
+        (Lto.FULL, "clang", (["-flto=full"], ["-flto=full"])),
+    ],
+)
+def test_lto_flags(mode, family, expected):
+    assert lto_flags(mode, family, 4) == expected
+
+
+def test_lto_config():
+    assert CythonConfig.from_pyproject({"cython": {"lto": "Thin"}}).lto == Lto.THIN
+    with pytest.raises(ValueError, match="Invalid lto"):
+        CythonConfig(lto="fat")
+
+
+def test_check_lto():
+    compiler = tuple(compiler_command())
+    check_lto(compiler, ("-flto",))
+    with pytest.raises(RuntimeError, match="can't link with it"):
+        check_lto(compiler, ("-flto", "-fuse-ld=no-such-linker"))
+
+
+@pytest.mark.parametrize("nthreads", [0, 1, 8])
+def test_apply_lto_splits_threads(nthreads):
+    ext_modules = [Extension(f"pkg.mod{i}", [f"pkg/mod{i}.c"]) for i in range(2)]
+    _apply_lto(ext_modules, Lto.THIN, nthreads)
+
+    family = compiler_family(compiler_command()[0])
+    jobs = max(1, nthreads // 2)
+    for ext in ext_modules:
+        assert ext.extra_link_args == lto_flags(Lto.THIN, family, jobs)[1]
@@ -0,0 +1,70 @@
+import subprocess
+import sys
+
+import pytest
+
+from hwh_backend import build
+
+PYPROJECT = """
+[build-system]
+requires = ["hwh-backend"]
+build-backend = "hwh_backend.build"
+
+[project]
+name = "My.Project"
+version = "1.0.0-rc1"
+license = "MIT"
+license-files = ["LICENSE"]
+dependencies = ["packaging>=20"]
+
+[project.scripts]
+mycmd = "mypkg.cli:main"
+
+[tool.hwh.cython]
+use_numpy_include = false
+
+[tool.hwh.profiles.numpy]
+use_numpy_include = true
+"""
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    (tmp_path / "pyproject.toml").write_text(PYPROJECT)
+    (tmp_path / "LICENSE").write_text("MIT\n")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_prepare_metadata_for_build_wheel(project, tmp_path):
+    name = build.prepare_metadata_for_build_wheel(str(tmp_path / "metadata"))
+
+    dist_info = tmp_path / "metadata" / name
+    assert name == "my_project-1.0.0rc1.dist-info"
+    metadata = (dist_info / "METADATA").read_text()
+    assert "Name: My.Project\n" in metadata
+    assert "Requires-Dist: packaging>=20\n" in metadata
+    assert (dist_info / "entry_points.txt").read_text() == (
+        "[console_scripts]\nmycmd = mypkg.cli:main\n"
+    )
+    assert (dist_info / "licenses" / "LICENSE").read_text() == "MIT\n"
+
+
+def test_get_requires(project):
+    assert build.get_requires_for_build_wheel() == []
+    assert build.get_requires_for_build_editable({"profile": "numpy"}) == ["numpy"]
+    assert build.get_requires_for_build_sdist() == []
+
+
+def test_metadata_hooks_dont_import_cython(project):
+    script = (
+        "import sys\n"
+        "from hwh_backend import build\n"
+        "build.prepare_metadata_for_build_wheel('metadata')\n"
+        "build.get_requires_for_build_wheel()\n"
+        "print(sorted(m for m in sys.modules if 'Cython' in m or 'build_ext' in m))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
@@ -170,3 +170,37 @@ include = ["mypackage*"]
     # Should resolve to src/mypackage
     assert package_path.relative_to(project_dir) == Path("src/mypackage")
     assert (package_path / "core.pyx").exists()
+
+
+def test_discovery_manifest(tmp_path, monkeypatch):
+    """Discovery is reused until a searched directory gets new entries."""
+    from hwh_backend import build
+
+    monkeypatch.chdir(tmp_path)
+    create_package_structure(tmp_path, {"mypackage": {"core": ["base.pyx"]}})
+    (tmp_path / "mypackage" / "a.pyx").touch()
+    (tmp_path / "pyproject.toml").write_text(
+        '[project]\nname = "mypackage"\nversion = "0.1.0"\n'
+    )
+
+    def discover():
+        ext_modules, _ = build._get_extensions(PyProject(Path()))
+        return sorted(ext.name for ext in ext_modules)
+
+    assert discover() == ["mypackage.a", "mypackage.core.base"]
+    manifest = tmp_path / "build" / "hwh" / "discovery.json"
+    assert manifest.exists()
+
+    # Not walked again, as long as the directories are unchanged
+    monkeypatch.setattr(build, "walk_files", None)
+    assert discover() == ["mypackage.a", "mypackage.core.base"]
+    # Files that don't affect discovery only cause a rescan of their directory
+    (tmp_path / "mypackage" / "core" / "base.c").touch()
+    assert discover() == ["mypackage.a", "mypackage.core.base"]
+    monkeypatch.undo()
+    monkeypatch.chdir(tmp_path)
+
+    (tmp_path / "mypackage" / "extra").mkdir()
+    (tmp_path / "mypackage" / "extra" / "__init__.py").touch()
+    (tmp_path / "mypackage" / "extra" / "more.pyx").touch()
+    assert discover() == ["mypackage.a", "mypackage.core.base", "mypackage.extra.more"]
@@ -3,7 +3,7 @@ from pathlib import Path
 
 import pytest
 
-from hwh_backend.parser import PyProject
+from hwh_backend.parser import PyProject, load_project
 
 from ..utils.package_utils import create_package_structure, create_test_package
 from ..utils.venv_utils import create_virtual_env, run_in_venv, setup_test_env
@@ -311,3 +311,21 @@ print("Modified test passed!")
         print("Output:", e.output)
         print("Error:", e.stderr)
         raise
+
+
+def test_load_project_is_shared_until_pyproject_changes(tmp_path, sample_pyproject):
+    """All hooks of a build share one parsed project."""
+    pyproject = tmp_path / "pyproject.toml"
+    pyproject.write_text(sample_pyproject)
+    (tmp_path / "test_pkg").mkdir()
+    (tmp_path / "test_pkg" / "__init__.py").touch()
+
+    project = load_project(tmp_path)
+    assert load_project(tmp_path) is project
+    assert project.packages == ["test_pkg"]
+
+    pyproject.write_text(sample_pyproject.replace('"0.1.0"', '"0.2.0"'))
+    changed = load_project(tmp_path)
+    assert changed is not project
+    assert str(changed.package_version) == "0.2.0"
+    assert load_project(tmp_path, reload=True) is not changed
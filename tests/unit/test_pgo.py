@@ -0,0 +1,70 @@
+import subprocess
+import sys
+
+import pytest
+
+from hwh_backend.cache import BuildCache
+from hwh_backend.hwh_config import PgoConfig
+from hwh_backend.pgo import ProfileGuidedBuild
+
+
+@pytest.fixture
+def pgo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config = PgoConfig(enabled=True, command="python train.py")
+    return ProfileGuidedBuild(
+        config, tmp_path / "build", BuildCache(tmp_path / "cache", 1 << 20)
+    )
+
+
+def test_pgo_config_command():
+    assert PgoConfig(command="python -m bench --quick").command == [
+        "python",
+        "-m",
+        "bench",
+        "--quick",
+    ]
+    with pytest.raises(ValueError, match="training command"):
+        ProfileGuidedBuild(PgoConfig(enabled=True), None, None)
+
+
+def test_train_and_restore_profiles(pgo, tmp_path):
+    output = tmp_path / "mod.so"
+    output.write_text("previous build")
+    pgo.stash([str(output)])
+    assert any("-fprofile-generate" in arg for arg in pgo.compile_args)
+
+    # Stand-in for the instrumented extension, writes its profile when run
+    output.write_text("instrumented")
+    (tmp_path / "train.py").write_text(
+        "import pathlib, sys\n"
+        f"raw = pathlib.Path({str(pgo.raw_dir)!r})\n"
+        "raw.mkdir(parents=True)\n"
+        "(raw / 'mod.gcda').write_text(sys.path[1])\n"
+    )
+    pgo.train([str(tmp_path / "src")])
+    pgo.collect("key")
+
+    assert output.read_text() == "previous build"
+    assert pgo.profile_dir.parent == tmp_path / "build" / "pgo"
+    assert (pgo.profile_dir / "mod.gcda").read_text() == str(tmp_path / "src")
+    assert f"-fprofile-use={pgo.profile_dir}" in pgo.compile_args
+    assert pgo.link_args == []
+
+    restored = ProfileGuidedBuild(
+        PgoConfig(command=[sys.executable]), tmp_path / "build", pgo.cache
+    )
+    assert not restored.restore("other key")
+    assert restored.restore("key")
+    assert restored.profile_dir == pgo.profile_dir
+
+
+def test_failed_training_restores_extensions(pgo, tmp_path):
+    output = tmp_path / "mod.so"
+    output.write_text("previous build")
+    pgo.stash([str(output)])
+    (tmp_path / "train.py").write_text("raise SystemExit(1)\n")
+
+    with pytest.raises(subprocess.CalledProcessError):
+        pgo.train([])
+    assert output.read_text() == "previous build"
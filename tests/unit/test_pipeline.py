@@ -0,0 +1,77 @@
+import threading
+from functools import partial
+
+import pytest
+from setuptools.extension import Extension
+
+from hwh_backend.build import _cythonize_one
+from hwh_backend.pipeline import BuildPipeline
+
+
+def fake_cythonize(ext):
+    if ext.name == "pkg.broken":
+        raise RuntimeError("Cython compile error")
+    sources = [ext.sources[0].replace(".pyx", ".c")]
+    return {"sources": sources}, ext.name == "pkg.cached"
+
+
+def test_pipeline_compiles_generated_sources():
+    extensions = [
+        Extension(name, [f"{name.replace('.', '/')}.pyx"])
+        for name in ["pkg.a", "pkg.b", "pkg.cached"]
+    ]
+    compiled = {}
+    lock = threading.Lock()
+
+    def compile_job(ext):
+        with lock:
+            compiled[ext.name] = list(ext.sources)
+
+    pipeline = BuildPipeline(2, fake_cythonize)
+    pipeline.run(extensions, compile_job)
+
+    assert compiled == {
+        "pkg.a": ["pkg/a.c"],
+        "pkg.b": ["pkg/b.c"],
+        "pkg.cached": ["pkg/cached.c"],
+    }
+    assert pipeline.cache_hits == 1
+
+
+def test_pipeline_propagates_failures():
+    extensions = [Extension("pkg.broken", ["pkg/broken.pyx"])]
+    with pytest.raises(RuntimeError, match="Cython compile error"):
+        BuildPipeline(2, fake_cythonize).run(extensions, lambda ext: None)
+
+
+def test_pipeline_applies_distutils_directives(tmp_path):
+    pyx_file = tmp_path / "mod.pyx"
+    pyx_file.write_text(
+        "# distutils: language = c++\n"
+        "# distutils: libraries = m\n"
+        "def answer():\n    return 42\n"
+    )
+    ext = Extension("mod", [str(pyx_file)], extra_compile_args=["-O2"])
+    compiled = []
+    cythonize_kwargs = {
+        "nthreads": 0,
+        "force": True,
+        "annotate": False,
+        "compiler_directives": {"language_level": 3},
+        "include_path": [],
+    }
+    # Cython runs in the worker processes of the pipeline, which keeps its
+    # global caches out of this process
+    job = partial(
+        _cythonize_one,
+        cache_root=None,
+        cache_size=0,
+        cythonize_kwargs=cythonize_kwargs,
+    )
+    BuildPipeline(1, job).run([ext], compiled.append)
+
+    assert compiled == [ext]
+    assert ext.sources == [str(tmp_path / "mod.cpp")]
+    assert ext.language == "c++"
+    assert ext.libraries == ["m"]
+    assert ext.extra_compile_args == ["-O2"]
@@ -0,0 +1,102 @@
+import json
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from distutils.ccompiler import new_compiler
+from distutils.sysconfig import customize_compiler
+
+import pytest
+from Cython.Build import Dependencies
+from Cython.Build.Dependencies import cythonize_one
+
+from hwh_backend import build, report
+
+
+def busy_job(name):
+    with report.span("cythonize", name):
+        sum(range(10**5))
+
+
+def test_report_collects_spans_from_worker_processes(tmp_path):
+    report.start(tmp_path / "report.json")
+    try:
+        with report.span("discovery"):
+            pass
+        with ProcessPoolExecutor(2) as pool:
+            list(pool.map(busy_job, ["pkg.a", "pkg.b"]))
+    finally:
+        report.finish()
+
+    data = json.loads((tmp_path / "report.json").read_text())
+    assert data["phases"]["cythonize"]["count"] == 2
+    assert {s["name"] for s in data["spans"] if s["phase"] == "cythonize"} == {
+        "pkg.a",
+        "pkg.b",
+    }
+    assert data["phases"]["discovery"]["count"] == 1
+    assert data["total"]["wall"] > 0
+    assert data["total"]["parallelism"] > 0
+
+
+def test_instrumented_call_accounts_subprocess_cpu(tmp_path):
+    compiler = new_compiler()
+    customize_compiler(compiler)
+    report.start(tmp_path / "report.json")
+    try:
+        with report.instrument_compiler(compiler), report.instrument_cython():
+            assert Dependencies.cythonize_one is not cythonize_one
+            with report.span("compile", "pkg.a"):
+                compiler.call([sys.executable, "-c", "sum(range(10**6))"])
+            with pytest.raises(subprocess.CalledProcessError):
+                compiler.call([sys.executable, "-c", "raise SystemExit(1)"])
+        [span] = report._REPORT.spans()
+    finally:
+        report.finish()
+
+    assert span.phase == "compile"
+    assert span.cpu > 0
+    assert span.peak_rss > 0
+    # The compiler's own methods are back, and so is Cython's cythonize_one
+    assert not {"call", "compile", "link"} & set(vars(compiler))
+    assert Dependencies.cythonize_one is cythonize_one
+
+
+def test_span_is_noop_without_report():
+    with report.span("compile"):
+        pass
+    assert report._REPORT is None
+
+
+def test_trace_has_a_track_per_worker(tmp_path):
+    report.start(trace_path=tmp_path / "trace.json")
+    try:
+        with report.span("discovery"):
+            pass
+        with ProcessPoolExecutor(2) as pool:
+            list(pool.map(busy_job, ["pkg.a", "pkg.b"]))
+    finally:
+        report.finish()
+
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    jobs = [e for e in events if e["ph"] == "X" and e["cat"] == "cythonize"]
+    assert {e["args"]["module"] for e in jobs} == {"pkg.a", "pkg.b"}
+    tracks = {(e["pid"], e["tid"]) for e in events if e["name"] == "thread_name"}
+    assert {(e["pid"], e["tid"]) for e in events if e["ph"] == "X"} == tracks
+    assert not (tmp_path / "report.json").exists()
+
+
+@pytest.mark.parametrize("hook", [build.build_wheel, build.build_editable])
+def test_failed_build_writes_report(tmp_path, monkeypatch, hook):
+    def broken_project():
+        raise RuntimeError("broken pyproject.toml")
+
+    monkeypatch.setattr(build, "load_project", broken_project)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    with pytest.raises(RuntimeError, match="broken"):
+        hook(str(tmp_path / "dist"), {"report": str(tmp_path / "report.json")})
+
+    data = json.loads((tmp_path / "report.json").read_text())
+    assert data["phases"]["config"]["count"] == 1
+    assert report._REPORT is None
+    assert not list(tmp_path.glob("hwh-report-*"))
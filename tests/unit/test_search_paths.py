@@ -0,0 +1,87 @@
+import json
+
+import pytest
+from packaging.requirements import Requirement
+
+from hwh_backend import search_paths
+from hwh_backend.search_paths import (
+    PATHS_NAME,
+    dependency_paths,
+    exported_paths,
+    resolve,
+)
+
+
+def _install(site_dir, name, files=(), requires=(), exported=None):
+    dist_info = site_dir / f"{name}-1.0.dist-info"
+    dist_info.mkdir(parents=True)
+    (dist_info / "METADATA").write_text(
+        f"Metadata-Version: 2.1\nName: {name}\nVersion: 1.0\n"
+        + "".join(f"Requires-Dist: {req}\n" for req in requires)
+    )
+    (dist_info / "RECORD").write_text("".join(f"{f},,\n" for f in files))
+    if exported is not None:
+        (dist_info / PATHS_NAME).write_text(json.dumps(exported))
+
+
+def test_exported_paths():
+    assert exported_paths(
+        [
+            "pkg/__init__.py",
+            "pkg/core.pxd",
+            "pkg/include/pkg.h",
+            "pkg/lib/libpkg.so.1",
+            "pkg/core.cpython-311-x86_64-linux-gnu.so",
+            "pkg-1.0.dist-info/RECORD",
+            "../../bin/tool",
+        ]
+    ) == {
+        "include_path": ["."],
+        "include_dirs": ["."],
+        "library_dirs": ["pkg/lib"],
+    }
+    assert exported_paths(["plain/__init__.py"]) == {
+        "include_path": [],
+        "include_dirs": [],
+        "library_dirs": [],
+    }
+
+
+def test_resolve_declared_dependencies(tmp_path):
+    site, other = tmp_path / "site", tmp_path / "other"
+    _install(site, "pure", ["pure/__init__.py"], requires=["cylib"])
+    _install(other, "cylib", ["cylib/base.pxd"], requires=["extra_lib; extra == 'x'"])
+    _install(site, "extra_lib", exported={"library_dirs": ["extra_lib/libs"]})
+    _install(site, "undeclared", ["undeclared/mod.pxd"])
+
+    paths = resolve([Requirement("pure")], [str(site), str(other)])
+    assert paths.include_path == [str(other)]
+    assert paths.include_dirs == paths.library_dirs == []
+
+    paths = resolve([Requirement("cylib[x]")], [str(site), str(other)])
+    assert paths.library_dirs == [str(site / "extra_lib" / "libs")]
+
+
+def test_dependency_paths_cached_per_environment(tmp_path, monkeypatch):
+    site = tmp_path / "site"
+    _install(site, "cylib", ["cylib/base.pxd"])
+    monkeypatch.setattr(search_paths, "site_dirs", lambda project_dir: [str(site)])
+    requirements = [Requirement("cylib"), Requirement("later")]
+
+    assert dependency_paths(requirements, tmp_path, tmp_path).include_path == [
+        str(site)
+    ]
+
+    def fail(*args):
+        pytest.fail("resolved the cached search paths again")
+
+    monkeypatch.setattr(search_paths, "resolve", fail)
+    dependency_paths(requirements, tmp_path, tmp_path)
+
+    # Installing a distribution invalidates the cache
+    monkeypatch.undo()
+    monkeypatch.setattr(search_paths, "site_dirs", lambda project_dir: [str(site)])
+    _install(site, "later", ["later/api.h"])
+    assert dependency_paths(requirements, tmp_path, tmp_path).include_dirs == [
+        str(site)
+    ]
@@ -0,0 +1,67 @@
+import subprocess
+
+import pytest
+
+from hwh_backend.hwh_config import Strip, WheelConfig
+from hwh_backend.strip import strip_extensions
+
+
+@pytest.fixture
+def extension(tmp_path):
+    source = tmp_path / "mod.c"
+    source.write_text("int twice(int x) { return 2 * x; }\n")
+    ext = tmp_path / "root" / "pkg" / "mod.cpython-311-x86_64-linux-gnu.so"
+    ext.parent.mkdir(parents=True)
+    subprocess.run(
+        ["cc", "-g", "-fPIC", "-shared", str(source), "-o", str(ext)], check=True
+    )
+    return ext
+
+
+def _sections(path):
+    result = subprocess.run(
+        ["readelf", "-S", "-W", str(path)], capture_output=True, text=True, check=True
+    )
+    return result.stdout
+
+
+def test_strip_with_debug_files(tmp_path, extension):
+    size = extension.stat().st_size
+
+    debug_files = strip_extensions(tmp_path / "root", Strip.ALL, tmp_path / "debug")
+
+    debug_file = tmp_path / "debug" / "pkg" / f"{extension.name}.debug"
+    assert debug_files == [debug_file]
+    assert extension.stat().st_size < size
+    assert ".debug_info" not in _sections(extension)
+    assert ".gnu_debuglink" in _sections(extension)
+    assert ".debug_info" in _sections(debug_file)
+
+
+def test_strip_debug_only(tmp_path, extension):
+    assert strip_extensions(tmp_path / "root", Strip.DEBUG, None) == []
+    assert ".debug_info" not in _sections(extension)
+    assert ".gnu_debuglink" not in _sections(extension)
+    assert ".symtab" in _sections(extension)
+
+
+def test_strip_to_output_dir(tmp_path, extension):
+    size = extension.stat().st_size
+
+    strip_extensions(tmp_path / "root", Strip.DEBUG, None, tmp_path / "stripped")
+
+    stripped = tmp_path / "stripped" / "pkg" / extension.name
+    assert extension.stat().st_size == size
+    assert ".debug_info" in _sections(extension)
+    assert ".debug_info" not in _sections(stripped)
+
+
+def test_wheel_config():
+    config = WheelConfig.from_pyproject({"wheel": {"strip": "debug"}})
+    assert config.strip == Strip.DEBUG
+    assert not config.debug_archive
+    assert config.compression == 6
+    with pytest.raises(ValueError, match="Invalid strip"):
+        WheelConfig(strip="everything")
+    with pytest.raises(ValueError, match="compression"):
+        WheelConfig(compression=10)
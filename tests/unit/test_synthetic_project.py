@@ -0,0 +1,22 @@
+from pathlib import Path
+
+from hwh_backend.build import _get_extensions
+from hwh_backend.parser import PyProject
+
+from ..utils.package_utils import create_synthetic_project
+
+
+def test_synthetic_project_shape(tmp_path, backend_dir, monkeypatch):
+    project_dir = create_synthetic_project(
+        tmp_path, backend_dir, n_modules=12, depth=2, fan_out=2, nesting=2
+    )
+    monkeypatch.chdir(project_dir)
+
+    ext_modules, _ = _get_extensions(PyProject(Path()))
+
+    assert len(ext_modules) == 12
+    assert "synthetic.sub1.sub0.mod5" in {ext.name for ext in ext_modules}
+    # Top layer modules cimport fan_out modules of the layer below
+    assert (project_dir / "synthetic/sub1/sub0/mod5.pyx").read_text().count(
+        "cimport"
+    ) == 2
@@ -0,0 +1,47 @@
+import errno
+
+import pytest
+
+from hwh_backend.watch import InotifyWatcher, PollingWatcher
+
+
+@pytest.mark.parametrize("watcher_cls", [InotifyWatcher, PollingWatcher])
+def test_watcher_reports_cython_sources(tmp_path, watcher_cls):
+    pkg = tmp_path / "pkg"
+    pkg.mkdir()
+    (pkg / "mod.pyx").write_text("x = 1\n")
+    watcher = watcher_cls([pkg])
+    try:
+        assert watcher.wait(0.1) == set()
+
+        (pkg / "mod.pyx").write_text("x = 2\n")
+        (pkg / "mod.c").write_text("/* generated */\n")
+        sub = pkg / "sub"
+        sub.mkdir()
+        assert watcher.wait(2) == {str(pkg / "mod.pyx")}
+
+        # Directories created after the watch started are watched too
+        (sub / "new.pxd").write_text("cdef int y\n")
+        assert watcher.wait(2) == {str(sub / "new.pxd")}
+    finally:
+        watcher.close()
+
+
+def test_inotify_polls_directories_it_cant_watch(tmp_path, monkeypatch):
+    pkg = tmp_path / "pkg"
+    pkg.mkdir()
+    watcher = InotifyWatcher([pkg], poll_interval=0.05)
+
+    def add_watch(dirpath):
+        raise OSError(errno.ENOSPC, f"inotify_add_watch {dirpath}: No space")
+
+    monkeypatch.setattr(watcher, "_add_watch", add_watch)
+    try:
+        sub = pkg / "sub"
+        sub.mkdir()
+        assert watcher.wait(2) == set()
+
+        (sub / "new.pyx").write_text("x = 1\n")
+        assert watcher.wait(2) == {str(sub / "new.pyx")}
+    finally:
+        watcher.close()
@@ -0,0 +1,68 @@
+import base64
+import hashlib
+import zipfile
+
+from hwh_backend.wheelfile import WheelWriter, tree_files
+
+
+def _write(tmp_path, name, **kwargs):
+    root = tmp_path / "root"
+    (root / "pkg" / "__pycache__").mkdir(parents=True, exist_ok=True)
+    (root / "pkg" / "__init__.py").write_text("")
+    (root / "pkg" / "mod.py").write_text("x = 1\n" * 1000)
+    (root / "pkg" / "__pycache__" / "mod.cpython-311.pyc").write_bytes(b"pyc")
+    ext = root / "pkg" / "ext.so"
+    ext.write_bytes(bytes(range(256)) * 64)
+    ext.chmod(0o755)
+
+    writer = WheelWriter(tmp_path / name, "pkg-1.0.dist-info", **kwargs)
+    for arcname, path in sorted(tree_files(root).items()):
+        writer.add_file(arcname, path)
+    writer.add_bytes("pkg-1.0.dist-info/METADATA", b"Name: pkg\n")
+    writer.write()
+    return tmp_path / name
+
+
+def test_wheel_contents_and_record(tmp_path):
+    path = _write(tmp_path, "a.whl", nthreads=4)
+
+    with zipfile.ZipFile(path) as wheel:
+        assert wheel.testzip() is None
+        names = wheel.namelist()
+        assert names == [
+            "pkg/__init__.py",
+            "pkg/ext.so",
+            "pkg/mod.py",
+            "pkg-1.0.dist-info/METADATA",
+            "pkg-1.0.dist-info/RECORD",
+        ]
+        assert wheel.getinfo("pkg/mod.py").compress_type == zipfile.ZIP_DEFLATED
+        assert wheel.getinfo("pkg/ext.so").external_attr >> 16 == 0o100755
+        assert wheel.getinfo("pkg/mod.py").date_time == (1980, 1, 1, 0, 0, 0)
+
+        record = wheel.read("pkg-1.0.dist-info/RECORD").decode().splitlines()
+        for line, name in zip(record[:-1], names[:-1], strict=True):
+            data = wheel.read(name)
+            digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest())
+            assert line == f"{name},sha256={digest.rstrip(b'=').decode()},{len(data)}"
+        assert record[-1] == "pkg-1.0.dist-info/RECORD,,"
+
+
+def test_wheel_is_reproducible(tmp_path, monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+    first = _write(tmp_path, "a.whl", nthreads=1)
+    second = _write(tmp_path, "b.whl", nthreads=8)
+
+    assert first.read_bytes() == second.read_bytes()
+    with zipfile.ZipFile(first) as wheel:
+        assert wheel.getinfo("pkg/mod.py").date_time == (2023, 11, 14, 22, 13, 20)
+
+
+def test_stored_wheel(tmp_path):
+    path = _write(tmp_path, "a.whl", compression=0)
+
+    with zipfile.ZipFile(path) as wheel:
+        info = wheel.getinfo("pkg/mod.py")
+        assert info.compress_type == zipfile.ZIP_STORED
+        assert info.compress_size == info.file_size
+        assert wheel.read("pkg/mod.py") == b"x = 1\n" * 1000
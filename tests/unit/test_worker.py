@@ -0,0 +1,116 @@
+import os
+import threading
+from distutils.ccompiler import new_compiler
+from distutils.sysconfig import customize_compiler
+
+import pytest
+from setuptools.errors import CompileError
+
+from hwh_backend.executor import install_executor
+from hwh_backend.worker import (
+    CompileWorker,
+    WorkerExecutor,
+    compile_flags,
+    is_loopback,
+    make_server,
+    refused_flags,
+)
+
+
+@pytest.fixture
+def servers(tmp_path):
+    """A unix socket and a TCP worker on localhost."""
+    worker = CompileWorker(jobs=2)
+    started = [
+        make_server(f"unix:{tmp_path / 'worker.sock'}", worker),
+        make_server("tcp://127.0.0.1:0", worker),
+    ]
+    for server in started:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield started
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+
+def _compiler(executor):
+    compiler = new_compiler()
+    customize_compiler(compiler)
+    install_executor(compiler, executor)
+    return compiler
+
+
+def _addresses(servers):
+    unix, tcp = servers
+    port = tcp.server_address[1]
+    return [f"unix:{unix.server_address}", f"tcp://127.0.0.1:{port}"]
+
+
+def test_compile_on_workers(tmp_path, servers):
+    (tmp_path / "include").mkdir()
+    (tmp_path / "include" / "answer.h").write_text("#define ANSWER 42\n")
+    src = tmp_path / "answer.c"
+    src.write_text(
+        '#include "answer.h"\nint answer(void) { return ANSWER + OFFSET; }\n'
+    )
+    executor = WorkerExecutor(_addresses(servers), jobs=2)
+
+    [obj] = _compiler(executor).compile(
+        [str(src)],
+        output_dir=str(tmp_path / "build"),
+        include_dirs=[str(tmp_path / "include")],
+        macros=[("OFFSET", "1")],
+    )
+
+    assert os.path.exists(obj)
+    assert (executor.remote, executor.local) == (1, 0)
+
+    src.write_text("int broken(void) { return }\n")
+    with pytest.raises(CompileError, match="failed with exit code"):
+        _compiler(executor).compile([str(src)], output_dir=str(tmp_path / "build"))
+
+
+def test_fall_back_to_local_compilation(tmp_path, servers):
+    src = tmp_path / "mod.c"
+    src.write_text("int f(void) { return 1; }\n")
+    executor = WorkerExecutor(_addresses(servers) + ["tcp://127.0.0.1:1"])
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+    [obj] = _compiler(executor).compile([str(src)], output_dir=str(tmp_path))
+
+    assert os.path.exists(obj)
+    assert (executor.remote, executor.local) == (0, 1)
+    assert not any(worker.alive for worker in executor.workers)
+
+
+def test_compile_flags_and_refused_flags(tmp_path):
+    command = ["gcc", "-O2", "-I", "inc", "-Iinc2", "-DX=1", "-c", "-fPIC"]
+    command += ["-Wp,-D_FORTIFY_SOURCE=2"]
+    assert compile_flags(command) == ["-O2", "-fPIC"]
+
+    allowed = ["-O3", "-g", "-fwrapv", "-fvisibility=hidden", "-march=x86-64"]
+    allowed += ["-Wall", "-Wno-unused-function", "-std=c99", "-pthread"]
+    assert refused_flags(allowed + ["-x", "cpp-output"]) == []
+    refused = ["-Wa,-adhln=/tmp/out.txt", "-Wl,-rpath", "-fdump-tree-all"]
+    refused += ["-fplugin=evil", "-ffile-prefix-map=/src=.", "-save-temps", "@args"]
+    assert refused_flags(refused) == refused
+
+    listing = tmp_path / "listing.txt"
+    for flags in (["-wrapper", "sh"], [f"-Wa,-adhln={listing}"]):
+        response, obj = CompileWorker(jobs=1).compile(
+            {"name": "a.c", "language": "cpp-output", "flags": flags},
+            b"int x(void) { return 1; }\n",
+        )
+        assert response["returncode"] == 1 and obj == b""
+    assert not listing.exists()
+
+
+def test_worker_listens_on_loopback_only(tmp_path):
+    worker = CompileWorker(jobs=1)
+    with pytest.raises(ValueError, match="--allow-remote"):
+        make_server("tcp://0.0.0.0:0", worker)
+    server = make_server("tcp://0.0.0.0:0", worker, allow_remote=True)
+    server.server_close()
+    assert is_loopback("localhost") and not is_loopback("0.0.0.0")
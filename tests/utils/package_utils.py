@@ -10,6 +10,7 @@ def create_pyproject_toml(
     dependencies: Optional[List[str]] = None,
     version: str = "0.1.0",
     pkg_dir_name: Optional[str] = None,
+    language: str = "c",
 ) -> None:
     """Create a pyproject.toml file with setuptools.packages.find section."""
     content = f"""
@@ -44,10 +45,10 @@ include = ["{pkg_dir_name}*"]  # includes subpackages
 where = ["."]  # or ["src"] if using src layout
 """
 
-    content += """
+    content += f"""
 [tool.hwh.cython]
-language = "c"
-compiler_directives = {  }
+language = "{language}"
+compiler_directives = {{  }}
 """
 
     with open(pkg_dir / "pyproject.toml", "w") as f:
@@ -165,3 +166,78 @@ def create_package_structure(
         elif isinstance(contents, list):
             for file in contents:
                 (pkg_dir / file).touch()
+
+
+def create_synthetic_project(
+    base_dir: Path,
+    backend_dir: Path,
+    n_modules: int = 100,
+    depth: int = 3,
+    fan_out: int = 2,
+    subpackages: int = 2,
+    nesting: int = 2,
+    language: str = "c",
+    project_name: str = "synthetic",
+) -> Path:
+    """Create a project of n_modules Cython modules for benchmarking.
+
+    Modules are spread over `subpackages` subpackages per level, `nesting`
+    levels deep. They form depth + 1 layers: every module cimports `fan_out`
+    modules of the layer below it, so the lowest layers get the most fan-in.
+    Every module has a .pxd declaring a function and a .pyx implementing it.
+    """
+    pkg_dir = base_dir / project_name
+    packages = [[project_name]]
+    for _ in range(nesting):
+        packages += [
+            package + [f"sub{i}"]
+            for package in packages
+            if len(package) == len(packages[-1])
+            for i in range(subpackages)
+        ]
+    for package in packages:
+        (pkg_dir.joinpath(*package)).mkdir(parents=True, exist_ok=True)
+        (pkg_dir.joinpath(*package) / "__init__.py").touch()
+
+    modules = [(*packages[i % len(packages)], f"mod{i}") for i in range(n_modules)]
+    layers = [modules[layer :: depth + 1] for layer in range(depth + 1)]
+    for layer, layer_modules in enumerate(layers):
+        for index, module in enumerate(layer_modules):
+            name = module[-1]
+            deps = []
+            if layer > 0 and layers[layer - 1]:
+                below = layers[layer - 1]
+                deps = list(
+                    dict.fromkeys(
+                        below[(index + k) % len(below)] for k in range(fan_out)
+                    )
+                )
+
+            pxd = f"cdef int f_{name}(int x)\n"
+            pyx = "".join(f"from {'.'.join(dep)} cimport f_{dep[-1]}\n" for dep in deps)
+            body = " + ".join([f"f_{dep[-1]}(x)" for dep in deps] or ["x"])
+            if language == "c++":
+                pyx += "from libcpp.vector cimport vector\n"
+                pyx += (
+                    f"\ncdef int f_{name}(int x):\n"
+                    "    cdef vector[int] v\n"
+                    f"    v.push_back({body})\n"
+                    "    return v[0] + 1\n"
+                )
+            else:
+                pyx += f"\ncdef int f_{name}(int x):\n    return {body} + 1\n"
+            pyx += f"\ndef call(int x):\n    return f_{name}(x)\n"
+
+            module_path = pkg_dir.joinpath(*module)
+            module_path.with_suffix(".pxd").write_text(pxd)
+            module_path.with_suffix(".pyx").write_text(pyx)
+
+    create_pyproject_toml(
+        pkg_dir,
+        project_name,
+        backend_dir,
+        pkg_dir_name=project_name,
+        language=language,
+    )
+    (pkg_dir / "README.md").write_text(f"# {project_name}\nSynthetic project")
+    return pkg_dir